@@ -0,0 +1,172 @@
+from fastapi import APIRouter, HTTPException, Query
+from fastapi.responses import StreamingResponse
+from typing import List, Optional
+from ..schemas import JobInfo
+from .testcase import executor, project_manager
+from core.job_manager import JobManager
+from core import settings
+from core.settings import resolve_concurrency, resolve_execution_options, resolve_schedule
+import json
+
+router = APIRouter()
+job_manager = JobManager(
+    executor,
+    max_running_jobs=settings.MAX_RUNNING_JOBS,
+    history_limit=settings.JOB_HISTORY_LIMIT
+)
+
+def _get_job(job_id: str):
+    job = job_manager.get(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="任务不存在")
+    return job
+
+@router.post("/execute/{project_id}/{test_case_id}", response_model=JobInfo)
+async def submit_test_case(
+    project_id: str,
+    test_case_id: str,
+    execution_mode: Optional[str] = Query(None, description="执行模式: subprocess、pooled 或 native，未指定时使用项目配置"),
+    screenshot_policy: Optional[str] = Query(None, description="native 模式的截图策略: never、on_failure、every_n 或 last_step"),
+    trace: Optional[bool] = Query(None, description="是否记录 Playwright trace，未指定时使用项目配置"),
+    har_mode: Optional[str] = Query(None, description="HAR 回放模式: off、offline 或 fallback，未指定时使用项目配置"),
+    execution_profile: Optional[str] = Query(None, description="执行配置名称，未指定时使用项目配置"),
+    case_timeout: Optional[int] = Query(None, ge=0, description="单个用例的执行时间上限（秒），0 表示不限制，未指定时使用项目配置")
+):
+    """提交单个测试用例的执行任务，立即返回任务ID"""
+    project = project_manager.get_project(project_id) or {}
+    try:
+        options = resolve_execution_options(
+            project, execution_mode=execution_mode, screenshot_policy=screenshot_policy, trace=trace,
+            har_mode=har_mode, execution_profile=execution_profile, case_timeout=case_timeout
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    job = job_manager.submit("test_case", project_id, [test_case_id], options=options)
+    return job.info()
+
+@router.post("/execute_project/{project_id}", response_model=JobInfo)
+async def submit_project(
+    project_id: str,
+    concurrency: Optional[int] = Query(None, ge=1, description="并发执行的用例数，未指定时使用项目配置"),
+    execution_mode: Optional[str] = Query(None, description="执行模式: subprocess、pooled 或 native，未指定时使用项目配置"),
+    screenshot_policy: Optional[str] = Query(None, description="native 模式的截图策略: never、on_failure、every_n 或 last_step"),
+    trace: Optional[bool] = Query(None, description="是否记录 Playwright trace，未指定时使用项目配置"),
+    har_mode: Optional[str] = Query(None, description="HAR 回放模式: off、offline 或 fallback，未指定时使用项目配置"),
+    execution_profile: Optional[str] = Query(None, description="执行配置名称，未指定时使用项目配置"),
+    case_timeout: Optional[int] = Query(None, ge=0, description="单个用例的执行时间上限（秒），0 表示不限制，未指定时使用项目配置"),
+    order: Optional[str] = Query(None, description="执行顺序: history（最近失败优先、耗时长的优先）或 name，未指定时使用全局配置"),
+    max_failures: Optional[int] = Query(None, ge=0, description="失败数达到该值后跳过剩余用例，0 或未指定表示不限制"),
+    retries: Optional[int] = Query(None, ge=0, description="失败用例的自动重试次数，未指定时使用全局配置"),
+    run_timeout: Optional[int] = Query(None, ge=0, description="项目执行的时间上限（秒），超过后中止执行，0 表示不限制，未指定时使用全局配置")
+):
+    """提交整个项目的执行任务，立即返回任务ID"""
+    project = project_manager.get_project(project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="项目不存在")
+    try:
+        options = resolve_execution_options(
+            project, execution_mode=execution_mode, screenshot_policy=screenshot_policy, trace=trace,
+            har_mode=har_mode, execution_profile=execution_profile, case_timeout=case_timeout
+        )
+        order, max_failures = resolve_schedule(order, max_failures)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    test_cases = project_manager.get_test_cases(project_id)
+    job = job_manager.submit(
+        "project",
+        project_id,
+        [test_case["test_case_id"] for test_case in test_cases],
+        concurrency=resolve_concurrency(concurrency, project),
+        options=options,
+        order=order,
+        max_failures=max_failures,
+        retries=retries,
+        run_timeout=run_timeout
+    )
+    return job.info()
+
+@router.post("/rerun_failed/{project_id}/{project_run_id}", response_model=JobInfo)
+async def submit_rerun_failed(
+    project_id: str,
+    project_run_id: str,
+    concurrency: Optional[int] = Query(None, ge=1, description="并发执行的用例数，未指定时使用项目配置"),
+    execution_mode: Optional[str] = Query(None, description="执行模式: subprocess、pooled 或 native，未指定时使用项目配置"),
+    screenshot_policy: Optional[str] = Query(None, description="native 模式的截图策略: never、on_failure、every_n 或 last_step"),
+    trace: Optional[bool] = Query(None, description="是否记录 Playwright trace，未指定时使用项目配置"),
+    har_mode: Optional[str] = Query(None, description="HAR 回放模式: off、offline 或 fallback，未指定时使用项目配置"),
+    execution_profile: Optional[str] = Query(None, description="执行配置名称，未指定时使用项目配置"),
+    case_timeout: Optional[int] = Query(None, ge=0, description="单个用例的执行时间上限（秒），0 表示不限制，未指定时使用项目配置"),
+    retries: Optional[int] = Query(None, ge=0, description="失败用例的自动重试次数，未指定时使用全局配置"),
+    run_timeout: Optional[int] = Query(None, ge=0, description="项目执行的时间上限（秒），超过后中止执行，0 表示不限制，未指定时使用全局配置")
+):
+    """提交任务，只重新执行某次项目执行中失败或被跳过的测试用例"""
+    project = project_manager.get_project(project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="项目不存在")
+    test_case_ids = executor.failed_test_cases(project_id, project_run_id)
+    if test_case_ids is None:
+        raise HTTPException(status_code=404, detail="项目执行记录不存在")
+    try:
+        options = resolve_execution_options(
+            project, execution_mode=execution_mode, screenshot_policy=screenshot_policy, trace=trace,
+            har_mode=har_mode, execution_profile=execution_profile, case_timeout=case_timeout
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    job = job_manager.submit(
+        "project",
+        project_id,
+        test_case_ids,
+        concurrency=resolve_concurrency(concurrency, project),
+        options=options,
+        retries=retries,
+        rerun_of=project_run_id,
+        run_timeout=run_timeout
+    )
+    return job.info()
+
+@router.get("/list", response_model=List[JobInfo])
+async def list_jobs():
+    """列出最近的任务"""
+    return job_manager.list()
+
+@router.get("/status/{job_id}", response_model=JobInfo)
+async def get_job_status(job_id: str):
+    """查询任务状态和进度"""
+    return _get_job(job_id).info()
+
+@router.get("/result/{job_id}")
+async def get_job_result(job_id: str):
+    """获取任务的执行结果，任务未结束时返回 409"""
+    job = _get_job(job_id)
+    if not job.done:
+        raise HTTPException(status_code=409, detail="任务尚未结束")
+    if job.status != "completed":
+        raise HTTPException(status_code=500, detail=job.error or f"任务{job.status}")
+    return job.result
+
+@router.post("/cancel/{job_id}", response_model=JobInfo)
+async def cancel_job(job_id: str):
+    """取消尚未结束的任务，正在执行的用例被中止，其脚本进程和浏览器被结束"""
+    job = _get_job(job_id)
+    if not await job_manager.cancel(job_id, wait=settings.PROCESS_KILL_GRACE + 5):
+        raise HTTPException(status_code=409, detail="任务已结束")
+    return job.info()
+
+@router.get("/events/{job_id}")
+async def stream_job_events(job_id: str):
+    """以 Server-Sent Events 推送任务进度和每个用例的执行结果"""
+    _get_job(job_id)
+
+    async def event_stream():
+        async for message in job_manager.subscribe(job_id):
+            data = json.dumps(message["data"], ensure_ascii=False)
+            yield f"event: {message['event']}\ndata: {data}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
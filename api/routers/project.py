@@ -1,12 +1,16 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from ..schemas import ProjectCreate, ProjectUpdate, ProjectInfo
+from fastapi import APIRouter, HTTPException, Query
+from typing import Dict, List, Optional
+from ..schemas import ProjectCreate, ProjectUpdate, ProjectInfo, ProjectPage, ProjectStats, ExecutionProfile
 from core.project_manager import ProjectManager
+from core.storage_state import StorageStateCache
+from core.execution_profile import ExecutionProfiles
 import os
 import shutil
 
 router = APIRouter()
 project_manager = ProjectManager()
+storage_states = StorageStateCache()
+execution_profiles = ExecutionProfiles()
 
 @router.post("/create", response_model=bool)
 async def create_project(project: ProjectCreate):
@@ -14,7 +18,17 @@ async def create_project(project: ProjectCreate):
     success = project_manager.create_project(
         project_id=project.project_id,
         project_name=project.project_name,
-        description=project.description
+        description=project.description,
+        concurrency=project.concurrency,
+        execution_mode=project.execution_mode,
+        screenshot_policy=project.screenshot_policy,
+        screenshot_every=project.screenshot_every,
+        screenshot_format=project.screenshot_format,
+        har_mode=project.har_mode,
+        setup_case_id=project.setup_case_id,
+        storage_state_ttl=project.storage_state_ttl,
+        execution_profile=project.execution_profile,
+        case_timeout=project.case_timeout
     )
     if not success:
         raise HTTPException(status_code=400, detail="项目创建失败")
@@ -28,13 +42,68 @@ async def get_project(project_id: str):
         raise HTTPException(status_code=404, detail="项目不存在")
     return project_info
 
+@router.get("/stats/{project_id}", response_model=ProjectStats)
+async def get_project_stats(project_id: str):
+    """获取项目的通过率、耗时百分位、最近失败和稳定性统计"""
+    stats = project_manager.store.get_project_stats(project_id)
+    if not stats:
+        raise HTTPException(status_code=404, detail="项目尚无执行记录")
+    return stats
+
+@router.delete("/storage_state/{project_id}")
+async def clear_storage_state(project_id: str):
+    """清除项目缓存的登录状态，下次执行时重新执行 setup 用例"""
+    if not project_manager.get_project(project_id):
+        raise HTTPException(status_code=404, detail="项目不存在")
+    storage_states.invalidate(project_id)
+    return {"status": "success", "message": "登录状态缓存已清除"}
+
+@router.get("/execution_profiles/{project_id}", response_model=Dict[str, ExecutionProfile])
+async def list_execution_profiles(project_id: str):
+    """列出项目的执行配置"""
+    if not project_manager.get_project(project_id):
+        raise HTTPException(status_code=404, detail="项目不存在")
+    try:
+        return execution_profiles.load(project_id)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.put("/execution_profile/{project_id}/{name}", response_model=ExecutionProfile)
+async def save_execution_profile(project_id: str, name: str, profile: ExecutionProfile):
+    """新增或替换项目的执行配置，执行时通过 execution_profile 参数或项目配置选用"""
+    if not project_manager.get_project(project_id):
+        raise HTTPException(status_code=404, detail="项目不存在")
+    try:
+        return execution_profiles.save(project_id, name, profile.model_dump())
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.delete("/execution_profile/{project_id}/{name}")
+async def delete_execution_profile(project_id: str, name: str):
+    """删除项目的执行配置"""
+    if not project_manager.get_project(project_id):
+        raise HTTPException(status_code=404, detail="项目不存在")
+    if not execution_profiles.delete(project_id, name):
+        raise HTTPException(status_code=404, detail="执行配置不存在")
+    return {"status": "success", "message": "执行配置已删除"}
+
 @router.put("/update/{project_id}", response_model=bool)
 async def update_project(project_id: str, project: ProjectUpdate):
     """更新项目信息"""
     success = project_manager.update_project(
         project_id=project_id,
         project_name=project.project_name,
-        description=project.description
+        description=project.description,
+        concurrency=project.concurrency,
+        execution_mode=project.execution_mode,
+        screenshot_policy=project.screenshot_policy,
+        screenshot_every=project.screenshot_every,
+        screenshot_format=project.screenshot_format,
+        har_mode=project.har_mode,
+        setup_case_id=project.setup_case_id,
+        storage_state_ttl=project.storage_state_ttl,
+        execution_profile=project.execution_profile,
+        case_timeout=project.case_timeout
     )
     if not success:
         raise HTTPException(status_code=400, detail="项目更新失败")
@@ -61,7 +130,23 @@ async def delete_project(project_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/list", response_model=List[ProjectInfo])
-async def list_projects():
-    """列出所有项目"""
-    return project_manager.list_projects() 
\ No newline at end of file
+@router.get("/list", response_model=ProjectPage)
+async def list_projects(
+    limit: int = Query(50, ge=1, le=500, description="每页数量"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    name_prefix: Optional[str] = Query(None, description="项目ID或项目名称前缀"),
+    sort: str = Query("created_at", description="排序字段: name、created_at"),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="排序方向")
+):
+    """分页列出项目"""
+    try:
+        items, next_cursor = project_manager.query_projects(
+            limit=limit,
+            cursor=cursor,
+            name_prefix=name_prefix,
+            sort=sort,
+            order=order
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return {"items": items, "next_cursor": next_cursor}
@@ -1,7 +1,7 @@
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, HTTPException, Query
 from core.recorder import Recorder
 from pydantic import BaseModel
-from typing import Optional
+from typing import List, Optional
 import json
 import os
 
@@ -12,6 +12,8 @@ class RecordingRequest(BaseModel):
     url: str
     project_id: str
     test_case_id: str
+    save_har: bool = False
+    har_url_filter: Optional[str] = None
 
 class SaveRecordingRequest(BaseModel):
     project_id: str
@@ -20,8 +22,20 @@ class SaveRecordingRequest(BaseModel):
 class RecordingResponse(BaseModel):
     status: str
     message: str
+    session_id: Optional[str] = None
     steps: Optional[list] = None
 
+class RecordingSessionInfo(BaseModel):
+    session_id: str
+    project_id: str
+    test_case_id: str
+    url: str
+    save_har: bool
+    status: str
+    started_at: str
+    finished_at: Optional[str] = None
+    idle_seconds: Optional[float] = None
+
 @router.post("/start")
 async def start_recording(request: RecordingRequest):
     try:
@@ -29,26 +43,55 @@ async def start_recording(request: RecordingRequest):
         project_dir = f"projects/{request.project_id}"
         os.makedirs(project_dir, exist_ok=True)
         
-        success = await recorder.start_recording(request.url, request.project_id, request.test_case_id)
-        if success:
-            return RecordingResponse(status="success", message="录制已开始")
+        try:
+            session = await recorder.start_recording(
+                request.url,
+                request.project_id,
+                request.test_case_id,
+                save_har=request.save_har,
+                har_url_filter=request.har_url_filter
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=409, detail=str(e))
+        if session:
+            return RecordingResponse(status="success", message="录制已开始", session_id=session.session_id)
         else:
             raise HTTPException(status_code=500, detail="启动录制失败")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/sessions", response_model=List[RecordingSessionInfo])
+async def list_sessions():
+    """列出正在进行和刚结束的录制会话"""
+    return recorder.list_sessions()
+
 @router.post("/stop")
-async def stop_recording():
+async def stop_recording(
+    session_id: Optional[str] = Query(None, description="录制会话ID，只有一个录制会话时可以省略"),
+    terminate: bool = Query(False, description="是否立即结束录制，默认等待录制浏览器关闭")
+):
     try:
-        steps = await recorder.stop_recording()
+        if session_id is None:
+            sessions = recorder.list_sessions()
+            if not sessions:
+                raise HTTPException(status_code=404, detail="没有正在进行的录制")
+            if len(sessions) > 1:
+                raise HTTPException(status_code=400, detail="存在多个录制会话，请指定 session_id")
+            session_id = sessions[0]["session_id"]
+        steps = await recorder.stop_recording(session_id, terminate=terminate)
         if steps is not None:
             return RecordingResponse(
                 status="success",
                 message="录制已停止",
+                session_id=session_id,
                 steps=steps
             )
         else:
-            raise HTTPException(status_code=500, detail="停止录制失败")
+            raise HTTPException(status_code=404, detail="录制会话不存在")
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
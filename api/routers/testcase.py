@@ -1,9 +1,13 @@
-from fastapi import APIRouter, HTTPException
-from typing import List
-from ..schemas import TestCase, ExecutionResult
+from fastapi import APIRouter, HTTPException, Query, WebSocket, WebSocketDisconnect
+from typing import List, Optional
+from ..schemas import TestCase, TestCasePage, TestStep, ExecutionResult, RunSummary, TestCaseStats, ProjectRunSummary
 from core.executor import Executor
 from core.project_manager import ProjectManager
-from fastapi.responses import PlainTextResponse
+from core.settings import resolve_concurrency, resolve_execution_options, resolve_schedule
+from core.blob_store import BlobStore
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from loguru import logger
+import asyncio
 import os
 import json
 from datetime import datetime
@@ -12,77 +16,113 @@ router = APIRouter()
 executor = Executor()
 project_manager = ProjectManager()
 
+# 流式输出时等待发送的结果数上限，客户端读取较慢时执行暂停，避免结果在服务端堆积
+STREAM_QUEUE_SIZE = 100
+
+def _ndjson(message):
+    return json.dumps(message, ensure_ascii=False) + "\n"
+
+def _stream_project_run(project_id, test_case_ids, **kwargs):
+    """以 NDJSON 逐行输出项目执行结果：每个用例完成后立即输出一行，最后输出汇总"""
+    queue = asyncio.Queue(maxsize=STREAM_QUEUE_SIZE)
+
+    async def on_result(result):
+        await queue.put({"event": "case_completed", "data": result})
+
+    async def run():
+        try:
+            summary = await executor.execute_project(
+                project_id, test_case_ids, on_result=on_result, keep_results=False, **kwargs
+            )
+            await queue.put({"event": "summary", "data": summary})
+        except Exception as e:
+            logger.error(f"流式执行项目失败: {project_id}, {str(e)}")
+            await queue.put({"event": "error", "data": {"message": str(e)}})
+
+    async def lines():
+        yield _ndjson({"event": "run_started", "data": {"project_id": project_id, "total": len(test_case_ids)}})
+        task = asyncio.create_task(run())
+        try:
+            while True:
+                message = await queue.get()
+                yield _ndjson(message)
+                if message["event"] in ("summary", "error"):
+                    break
+        finally:
+            # 客户端断开连接时停止执行
+            if not task.done():
+                task.cancel()
+
+    return StreamingResponse(
+        lines(),
+        media_type="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.post("/execute/{project_id}/{test_case_id}")
-async def execute_test_case(project_id: str, test_case_id: str):
+async def execute_test_case(
+    project_id: str,
+    test_case_id: str,
+    execution_mode: Optional[str] = Query(None, description="执行模式: subprocess、pooled 或 native，未指定时使用项目配置"),
+    screenshot_policy: Optional[str] = Query(None, description="native 模式的截图策略: never、on_failure、every_n 或 last_step"),
+    trace: Optional[bool] = Query(None, description="是否记录 Playwright trace，未指定时使用项目配置"),
+    har_mode: Optional[str] = Query(None, description="HAR 回放模式: off、offline 或 fallback，未指定时使用项目配置"),
+    execution_profile: Optional[str] = Query(None, description="执行配置名称，未指定时使用项目配置"),
+    case_timeout: Optional[int] = Query(None, ge=0, description="单个用例的执行时间上限（秒），0 表示不限制，未指定时使用项目配置")
+):
     """执行测试用例"""
     try:
-        # 初始化测试会话
-        if not await executor.start_session():
-            raise HTTPException(status_code=500, detail="测试会话初始化失败")
-            
+        project = project_manager.get_project(project_id) or {}
         try:
-            # 执行测试用例
-            result = await executor.execute_test_case(project_id, test_case_id)
-            if not result:
-                raise HTTPException(status_code=400, detail="测试用例执行失败")
-                
-            return result
-        finally:
-            # 确保会话被关闭
-            await executor.close_session()
+            options = resolve_execution_options(
+                project, execution_mode=execution_mode, screenshot_policy=screenshot_policy, trace=trace,
+                har_mode=har_mode, execution_profile=execution_profile, case_timeout=case_timeout
+            )
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+            
+        # 按执行后端在本进程中执行或提交到任务队列，浏览器池在服务运行期间保持常驻
+        result = await executor.dispatch_test_case(project_id, test_case_id, options)
+        if not result:
+            raise HTTPException(status_code=400, detail="测试用例执行失败")
+            
+        return result
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@router.get("/list/{project_id}")
-async def list_testcases(project_id: str):
+@router.get("/list/{project_id}", response_model=TestCasePage)
+async def list_testcases(
+    project_id: str,
+    limit: int = Query(50, ge=1, le=500, description="每页数量"),
+    cursor: Optional[str] = Query(None, description="上一页返回的 next_cursor"),
+    name_prefix: Optional[str] = Query(None, description="测试用例编号前缀"),
+    recorded_after: Optional[datetime] = Query(None, description="录制时间下限（包含）"),
+    recorded_before: Optional[datetime] = Query(None, description="录制时间上限（不包含）"),
+    last_status: Optional[str] = Query(None, description="最近一次执行状态: success、error，never 表示从未执行"),
+    sort: str = Query("name", description="排序字段: name、recorded_at、last_run_at、last_duration"),
+    order: str = Query("asc", pattern="^(asc|desc)$", description="排序方向")
+):
+    """分页列出项目下的测试用例"""
     try:
-        testcases = []
-        project_dir = f"projects/{project_id}"
-        results_dir = f"{project_dir}/results"
-        
-        # 记录目录信息
-        print(f"正在检查目录: {project_dir}")
-        print(f"结果目录: {results_dir}")
-        
-        # 确保目录存在
-        if not os.path.exists(project_dir):
-            print(f"项目目录不存在: {project_dir}")
-            return []
-            
-        # 读取所有Python脚本文件
-        if os.path.exists(results_dir):
-            print(f"正在读取结果目录: {results_dir}")
-            files = os.listdir(results_dir)
-            print(f"目录中的所有文件: {files}")
-            
-            for filename in files:
-                print(f"处理文件: {filename}")
-                if filename.endswith('.py'):
-                    file_path = os.path.join(results_dir, filename)
-                    test_case_id = filename[:-3]  # 移除.py扩展名
-                    
-                    try:
-                        file_stat = os.stat(file_path)
-                        print(f"文件状态: 大小={file_stat.st_size}, 修改时间={datetime.fromtimestamp(file_stat.st_mtime)}")
-                        
-                        testcases.append({
-                            "test_case_id": test_case_id,
-                            "project_id": project_id,
-                            "file_size": file_stat.st_size,
-                            "steps": [],  # 由于是脚本文件，这里不包含具体步骤
-                            "recorded_at": datetime.fromtimestamp(file_stat.st_mtime).isoformat()
-                        })
-                        print(f"成功添加测试用例: {test_case_id}")
-                    except Exception as e:
-                        print(f"处理文件 {filename} 时出错: {str(e)}")
-                        continue
-        else:
-            print(f"结果目录不存在: {results_dir}")
-            
-        print(f"找到的测试用例数量: {len(testcases)}")
-        return testcases
+        # 从元数据索引中读取测试用例，无需遍历结果目录
+        items, next_cursor = project_manager.query_test_cases(
+            project_id,
+            limit=limit,
+            cursor=cursor,
+            name_prefix=name_prefix,
+            recorded_after=recorded_after.isoformat() if recorded_after else None,
+            recorded_before=recorded_before.isoformat() if recorded_before else None,
+            last_status=last_status,
+            sort=sort,
+            order=order
+        )
+        return {"items": items, "next_cursor": next_cursor}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
-        print(f"列出测试用例时发生错误: {str(e)}")
+        logger.error(f"列出测试用例时发生错误: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.get("/script/{project_id}/{test_case_id}")
@@ -99,6 +139,105 @@ async def get_script(project_id: str, test_case_id: str):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@router.get("/steps/{project_id}/{test_case_id}", response_model=List[TestStep])
+async def get_steps(project_id: str, test_case_id: str):
+    """获取测试用例脚本解析后的结构化步骤"""
+    try:
+        steps = project_manager.get_test_case_steps(project_id, test_case_id)
+    except SyntaxError as e:
+        raise HTTPException(status_code=400, detail=f"脚本语法错误: {str(e)}")
+    if steps is None:
+        raise HTTPException(status_code=404, detail="脚本文件不存在")
+    return steps
+
+@router.get("/blob/{project_id}/{ref}")
+async def get_blob(project_id: str, ref: str):
+    """按内容哈希引用获取执行结果中的截图"""
+    blob_store = BlobStore(f"projects/{project_id}/blobs")
+    if not blob_store.exists(ref):
+        raise HTTPException(status_code=404, detail="文件不存在")
+    # 内容由哈希寻址，永远不会变化，可以长期缓存
+    return FileResponse(
+        blob_store.path(ref),
+        media_type=BlobStore.media_type(ref),
+        headers={"Cache-Control": "public, max-age=31536000, immutable"}
+    )
+
+@router.get("/runs/{project_id}", response_model=List[RunSummary])
+async def list_runs(
+    project_id: str,
+    test_case_id: Optional[str] = Query(None, description="只查询某个测试用例的执行记录"),
+    before: Optional[str] = Query(None, description="上一页最后一条记录的 run_at，用于翻页"),
+    before_id: Optional[str] = Query(None, description="上一页最后一条记录的 run_id，与 before 一起使用"),
+    limit: int = Query(50, ge=1, le=500, description="每页数量")
+):
+    """按时间倒序列出执行记录"""
+    return executor.run_history.list_runs(
+        project_id, test_case_id=test_case_id, before=before, before_id=before_id, limit=limit
+    )
+
+@router.get("/run/{project_id}/{run_id}")
+async def get_run(project_id: str, run_id: str):
+    """获取一次执行的完整结果"""
+    run = executor.run_history.get(project_id, run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="执行记录不存在")
+    return run
+
+@router.get("/live_logs/{project_id}")
+async def list_live_logs(project_id: str):
+    """列出项目中正在执行、可以实时订阅输出的用例，包括由 worker 执行的用例"""
+    return await executor.list_live_logs(project_id)
+
+@router.get("/log/{project_id}/{run_id}")
+async def get_log(project_id: str, run_id: str):
+    """获取一次执行的完整输出日志"""
+    path = executor.logs.log_path(project_id, run_id)
+    if not path:
+        raise HTTPException(status_code=404, detail="执行日志不存在")
+    return FileResponse(path, media_type="text/plain; charset=utf-8")
+
+@router.websocket("/logs/{project_id}/{run_id}")
+async def tail_log(websocket: WebSocket, project_id: str, run_id: str):
+    """通过 WebSocket 逐行推送执行输出，用例不在本进程中执行时（如由 worker 执行）跟随其日志文件"""
+    await websocket.accept()
+    try:
+        stream = executor.logs.get(project_id, run_id)
+        if stream:
+            messages = stream.subscribe()
+        else:
+            path = executor.logs.log_path(project_id, run_id)
+            if not path:
+                await websocket.send_json({"type": "error", "message": "执行日志不存在"})
+                await websocket.close()
+                return
+            messages = executor.logs.follow(path)
+        async for message in messages:
+            await websocket.send_json(message)
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+
+@router.get("/stats/{project_id}", response_model=List[TestCaseStats])
+async def list_testcase_stats(
+    project_id: str,
+    sort: str = Query("flakiness", description="排序方式: flakiness、p95_duration、pass_rate"),
+    limit: int = Query(50, ge=1, le=500, description="返回数量")
+):
+    """列出项目下测试用例的统计，最不稳定、最慢或通过率最低的用例排在最前"""
+    try:
+        return project_manager.store.query_test_case_stats(project_id, sort=sort, limit=limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+@router.get("/stats/{project_id}/{test_case_id}", response_model=TestCaseStats)
+async def get_testcase_stats(project_id: str, test_case_id: str):
+    """获取测试用例的通过率、耗时百分位、最近失败和稳定性统计"""
+    stats = project_manager.store.get_test_case_stats(project_id, test_case_id)
+    if not stats:
+        raise HTTPException(status_code=404, detail="测试用例尚无执行记录")
+    return stats
+
 @router.delete("/delete/{project_id}/{test_case_id}")
 async def delete_testcase(project_id: str, test_case_id: str):
     """删除测试用例"""
@@ -109,6 +248,11 @@ async def delete_testcase(project_id: str, test_case_id: str):
             
         try:
             os.remove(script_path)
+            har_path = f"projects/{project_id}/results/{test_case_id}.har"
+            if os.path.exists(har_path):
+                os.remove(har_path)
+            project_manager.store.delete_test_case(project_id, test_case_id)
+            project_manager.store.mark_synced(project_id)
             return {"status": "success", "message": "测试用例已删除"}
         except Exception as e:
             raise HTTPException(status_code=500, detail=f"删除测试用例失败: {str(e)}")
@@ -117,7 +261,21 @@ async def delete_testcase(project_id: str, test_case_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @router.post("/execute_project/{project_id}")
-async def execute_project(project_id: str):
+async def execute_project(
+    project_id: str,
+    concurrency: Optional[int] = Query(None, ge=1, description="并发执行的用例数，未指定时使用项目配置"),
+    execution_mode: Optional[str] = Query(None, description="执行模式: subprocess、pooled 或 native，未指定时使用项目配置"),
+    screenshot_policy: Optional[str] = Query(None, description="native 模式的截图策略: never、on_failure、every_n 或 last_step"),
+    trace: Optional[bool] = Query(None, description="是否记录 Playwright trace，未指定时使用项目配置"),
+    har_mode: Optional[str] = Query(None, description="HAR 回放模式: off、offline 或 fallback，未指定时使用项目配置"),
+    execution_profile: Optional[str] = Query(None, description="执行配置名称，未指定时使用项目配置"),
+    case_timeout: Optional[int] = Query(None, ge=0, description="单个用例的执行时间上限（秒），0 表示不限制，未指定时使用项目配置"),
+    order: Optional[str] = Query(None, description="执行顺序: history（最近失败优先、耗时长的优先）或 name，未指定时使用全局配置"),
+    max_failures: Optional[int] = Query(None, ge=0, description="失败数达到该值后跳过剩余用例，0 或未指定表示不限制"),
+    retries: Optional[int] = Query(None, ge=0, description="失败用例的自动重试次数，未指定时使用全局配置"),
+    run_timeout: Optional[int] = Query(None, ge=0, description="项目执行的时间上限（秒），超过后中止执行，0 表示不限制，未指定时使用全局配置"),
+    stream: bool = Query(False, description="是否以 NDJSON 流式输出，每个用例完成后立即输出一行，最后输出汇总")
+):
     """执行项目中的所有测试用例"""
     try:
         # 获取项目信息
@@ -126,56 +284,109 @@ async def execute_project(project_id: str):
             raise HTTPException(status_code=404, detail="项目不存在")
 
         # 获取所有测试用例
-        test_cases = await list_testcases(project_id)
+        test_cases = project_manager.get_test_cases(project_id)
         if not test_cases:
-            return {
+            summary = {
                 "status": "success",
                 "message": "项目中没有可执行的测试用例",
                 "total": 0,
                 "success": 0,
                 "failed": 0,
+                "skipped": 0,
                 "results": []
             }
-
-        results = []
-        success_count = 0
-        failed_count = 0
-
-        # 初始化测试会话
-        if not await executor.start_session():
-            raise HTTPException(status_code=500, detail="测试会话初始化失败")
+            if stream:
+                return StreamingResponse(
+                    iter([_ndjson({"event": "summary", "data": summary})]), media_type="application/x-ndjson"
+                )
+            return summary
 
         try:
-            # 依次执行每个测试用例
-            for test_case in test_cases:
-                try:
-                    result = await executor.execute_test_case(project_id, test_case["test_case_id"])
-                    if result["status"] == "success":
-                        success_count += 1
-                    else:
-                        failed_count += 1
-                    results.append(result)
-                except Exception as e:
-                    failed_count += 1
-                    results.append({
-                        "status": "error",
-                        "test_case_id": test_case["test_case_id"],
-                        "message": str(e),
-                        "execution_time": datetime.now().isoformat()
-                    })
-        finally:
-            # 确保会话被关闭
-            await executor.close_session()
-
-        # 返回执行结果
-        return {
-            "status": "success",
-            "message": f"执行完成: 成功 {success_count} 个, 失败 {failed_count} 个",
-            "total": len(test_cases),
-            "success": success_count,
-            "failed": failed_count,
-            "results": results
+            options = resolve_execution_options(
+                project, execution_mode=execution_mode, screenshot_policy=screenshot_policy, trace=trace,
+                har_mode=har_mode, execution_profile=execution_profile, case_timeout=case_timeout
+            )
+            order, max_failures = resolve_schedule(order, max_failures)
+        except ValueError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+
+        # 按历史记录安排顺序，通过有界并发池执行所有测试用例
+        run_options = {
+            "concurrency": resolve_concurrency(concurrency, project),
+            "options": options,
+            "order": order,
+            "max_failures": max_failures,
+            "retries": retries,
+            "run_timeout": run_timeout
         }
+        test_case_ids = [test_case["test_case_id"] for test_case in test_cases]
+        if stream:
+            return _stream_project_run(project_id, test_case_ids, **run_options)
+        return await executor.execute_project(project_id, test_case_ids, **run_options)
 
+    except HTTPException:
+        raise
     except Exception as e:
-        raise HTTPException(status_code=500, detail=str(e)) 
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/rerun_failed/{project_id}/{project_run_id}")
+async def rerun_failed(
+    project_id: str,
+    project_run_id: str,
+    concurrency: Optional[int] = Query(None, ge=1, description="并发执行的用例数，未指定时使用项目配置"),
+    execution_mode: Optional[str] = Query(None, description="执行模式: subprocess、pooled 或 native，未指定时使用项目配置"),
+    screenshot_policy: Optional[str] = Query(None, description="native 模式的截图策略: never、on_failure、every_n 或 last_step"),
+    trace: Optional[bool] = Query(None, description="是否记录 Playwright trace，未指定时使用项目配置"),
+    har_mode: Optional[str] = Query(None, description="HAR 回放模式: off、offline 或 fallback，未指定时使用项目配置"),
+    execution_profile: Optional[str] = Query(None, description="执行配置名称，未指定时使用项目配置"),
+    case_timeout: Optional[int] = Query(None, ge=0, description="单个用例的执行时间上限（秒），0 表示不限制，未指定时使用项目配置"),
+    retries: Optional[int] = Query(None, ge=0, description="失败用例的自动重试次数，未指定时使用全局配置"),
+    run_timeout: Optional[int] = Query(None, ge=0, description="项目执行的时间上限（秒），超过后中止执行，0 表示不限制，未指定时使用全局配置"),
+    stream: bool = Query(False, description="是否以 NDJSON 流式输出，每个用例完成后立即输出一行，最后输出汇总")
+):
+    """只重新执行某次项目执行中失败或被跳过的测试用例"""
+    project = project_manager.get_project(project_id)
+    if not project:
+        raise HTTPException(status_code=404, detail="项目不存在")
+    test_case_ids = executor.failed_test_cases(project_id, project_run_id)
+    if test_case_ids is None:
+        raise HTTPException(status_code=404, detail="项目执行记录不存在")
+    try:
+        options = resolve_execution_options(
+            project, execution_mode=execution_mode, screenshot_policy=screenshot_policy, trace=trace,
+            har_mode=har_mode, execution_profile=execution_profile, case_timeout=case_timeout
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    run_options = {
+        "concurrency": resolve_concurrency(concurrency, project),
+        "options": options,
+        "retries": retries,
+        "rerun_of": project_run_id,
+        "run_timeout": run_timeout
+    }
+    if stream:
+        return _stream_project_run(project_id, test_case_ids, **run_options)
+    try:
+        return await executor.execute_project(project_id, test_case_ids, **run_options)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.get("/project_runs/{project_id}", response_model=List[ProjectRunSummary])
+async def list_project_runs(
+    project_id: str,
+    before: Optional[str] = Query(None, description="上一页最后一条记录的 started_at，用于翻页"),
+    before_id: Optional[str] = Query(None, description="上一页最后一条记录的 project_run_id，与 before 一起使用"),
+    limit: int = Query(50, ge=1, le=500, description="每页数量")
+):
+    """按时间倒序列出项目执行记录，包含首次执行和最终结果的统计"""
+    return executor.store.query_project_runs(project_id, before=before, before_id=before_id, limit=limit)
+
+@router.get("/project_run/{project_id}/{project_run_id}", response_model=ProjectRunSummary)
+async def get_project_run(project_id: str, project_run_id: str):
+    """获取一次项目执行的汇总和每个用例的最终状态"""
+    run = executor.store.get_project_run(project_id, project_run_id)
+    if not run:
+        raise HTTPException(status_code=404, detail="项目执行记录不存在")
+    return run
@@ -1,15 +1,36 @@
-from pydantic import BaseModel
-from typing import List, Optional
+from pydantic import BaseModel, Field
+from typing import Annotated, Any, Dict, List, Literal, Optional, Union
 from datetime import datetime
 
 class ProjectCreate(BaseModel):
     project_id: str
     project_name: str
     description: Optional[str] = ""
+    concurrency: Optional[int] = Field(None, ge=1)
+    execution_mode: Optional[Literal["subprocess", "pooled", "native"]] = None
+    screenshot_policy: Optional[Literal["never", "on_failure", "every_n", "last_step"]] = None
+    screenshot_every: Optional[int] = Field(None, ge=1)
+    screenshot_format: Optional[Literal["jpeg", "webp", "png"]] = None
+    har_mode: Optional[Literal["off", "offline", "fallback"]] = None
+    setup_case_id: Optional[str] = None
+    storage_state_ttl: Optional[int] = Field(None, ge=0)
+    execution_profile: Optional[str] = None
+    case_timeout: Optional[int] = Field(None, ge=0)
 
 class ProjectUpdate(BaseModel):
+    """执行相关配置传入空字符串表示清除，改用全局默认值"""
     project_name: Optional[str] = None
     description: Optional[str] = None
+    concurrency: Optional[Union[Annotated[int, Field(ge=1)], Literal[""]]] = None
+    execution_mode: Optional[Literal["subprocess", "pooled", "native", ""]] = None
+    screenshot_policy: Optional[Literal["never", "on_failure", "every_n", "last_step", ""]] = None
+    screenshot_every: Optional[Union[Annotated[int, Field(ge=1)], Literal[""]]] = None
+    screenshot_format: Optional[Literal["jpeg", "webp", "png", ""]] = None
+    har_mode: Optional[Literal["off", "offline", "fallback", ""]] = None
+    setup_case_id: Optional[str] = None
+    storage_state_ttl: Optional[Union[Annotated[int, Field(ge=0)], Literal[""]]] = None
+    execution_profile: Optional[str] = None
+    case_timeout: Optional[Union[Annotated[int, Field(ge=0)], Literal[""]]] = None
 
 class ProjectInfo(BaseModel):
     project_id: str
@@ -17,12 +38,56 @@ class ProjectInfo(BaseModel):
     description: str
     created_at: datetime
     updated_at: datetime
+    concurrency: Optional[int] = None
+    execution_mode: Optional[str] = None
+    screenshot_policy: Optional[str] = None
+    screenshot_every: Optional[int] = None
+    screenshot_format: Optional[str] = None
+    har_mode: Optional[str] = None
+    setup_case_id: Optional[str] = None
+    storage_state_ttl: Optional[int] = None
+    execution_profile: Optional[str] = None
+    case_timeout: Optional[int] = None
+
+class ExecutionProfile(BaseModel):
+    block_resource_types: List[Literal[
+        "stylesheet", "image", "media", "font", "script", "texttrack", "xhr", "fetch",
+        "eventsource", "websocket", "manifest", "other"
+    ]] = []
+    block_url_patterns: List[str] = []
+    disable_animations: bool = False
+
+class ProjectPage(BaseModel):
+    items: List[ProjectInfo]
+    next_cursor: Optional[str] = None
+
+class TestCaseSummary(BaseModel):
+    project_id: str
+    test_case_id: str
+    file_size: Optional[int] = None
+    recorded_at: Optional[datetime] = None
+    last_status: Optional[str] = None
+    last_run_at: Optional[datetime] = None
+    last_duration: Optional[float] = None
+    steps: list = []
+
+class TestCasePage(BaseModel):
+    items: List[TestCaseSummary]
+    next_cursor: Optional[str] = None
 
 class TestStep(BaseModel):
     type: str
-    selector: str
-    value: Optional[str] = None
-    timestamp: datetime
+    page: Optional[str] = None
+    locator: Optional[List[dict]] = None
+    selector: Optional[str] = None
+    value: Optional[Any] = None
+    url: Optional[Any] = None
+    args: list = []
+    kwargs: dict = {}
+    line: Optional[int] = None
+    timestamp: Optional[datetime] = None
+
+    model_config = {"extra": "allow"}
 
 class TestCase(BaseModel):
     project_id: str
@@ -35,6 +100,8 @@ class StepResult(BaseModel):
     screenshot: Optional[str] = None
     error: Optional[str] = None
     timestamp: datetime
+    duration: Optional[float] = None
+    thumbnail: Optional[str] = None
 
 class TestResult(BaseModel):
     step: TestStep
@@ -45,4 +112,76 @@ class ExecutionResult(BaseModel):
     test_case_id: str
     execution_time: datetime
     status: str
-    steps: List[TestResult] 
\ No newline at end of file
+    message: Optional[str] = None
+    duration: Optional[float] = None
+    steps: List[TestResult]
+    timings: Optional[dict] = None
+    trace: Optional[str] = None
+
+class RunSummary(BaseModel):
+    run_id: str
+    project_id: str
+    test_case_id: str
+    status: Optional[str] = None
+    run_at: datetime
+    duration: Optional[float] = None
+
+class ProjectRunSummary(BaseModel):
+    project_run_id: str
+    project_id: str
+    rerun_of: Optional[str] = None
+    started_at: datetime
+    finished_at: Optional[datetime] = None
+    total: int
+    success: int
+    failed: int
+    skipped: int
+    first_attempt_success: int
+    first_attempt_failed: int
+    flaky: int
+    case_statuses: Dict[str, str]
+
+class TestCaseStats(BaseModel):
+    project_id: str
+    test_case_id: str
+    total_runs: int
+    passed_runs: int
+    window_size: int
+    pass_rate: Optional[float] = None
+    p50_duration: Optional[float] = None
+    p95_duration: Optional[float] = None
+    flakiness: float
+    last_run_at: Optional[datetime] = None
+    last_failure_at: Optional[datetime] = None
+    last_failure_message: Optional[str] = None
+
+class ProjectStats(BaseModel):
+    project_id: str
+    total_runs: int
+    passed_runs: int
+    window_size: int
+    pass_rate: Optional[float] = None
+    p50_duration: Optional[float] = None
+    p95_duration: Optional[float] = None
+    case_count: int
+    flakiness: float
+    flaky_cases: int
+    last_run_at: Optional[datetime] = None
+    last_failure_at: Optional[datetime] = None
+    last_failure_case: Optional[str] = None
+    last_failure_message: Optional[str] = None
+
+class JobInfo(BaseModel):
+    job_id: str
+    kind: str
+    project_id: str
+    status: str
+    total: int
+    completed: int
+    success: int
+    failed: int
+    skipped: int = 0
+    created_at: datetime
+    started_at: Optional[datetime] = None
+    finished_at: Optional[datetime] = None
+    error: Optional[str] = None
@@ -0,0 +1,50 @@
+"""列表接口延迟基准：随项目数和用例数增长，测量首次请求和稳定状态下的延迟"""
+import time
+
+from benchmarks.common import generate_project, percentiles
+
+
+def _measure(client, url, repeat):
+    """首次请求单独计时（包含元数据同步），之后重复请求统计 p50 / p95"""
+    started = time.perf_counter()
+    response = client.get(url)
+    first_ms = (time.perf_counter() - started) * 1000
+    response.raise_for_status()
+
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        client.get(url).raise_for_status()
+        samples.append((time.perf_counter() - started) * 1000)
+    return {"first_ms": round(first_ms, 3), **{f"{key}_ms": value for key, value in percentiles(samples).items()}}
+
+
+def run(base_url, project_sizes, case_sizes, repeat):
+    """在当前工作目录中生成数据并测量接口延迟，需在 common.workspace() 中调用"""
+    # main 在导入时按当前目录创建项目管理器和元数据库，因此必须在工作目录中导入
+    from fastapi.testclient import TestClient
+    from main import app
+
+    results = []
+    with TestClient(app) as client:
+        generated = 0
+        for size in project_sizes:
+            # 项目数量逐级递增，只补充生成差额部分
+            for index in range(generated, size):
+                generate_project(f"bench_project_{index:05d}", 0, base_url)
+            generated = size
+            results.append({
+                "endpoint": "/api/v1/project/list",
+                "projects": size,
+                **_measure(client, "/api/v1/project/list?limit=50", repeat)
+            })
+
+        for size in case_sizes:
+            project_id = f"bench_cases_{size:05d}"
+            generate_project(project_id, size, base_url)
+            results.append({
+                "endpoint": "/api/v1/testcase/list/{project_id}",
+                "cases": size,
+                **_measure(client, f"/api/v1/testcase/list/{project_id}?limit=50", repeat)
+            })
+    return results
@@ -0,0 +1,98 @@
+"""用例执行吞吐基准：按执行模式和并发数测量 execute_project 的吞吐和单用例耗时
+
+subprocess 模式每个用例都启动新的浏览器，对应冷启动；pooled 和 native 模式在计时前
+启动浏览器池并预热一次，对应常驻浏览器的热启动，池启动耗时单独记录。
+"""
+import asyncio
+import time
+
+from benchmarks.common import generate_project, percentiles
+
+
+async def _check_browser():
+    """确认本机可以启动 Chromium，不能启动时返回原因"""
+    from playwright.async_api import async_playwright
+    try:
+        async with async_playwright() as playwright:
+            browser = await playwright.chromium.launch(headless=True)
+            await browser.close()
+        return None
+    except Exception as e:
+        return str(e).splitlines()[0]
+
+
+async def _run_level(project_id, test_case_ids, mode, concurrency):
+    from core import settings
+    from core.browser_pool import BrowserPool
+    from core.executor import SCRIPT_RUNNER_PATH, Executor
+    from core.runner_pool import RunnerPool
+
+    executor = Executor()
+    # 池中浏览器数与并发数一致，避免用例排队等待浏览器
+    executor.browser_pool = BrowserPool(
+        size=concurrency,
+        max_contexts=settings.BROWSER_MAX_CONTEXTS,
+        headless=True
+    )
+    # 运行进程数同样与并发数一致；AUTOTEST_RUNNER_POOL_SIZE=0 时每个用例启动新的进程，用于对比
+    if settings.RUNNER_POOL_SIZE:
+        executor.runner_pool = RunnerPool(
+            SCRIPT_RUNNER_PATH,
+            size=concurrency,
+            max_runs=settings.RUNNER_MAX_RUNS,
+            grace=settings.PROCESS_KILL_GRACE
+        )
+    options = {"execution_mode": mode, "screenshot_policy": "never"}
+    result = {
+        "mode": mode,
+        "concurrency": concurrency,
+        "cases": len(test_case_ids),
+        "runner_pool": executor.runner_pool.size
+    }
+    try:
+        if mode == "subprocess":
+            await executor.runner_pool.start()
+        else:
+            started = time.perf_counter()
+            await executor.start_session()
+            result["pool_start_seconds"] = round(time.perf_counter() - started, 3)
+            # 预热：首次连接浏览器和解析脚本的开销不计入吞吐
+            await executor.execute_project(project_id, test_case_ids[:concurrency], concurrency, options)
+
+        started = time.perf_counter()
+        summary = await executor.execute_project(project_id, test_case_ids, concurrency, options)
+        elapsed = time.perf_counter() - started
+    finally:
+        await executor.close_session()
+
+    durations = [r["duration"] for r in summary["results"] if r.get("duration") is not None]
+    result.update({
+        "browser": "cold" if mode == "subprocess" else "warm",
+        "elapsed_seconds": round(elapsed, 3),
+        "cases_per_second": round(len(test_case_ids) / elapsed, 3),
+        "success": summary["success"],
+        "failed": summary["failed"],
+        "duration_seconds": percentiles(durations),
+        "by_category": summary["timings"]["by_category"]
+    })
+    return result
+
+
+async def _run(base_url, modes, concurrency_levels, case_count):
+    reason = await _check_browser()
+    if reason:
+        return {"skipped": f"无法启动 Chromium: {reason}", "results": []}
+
+    project_id = "bench_execution"
+    test_case_ids = generate_project(project_id, case_count, base_url)
+    results = []
+    for mode in modes:
+        for concurrency in concurrency_levels:
+            results.append(await _run_level(project_id, test_case_ids, mode, concurrency))
+            print(f"[execution] {mode} 并发 {concurrency}: {results[-1]['cases_per_second']} 用例/秒")
+    return {"results": results}
+
+
+def run(base_url, modes, concurrency_levels, case_count):
+    """在当前工作目录中生成项目并测量执行吞吐，需在 common.workspace() 中调用"""
+    return asyncio.run(_run(base_url, modes, concurrency_levels, case_count))
@@ -0,0 +1,123 @@
+"""基准测试的公共工具：本地静态站点、临时工作目录和合成项目"""
+from contextlib import contextmanager
+from datetime import datetime
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+import functools
+import json
+import math
+import os
+import shutil
+import sys
+import tempfile
+import threading
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FIXTURE_SITE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "fixture_site")
+
+if REPO_ROOT not in sys.path:
+    sys.path.insert(0, REPO_ROOT)
+
+# 与 playwright codegen 输出格式一致的录制脚本，浏览器以无头模式启动
+SCRIPT_TEMPLATE = '''import re
+from playwright.sync_api import Playwright, sync_playwright, expect
+
+
+def run(playwright: Playwright) -> None:
+    browser = playwright.chromium.launch(headless=True)
+    context = browser.new_context()
+    page = context.new_page()
+    page.goto("{base_url}/index.html")
+    page.get_by_role("link", name="表单").click()
+    page.get_by_label("用户名").fill("{user}")
+    page.get_by_label("角色").select_option("developer")
+    page.get_by_label("同意").check()
+    page.get_by_role("button", name="提交").click()
+    expect(page.get_by_text("提交成功")).to_be_visible()
+    page.goto("{base_url}/list.html")
+    expect(page.get_by_text("条目 200")).to_be_visible()
+
+    # ---------------------
+    context.close()
+    browser.close()
+
+
+with sync_playwright() as playwright:
+    run(playwright)
+'''
+
+
+class _QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class FixtureServer:
+    """在后台线程中通过 http.server 提供 fixture_site 目录"""
+
+    def __init__(self, directory=FIXTURE_SITE):
+        handler = functools.partial(_QuietHandler, directory=directory)
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self.thread = threading.Thread(target=self.server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self.thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@contextmanager
+def workspace():
+    """在临时目录中运行，服务使用的 projects/ 和 logs/ 都写在这里，不影响仓库目录"""
+    path = tempfile.mkdtemp(prefix="autotest-bench-")
+    for name in ("static", "templates"):
+        os.symlink(os.path.join(REPO_ROOT, name), os.path.join(path, name))
+    cwd = os.getcwd()
+    os.chdir(path)
+    try:
+        yield path
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(path, ignore_errors=True)
+
+
+def generate_project(project_id, case_count, base_url, base_path="projects"):
+    """生成包含 case_count 个录制脚本的合成项目，返回测试用例ID列表"""
+    results_dir = os.path.join(base_path, project_id, "results")
+    os.makedirs(results_dir, exist_ok=True)
+    now = datetime.now().isoformat()
+    with open(os.path.join(base_path, project_id, "project_info.json"), "w", encoding="utf-8") as f:
+        json.dump({
+            "project_id": project_id,
+            "project_name": f"基准测试项目 {project_id}",
+            "description": "基准测试生成的合成项目",
+            "created_at": now,
+            "updated_at": now
+        }, f, ensure_ascii=False, indent=2)
+
+    test_case_ids = []
+    for index in range(case_count):
+        test_case_id = f"case_{index:05d}"
+        with open(os.path.join(results_dir, f"{test_case_id}.py"), "w", encoding="utf-8") as f:
+            f.write(SCRIPT_TEMPLATE.format(base_url=base_url, user=f"user-{index}"))
+        test_case_ids.append(test_case_id)
+    return test_case_ids
+
+
+def percentiles(values):
+    """返回 p50 / p95 / max，单位与输入一致"""
+    if not values:
+        return {"p50": None, "p95": None, "max": None}
+    ordered = sorted(values)
+
+    def rank(q):
+        return ordered[max(0, math.ceil(q / 100 * len(ordered)) - 1)]
+
+    return {"p50": round(rank(50), 4), "p95": round(rank(95), 4), "max": round(ordered[-1], 4)}
@@ -0,0 +1,66 @@
+"""比较两次基准测试结果，指标退化超过阈值时以非零状态退出
+
+用法: python -m benchmarks.compare baseline.json current.json [--threshold 0.2]
+"""
+import argparse
+import json
+import sys
+
+
+def _api_metrics(report):
+    metrics = {}
+    for item in report.get("api", []):
+        size = f"projects={item['projects']}" if "projects" in item else f"cases={item['cases']}"
+        metrics[f"api {item['endpoint']} {size} p95_ms"] = (item["p95_ms"], False)
+    return metrics
+
+
+def _execution_metrics(report):
+    metrics = {}
+    for item in report.get("execution", {}).get("results", []):
+        key = f"execution {item['mode']} concurrency={item['concurrency']}"
+        metrics[f"{key} cases_per_second"] = (item["cases_per_second"], True)
+        metrics[f"{key} p95_seconds"] = (item["duration_seconds"]["p95"], False)
+    return metrics
+
+
+def compare(baseline, current, threshold):
+    """返回 (指标名, 基线值, 当前值, 变化比例, 是否退化) 列表，只比较两边都有的指标"""
+    base = {**_api_metrics(baseline), **_execution_metrics(baseline)}
+    cur = {**_api_metrics(current), **_execution_metrics(current)}
+    rows = []
+    for name, (base_value, higher_is_better) in base.items():
+        if name not in cur or not base_value or cur[name][0] is None:
+            continue
+        value = cur[name][0]
+        change = (value - base_value) / base_value
+        regressed = -change > threshold if higher_is_better else change > threshold
+        rows.append((name, base_value, value, change, regressed))
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="比较两次基准测试结果")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=0.2, help="允许的退化比例，默认 0.2")
+    args = parser.parse_args(argv)
+
+    with open(args.baseline, "r", encoding="utf-8") as f:
+        baseline = json.load(f)
+    with open(args.current, "r", encoding="utf-8") as f:
+        current = json.load(f)
+
+    rows = compare(baseline, current, args.threshold)
+    for name, base_value, value, change, regressed in rows:
+        flag = "退化" if regressed else "正常"
+        print(f"[{flag}] {name}: {base_value} -> {value} ({change:+.1%})")
+    regressions = [row for row in rows if row[4]]
+    if regressions:
+        print(f"{len(regressions)} 项指标退化超过 {args.threshold:.0%}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""运行基准测试并输出 JSON 结果
+
+用法: python -m benchmarks.run [--suite api|execution|all] [--quick] [--output results.json]
+"""
+from datetime import datetime
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+
+from benchmarks import bench_api, bench_execution
+from benchmarks.common import REPO_ROOT, FixtureServer, workspace
+
+# 完整规模和 --quick 规模的参数
+PROFILES = {
+    "full": {
+        "project_sizes": [10, 100, 1000],
+        "case_sizes": [100, 1000, 5000],
+        "api_repeat": 50,
+        "concurrency_levels": [1, 2, 4, 8],
+        "case_count": 200,
+    },
+    "quick": {
+        "project_sizes": [10, 100],
+        "case_sizes": [100, 500],
+        "api_repeat": 10,
+        "concurrency_levels": [1, 4],
+        "case_count": 16,
+    },
+}
+EXECUTION_MODES = ["subprocess", "pooled", "native"]
+
+
+def _git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], cwd=REPO_ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="执行吞吐和接口延迟基准测试")
+    parser.add_argument("--suite", choices=["api", "execution", "all"], default="all")
+    parser.add_argument("--quick", action="store_true", help="使用较小的数据规模快速运行")
+    parser.add_argument("--modes", default=",".join(EXECUTION_MODES), help="逗号分隔的执行模式")
+    parser.add_argument("--output", help="结果文件路径，默认输出到标准输出")
+    args = parser.parse_args(argv)
+
+    profile_name = "quick" if args.quick else "full"
+    profile = PROFILES[profile_name]
+    report = {
+        "meta": {
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "profile": profile_name,
+            "timestamp": datetime.now().isoformat()
+        }
+    }
+
+    with FixtureServer() as server:
+        if args.suite in ("api", "all"):
+            with workspace():
+                report["api"] = bench_api.run(
+                    server.base_url, profile["project_sizes"], profile["case_sizes"], profile["api_repeat"]
+                )
+        if args.suite in ("execution", "all"):
+            with workspace():
+                report["execution"] = bench_execution.run(
+                    server.base_url, args.modes.split(","), profile["concurrency_levels"], profile["case_count"]
+                )
+
+    output = json.dumps(report, ensure_ascii=False, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(output + "\n")
+    else:
+        print(output)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
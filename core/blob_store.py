@@ -0,0 +1,49 @@
+import hashlib
+import os
+import re
+import uuid
+
+# 引用格式: <sha256>.<扩展名>
+BLOB_REF_PATTERN = re.compile(r"^[0-9a-f]{64}\.(jpg|webp|png|zip|log)$")
+
+MEDIA_TYPES = {
+    "jpg": "image/jpeg",
+    "webp": "image/webp",
+    "png": "image/png",
+    "zip": "application/zip",
+    "log": "text/plain; charset=utf-8",
+}
+
+
+class BlobStore:
+    """按内容哈希寻址的文件存储（截图、trace 和超长的脚本输出），相同内容只保存一份"""
+
+    def __init__(self, base_path):
+        self.base_path = base_path
+
+    def path(self, ref):
+        """返回引用对应的文件路径，引用格式不合法时返回 None"""
+        if not BLOB_REF_PATTERN.match(ref or ""):
+            return None
+        return os.path.join(self.base_path, ref[:2], ref)
+
+    def put(self, data: bytes, ext: str):
+        """保存内容并返回引用，内容已存在时不重复写入"""
+        ref = f"{hashlib.sha256(data).hexdigest()}.{ext}"
+        path = self.path(ref)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # 先写临时文件再替换，避免并发写入时读到不完整的文件
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        return ref
+
+    def exists(self, ref):
+        path = self.path(ref)
+        return bool(path) and os.path.exists(path)
+
+    @staticmethod
+    def media_type(ref):
+        return MEDIA_TYPES.get(ref.rsplit(".", 1)[-1], "application/octet-stream")
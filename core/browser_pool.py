@@ -0,0 +1,118 @@
+from playwright.async_api import async_playwright
+from loguru import logger
+from contextlib import asynccontextmanager
+import asyncio
+import socket
+import time
+from core import metrics
+
+
+class PooledBrowser:
+    """浏览器池中的一个常驻浏览器实例"""
+
+    def __init__(self, browser, cdp_endpoint):
+        self.browser = browser
+        self.cdp_endpoint = cdp_endpoint
+        self.uses = 0
+
+
+class BrowserPool:
+    def __init__(self, size=2, max_contexts=50, headless=True):
+        self.size = max(1, size)
+        self.max_contexts = max(1, max_contexts)
+        self.headless = headless
+        self.playwright = None
+        self._idle = None
+        self._browsers = []
+        self._lock = asyncio.Lock()
+
+    @property
+    def started(self):
+        return self.playwright is not None
+
+    def _free_port(self):
+        """获取一个空闲端口用于远程调试"""
+        with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+            s.bind(("127.0.0.1", 0))
+            return s.getsockname()[1]
+
+    async def _launch(self):
+        """启动一个开启远程调试端口的浏览器，供测试脚本通过CDP连接"""
+        port = self._free_port()
+        started = time.monotonic()
+        browser = await self.playwright.chromium.launch(
+            headless=self.headless,
+            args=[f"--remote-debugging-port={port}"]
+        )
+        metrics.BROWSER_LAUNCH.observe(time.monotonic() - started, source="pool")
+        pooled = PooledBrowser(browser, f"http://127.0.0.1:{port}")
+        self._browsers.append(pooled)
+        logger.info(f"浏览器池已启动浏览器: {pooled.cdp_endpoint}")
+        return pooled
+
+    async def _close(self, pooled):
+        """关闭池中的浏览器"""
+        if pooled in self._browsers:
+            self._browsers.remove(pooled)
+        try:
+            await pooled.browser.close()
+        except Exception as e:
+            logger.warning(f"关闭浏览器失败: {str(e)}")
+
+    async def start(self):
+        """预先启动浏览器池中的所有浏览器"""
+        async with self._lock:
+            if self.started:
+                return
+            self.playwright = await async_playwright().start()
+            self._idle = asyncio.Queue()
+            try:
+                for _ in range(self.size):
+                    self._idle.put_nowait(await self._launch())
+            except Exception:
+                await self._shutdown()
+                raise
+            logger.info(f"浏览器池已初始化，浏览器数量: {self.size}")
+
+    async def stop(self):
+        """关闭浏览器池"""
+        async with self._lock:
+            await self._shutdown()
+
+    async def _shutdown(self):
+        for pooled in list(self._browsers):
+            await self._close(pooled)
+        if self.playwright:
+            await self.playwright.stop()
+        self.playwright = None
+        self._idle = None
+        logger.info("浏览器池已关闭")
+
+    @asynccontextmanager
+    async def acquire(self):
+        """独占一个常驻浏览器，使用次数达到上限或执行被中止后重启该浏览器"""
+        if not self.started:
+            await self.start()
+        idle = self._idle
+        pooled = await idle.get()
+        aborted = False
+        try:
+            # 浏览器可能已异常退出或上次重启失败，重新启动一个替代
+            if not pooled.browser.is_connected():
+                await self._close(pooled)
+                pooled = await self._launch()
+            yield pooled
+        except asyncio.CancelledError:
+            # 被中止的脚本没有机会关闭它创建的上下文和页面
+            aborted = True
+            raise
+        finally:
+            pooled.uses += 1
+            if self._idle is idle:
+                if aborted or pooled.uses >= self.max_contexts or not pooled.browser.is_connected():
+                    await self._close(pooled)
+                    try:
+                        pooled = await self._launch()
+                    except Exception as e:
+                        logger.error(f"重启浏览器失败: {str(e)}")
+                idle.put_nowait(pooled)
@@ -0,0 +1,124 @@
+from loguru import logger
+from fnmatch import fnmatchcase
+import json
+import os
+import uuid
+
+# 可以屏蔽的 Playwright 请求资源类型，document 是页面本身，不能屏蔽
+BLOCKABLE_RESOURCE_TYPES = (
+    "stylesheet", "image", "media", "font", "script", "texttrack", "xhr", "fetch",
+    "eventsource", "websocket", "manifest", "other"
+)
+
+# 关闭动画和过渡：时长设为 0 而不是 none，页面依赖的 animationend / transitionend 事件仍会触发
+DISABLE_ANIMATIONS_CSS = (
+    "*, *::before, *::after { animation-duration: 0s !important; animation-delay: 0s !important;"
+    " transition-duration: 0s !important; transition-delay: 0s !important; scroll-behavior: auto !important; }"
+)
+DISABLE_ANIMATIONS_SCRIPT = """(() => {
+    const style = document.createElement("style");
+    style.textContent = %s;
+    const append = () => (document.head || document.documentElement).appendChild(style);
+    if (document.documentElement) {
+        append();
+    } else {
+        document.addEventListener("DOMContentLoaded", append);
+    }
+})();""" % json.dumps(DISABLE_ANIMATIONS_CSS)
+
+
+def validate_profile(profile):
+    """校验并规范化执行配置，不合法时抛出 ValueError"""
+    if not isinstance(profile, dict):
+        raise ValueError("执行配置必须是对象")
+    resource_types = list(profile.get("block_resource_types") or [])
+    for resource_type in resource_types:
+        if resource_type not in BLOCKABLE_RESOURCE_TYPES:
+            raise ValueError(f"不支持屏蔽的资源类型: {resource_type}")
+    patterns = list(profile.get("block_url_patterns") or [])
+    if not all(isinstance(pattern, str) and pattern for pattern in patterns):
+        raise ValueError("URL 匹配规则必须是非空字符串")
+    return {
+        "block_resource_types": resource_types,
+        "block_url_patterns": patterns,
+        "disable_animations": bool(profile.get("disable_animations"))
+    }
+
+
+def should_block(profile, resource_type, url):
+    """请求的资源类型或 URL 命中执行配置的屏蔽规则时返回 True"""
+    return resource_type in profile["block_resource_types"] or any(
+        fnmatchcase(url, pattern) for pattern in profile["block_url_patterns"]
+    )
+
+
+def has_routes(profile):
+    return bool(profile["block_resource_types"] or profile["block_url_patterns"])
+
+
+async def apply_profile(context, profile):
+    """在浏览器上下文中应用执行配置：拦截被屏蔽的请求，并按需关闭动画
+
+    应在 route_from_har 之后调用，后注册的路由优先匹配，未屏蔽的请求交给 HAR 回放处理。
+    """
+    if has_routes(profile):
+        async def handle(route):
+            request = route.request
+            if should_block(profile, request.resource_type, request.url):
+                await route.abort("blockedbyclient")
+            else:
+                await route.fallback()
+        await context.route("**/*", handle)
+    if profile["disable_animations"]:
+        await context.add_init_script(script=DISABLE_ANIMATIONS_SCRIPT)
+
+
+class ExecutionProfiles:
+    """项目的执行配置，以 配置名 -> 配置 的形式保存在 projects/<项目ID>/execution_profiles.json"""
+
+    def __init__(self, base_path="projects"):
+        self.base_path = base_path
+
+    def path(self, project_id):
+        return os.path.join(self.base_path, project_id, "execution_profiles.json")
+
+    def load(self, project_id):
+        """读取项目的全部执行配置，文件不存在时返回空字典"""
+        try:
+            with open(self.path(project_id), "r", encoding="utf-8") as f:
+                profiles = json.load(f)
+        except FileNotFoundError:
+            return {}
+        return {name: validate_profile(profile) for name, profile in profiles.items()}
+
+    def get(self, project_id, name):
+        """获取指定名称的执行配置，不存在时抛出 ValueError"""
+        profile = self.load(project_id).get(name)
+        if profile is None:
+            raise ValueError(f"执行配置不存在: {name}")
+        return profile
+
+    def save(self, project_id, name, profile):
+        """新增或替换一个执行配置，返回规范化后的配置"""
+        profile = validate_profile(profile)
+        profiles = self.load(project_id)
+        profiles[name] = profile
+        self._write(project_id, profiles)
+        logger.info(f"执行配置已保存: {project_id}/{name}")
+        return profile
+
+    def delete(self, project_id, name):
+        """删除执行配置，不存在时返回 False"""
+        profiles = self.load(project_id)
+        if profiles.pop(name, None) is None:
+            return False
+        self._write(project_id, profiles)
+        logger.info(f"执行配置已删除: {project_id}/{name}")
+        return True
+
+    def _write(self, project_id, profiles):
+        path = self.path(project_id)
+        tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(profiles, f, ensure_ascii=False, indent=2)
+        os.replace(tmp_path, path)
@@ -1,21 +1,69 @@
-from playwright.async_api import async_playwright
 from loguru import logger
 import json
 import os
 import asyncio
-import importlib.util
 import sys
+import tempfile
+import time
+import uuid
+from collections import deque
 from datetime import datetime
-import base64
-import subprocess
-from playwright._impl._errors import TimeoutError, Error as PlaywrightError
+from core.browser_pool import BrowserPool
+from core.task_queue import TaskQueue
+from core.metadata_store import MetadataStore
+from core.run_history import RunHistory
+from core.script_parser import ScriptParser
+from core.step_engine import StepEngine
+from core.blob_store import BlobStore
+from core.screenshot import ScreenshotCapturer
+from core.timings import Aggregator, Timings, summarize
+from core.scheduler import order_test_cases
+from core.storage_state import StorageStateCache, skip_setup_steps
+from core.execution_profile import ExecutionProfiles, apply_profile
+from core.log_broker import LogBroker
+from core.process_tree import spawn_kwargs, terminate_process_tree
+from core.runner_pool import RUNNER_DONE_MARKER, RunnerPool
+from core import metrics, settings
+from core.settings import resolve_execution_options, resolve_retries, resolve_run_timeout, resolve_schedule
+
+# 录制脚本运行器，负责向脚本注入浏览器池中的浏览器，并记录各阶段耗时
+SCRIPT_RUNNER_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "script_runner.py")
+# 读取子进程输出时每次读取的字节数，行由读取的内容自行拆分，单行输出的长度不受限制
+READ_CHUNK_SIZE = 64 * 1024
+# 用例结果摘要保留的字段，完整结果可以通过 run_id 查询执行记录
+COMPACT_RESULT_KEYS = ("test_case_id", "status", "run_id", "execution_time", "duration", "message", "flaky", "attempts",
+                       "timed_out")
+
+def compact_result(result):
+    """用例结果的摘要，不包含脚本输出、步骤和耗时明细"""
+    return {key: result[key] for key in COMPACT_RESULT_KEYS if key in result}
 
 class Executor:
     def __init__(self):
-        self.playwright = None
-        self.browser = None
-        self.context = None
-        self.page = None
+        self.browser_pool = BrowserPool(
+            size=settings.BROWSER_POOL_SIZE,
+            max_contexts=settings.BROWSER_MAX_CONTEXTS,
+            headless=settings.BROWSER_HEADLESS
+        )
+        self.runner_pool = RunnerPool(
+            SCRIPT_RUNNER_PATH,
+            size=settings.RUNNER_POOL_SIZE,
+            max_runs=settings.RUNNER_MAX_RUNS,
+            grace=settings.PROCESS_KILL_GRACE
+        )
+        self.task_queue = None
+        self.store = MetadataStore()
+        self.run_history = RunHistory(self.store, settings.RUN_RETENTION_DAYS)
+        self.parser = ScriptParser(self.store)
+        self.storage_states = StorageStateCache()
+        self._state_locks = {}
+        self.profiles = ExecutionProfiles()
+        self.logs = LogBroker(
+            buffer_size=settings.LOG_BUFFER_LINES,
+            queue_size=settings.LOG_SUBSCRIBER_QUEUE,
+            put_timeout=settings.LOG_SUBSCRIBER_TIMEOUT,
+            follow_idle_timeout=settings.LOG_FOLLOW_IDLE_TIMEOUT
+        )
         
     def _parse_error(self, error):
         """解析错误信息，返回用户友好的错误描述"""
@@ -136,13 +184,21 @@ class Executor:
             ]
         }
             
+    def _format_error(self, error_info):
+        """将错误描述格式化为展示给用户的消息"""
+        error_message = f"""
+错误类型: {error_info['type']}
+错误原因: {error_info['reason']}
+修复建议:
+{chr(10).join('- ' + s for s in error_info['suggestions'])}
+        """
+        return error_message.strip()
+            
     async def start_session(self):
-        """初始化测试会话"""
+        """初始化测试会话，预先启动浏览器池和脚本运行进程池"""
         try:
-            self.playwright = await async_playwright().start()
-            self.browser = await self.playwright.chromium.launch(headless=False)
-            self.context = await self.browser.new_context()
-            self.page = await self.context.new_page()
+            await self.runner_pool.start()
+            await self.browser_pool.start()
             logger.info("测试会话已初始化")
             return True
         except Exception as e:
@@ -150,159 +206,750 @@ class Executor:
             return False
             
     async def close_session(self):
-        """关闭测试会话"""
+        """关闭测试会话，释放浏览器池和脚本运行进程池"""
         try:
-            if self.browser:
-                await self.browser.close()
-            if self.playwright:
-                await self.playwright.stop()
-            self.browser = None
-            self.playwright = None
-            self.context = None
-            self.page = None
+            await self.runner_pool.stop()
+            await self.browser_pool.stop()
             logger.info("测试会话已关闭")
             return True
         except Exception as e:
             logger.error(f"关闭测试会话失败: {str(e)}")
             return False
             
-    async def execute_test_case(self, project_id: str, test_case_id: str):
-        """执行测试用例"""
+    async def _read_stream(self, stream, lines, log=None, name="stdout", until=None):
+        """逐行读取子进程输出流，同时写入实时执行日志
+        
+        按块读取后自行拆分行，避免 readline 在单行超过 64 KiB 时抛出异常。
+        until 为常驻运行进程一次执行结束的标记，读到标记时停止并返回标记之后的内容，读到流结束时返回 None。
+        """
+        pending = bytearray()
+        while True:
+            chunk = await stream.read(READ_CHUNK_SIZE)
+            if chunk:
+                newline = chunk.rfind(b"\n")
+                if newline < 0:
+                    pending.extend(chunk)
+                    continue
+                data = bytes(pending) + chunk[:newline + 1]
+                pending = bytearray(chunk[newline + 1:])
+            else:
+                # 流结束，最后一行可能没有换行
+                data = bytes(pending)
+                pending = bytearray()
+            for line in data.splitlines(keepends=True):
+                text = line.decode("utf-8", errors="replace")
+                done = False
+                if until and until in text:
+                    # 脚本最后的输出可能没有换行，与标记位于同一行
+                    text, _, rest = text.partition(until)
+                    done = True
+                if text:
+                    lines.append(text)
+                    if log:
+                        await log.publish(text, name)
+                if done:
+                    return rest.strip()
+            if not chunk:
+                return None
+            
+    async def _read_outputs(self, process, stdout_lines, stderr_lines, log=None, until=None):
+        """同时读取标准输出和标准错误；任一读取失败时取消另一个，不留下仍在等待输出的读取任务"""
+        readers = [
+            asyncio.create_task(self._read_stream(process.stdout, stdout_lines, log, "stdout", until)),
+            asyncio.create_task(self._read_stream(process.stderr, stderr_lines, log, "stderr", until))
+        ]
+        try:
+            return await asyncio.gather(*readers)
+        except BaseException:
+            for reader in readers:
+                reader.cancel()
+            await asyncio.gather(*readers, return_exceptions=True)
+            raise
+            
+    async def _run_script(self, args, env=None, log=None):
+        """在单独的进程中异步执行同步测试脚本，避免阻塞事件循环
+        
+        脚本进程位于单独的进程组，执行超时、被取消或读取输出失败时结束脚本进程及其启动的浏览器。
+        """
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            env=env,
+            **spawn_kwargs()
+        )
+        
+        # 逐行读取输出和错误，直到进程结束
+        stdout_lines = []
+        stderr_lines = []
+        try:
+            await self._read_outputs(process, stdout_lines, stderr_lines, log)
+            await process.wait()
+        except BaseException:
+            logger.warning(f"执行被中止，结束脚本进程: {process.pid}")
+            # 等待进程树结束，再次被取消时进程树仍在后台结束
+            await asyncio.shield(terminate_process_tree(process, settings.PROCESS_KILL_GRACE))
+            raise
+        return process.returncode, "".join(stdout_lines), "".join(stderr_lines)
+            
+    async def _run_in_runner(self, script_path, env, log=None):
+        """在运行进程池中已导入 Playwright 的常驻进程里执行脚本，只传递与本进程不同的环境变量"""
+        async with self.runner_pool.acquire() as runner:
+            await runner.send(script_path, {key: value for key, value in env.items() if os.environ.get(key) != value})
+            stdout_lines = []
+            stderr_lines = []
+            try:
+                done, _ = await self._read_outputs(
+                    runner.process, stdout_lines, stderr_lines, log, RUNNER_DONE_MARKER
+                )
+            except BaseException:
+                # 运行进程仍停留在脚本中途，不能再放回进程池
+                logger.warning(f"执行被中止，结束脚本运行进程: {runner.process.pid}")
+                await asyncio.shield(self.runner_pool.abort(runner))
+                raise
+            if done is None:
+                # 运行进程在执行中退出，例如脚本调用了 os._exit
+                await runner.process.wait()
+                returncode = runner.process.returncode
+            else:
+                returncode = json.loads(done)["returncode"]
+        return returncode, "".join(stdout_lines), "".join(stderr_lines)
+            
+    async def execute_test_case(self, project_id: str, test_case_id: str, options: dict = None, run_id: str = None):
+        """执行测试用例，并记录执行次数、耗时和并发数指标；超过执行时间上限时中止执行
+
+        run_id 为本次执行的执行记录ID，未指定时自动生成。
+        """
+        mode = (options or {}).get("execution_mode") or settings.EXECUTION_DEFAULTS["execution_mode"]
+        timeout = (options or {}).get("case_timeout")
+        timeout = float(settings.EXECUTION_DEFAULTS["case_timeout"] if timeout is None else timeout) or None
+        metrics.EXECUTIONS_IN_FLIGHT.inc(mode=mode)
+        started = time.monotonic()
+        # 脚本存在时逐行记录执行输出，执行记录ID在执行开始时确定，便于实时订阅
+        log = None
+        if os.path.exists(f"projects/{project_id}/results/{test_case_id}.py"):
+            log = self.logs.open(project_id, run_id or uuid.uuid4().hex, test_case_id)
+        result = None
         try:
+            result = await asyncio.wait_for(self._execute_test_case(project_id, test_case_id, options, log), timeout)
+        except asyncio.TimeoutError:
+            metrics.EXECUTION_TIMEOUTS.inc(mode=mode)
+            result = await self._timeout_result(project_id, test_case_id, timeout, started, log)
+        finally:
+            metrics.EXECUTIONS_IN_FLIGHT.dec(mode=mode)
+            if log:
+                # 没有结果说明执行被取消
+                await self.logs.close(log, result["status"] if result else "cancelled")
+        self._observe(mode, result, time.monotonic() - started)
+        return result
+            
+    def _observe(self, mode: str, result: dict, duration: float):
+        """记录一次执行结束后的执行次数、耗时和脚本启动浏览器的耗时指标"""
+        metrics.EXECUTIONS.inc(mode=mode, status=result["status"])
+        metrics.EXECUTION_DURATION.observe(duration, mode=mode)
+        # 脚本自行启动浏览器的耗时
+        for phase in (result.get("timings") or {}).get("phases", []):
+            if phase["category"] == "browser_launch" and not phase.get("error"):
+                metrics.BROWSER_LAUNCH.observe(phase["duration"], source="script")
+            
+    async def _execute_test_case(self, project_id: str, test_case_id: str, options: dict = None, log=None):
+        """执行测试用例，log 为实时执行日志"""
+        try:
+            options = resolve_execution_options(None, **(options or {}))
+            
             # 检查脚本文件是否存在
             script_path = f"projects/{project_id}/results/{test_case_id}.py"
             if not os.path.exists(script_path):
                 raise Exception("测试脚本文件不存在")
                 
-            logger.info(f"开始执行测试用例: {test_case_id}")
-            
-            # 在单独的进程中执行同步测试脚本
-            process = subprocess.Popen(
-                [sys.executable, script_path],
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True
-            )
+            logger.info(f"开始执行测试用例: {test_case_id}, 执行模式: {options['execution_mode']}")
+            if log:
+                await log.publish(f"开始执行测试用例: {test_case_id}, 执行模式: {options['execution_mode']}", "system")
+            started = time.monotonic()
+            har_path = self._replay_har_path(script_path, options)
+            profile = self._execution_profile(project_id, options)
+            state = await self._storage_state(project_id, test_case_id, options)
+            
+            if options["execution_mode"] == "native":
+                result = await self._execute_native(
+                    project_id, test_case_id, script_path, options, har_path, state, profile, log
+                )
+                if har_path:
+                    result["har_mode"] = options["har_mode"]
+                if state:
+                    result["setup_case_id"] = options["setup_case_id"]
+                if profile:
+                    result["execution_profile"] = options["execution_profile"]
+                if log:
+                    result["run_id"] = log.run_id
+                await self._record_run(project_id, result)
+                logger.info(f"测试用例执行完成: {test_case_id}")
+                return result
             
-            # 获取输出和错误
-            stdout, stderr = process.communicate()
+            state_env = None
+            if state:
+                state_env = {
+                    "AUTOTEST_STORAGE_STATE_FILE": state["path"],
+                    "AUTOTEST_SETUP_SCRIPT": state["setup_script"],
+                    "AUTOTEST_RESUME_URL": state["url"] or ""
+                }
+            returncode, stdout, stderr, timings, trace = await self._execute_script(
+                project_id, script_path, options, har_path, state_env, profile, log
+            )
+            duration = round(time.monotonic() - started, 3)
             
             # 检查执行结果
-            if process.returncode == 0:
+            if returncode == 0:
                 result = {
                     "status": "success",
                     "test_case_id": test_case_id,
                     "execution_time": datetime.now().isoformat(),
                     "message": "测试用例执行成功",
-                    "output": stdout
+                    "duration": duration,
+                    **self._bounded_output(project_id, stdout),
+                    "timings": timings
                 }
             else:
                 # 解析错误信息
                 error_info = self._parse_error(stderr)
-                error_message = f"""
-错误类型: {error_info['type']}
-错误原因: {error_info['reason']}
-修复建议:
-{chr(10).join('- ' + s for s in error_info['suggestions'])}
-                """
-                
                 result = {
                     "status": "error",
                     "test_case_id": test_case_id,
                     "execution_time": datetime.now().isoformat(),
-                    "message": error_message.strip(),
-                    "output": stdout,
+                    "message": self._format_error(error_info),
+                    "duration": duration,
+                    **self._bounded_output(project_id, stdout),
+                    "timings": timings,
                     "error_details": error_info
                 }
+            if trace:
+                result["trace"] = trace
+            if har_path:
+                result["har_mode"] = options["har_mode"]
+            if state:
+                result["setup_case_id"] = options["setup_case_id"]
+            if profile:
+                result["execution_profile"] = options["execution_profile"]
             
+            if log:
+                result["run_id"] = log.run_id
+            await self._record_run(project_id, result)
             logger.info(f"测试用例执行完成: {test_case_id}")
             return result
             
+        except ValueError as e:
+            # 执行选项不合法，例如指定的执行配置不存在
+            return {
+                "status": "error",
+                "test_case_id": test_case_id,
+                "execution_time": datetime.now().isoformat(),
+                "message": str(e)
+            }
         except Exception as e:
             error_info = self._parse_error(e)
-            error_message = f"""
-错误类型: {error_info['type']}
-错误原因: {error_info['reason']}
-修复建议:
-{chr(10).join('- ' + s for s in error_info['suggestions'])}
-            """
-            
             return {
                 "status": "error",
                 "test_case_id": test_case_id,
                 "execution_time": datetime.now().isoformat(),
-                "message": error_message.strip(),
+                "message": self._format_error(error_info),
                 "error_details": error_info
             }
             
-    def _load_test_case(self, project_id: str, test_case_id: str):
-        """加载测试用例数据"""
+    async def _timeout_result(self, project_id: str, test_case_id: str, timeout: float, started: float, log=None):
+        """用例执行超时的结果，同样记录到执行记录"""
+        message = f"测试用例执行超过时间上限 {timeout:g} 秒，已中止执行"
+        logger.warning(f"{message}: {test_case_id}")
+        result = {
+            "status": "error",
+            "test_case_id": test_case_id,
+            "execution_time": datetime.now().isoformat(),
+            "message": message,
+            "duration": round(time.monotonic() - started, 3),
+            "timed_out": True
+        }
+        if log:
+            await log.publish(message, "system")
+            result["run_id"] = log.run_id
+        await self._record_run(project_id, result)
+        return result
+            
+    def _bounded_output(self, project_id: str, output: str):
+        """超长的脚本输出只保留末尾，完整输出保存到内容寻址存储并返回引用"""
+        limit = settings.OUTPUT_INLINE_LIMIT
+        if len(output) <= limit:
+            return {"output": output}
         try:
-            file_path = f"projects/{project_id}/{test_case_id}.json"
-            with open(file_path, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            ref = BlobStore(f"projects/{project_id}/blobs").put(output.encode("utf-8"), "log")
         except Exception as e:
-            logger.error(f"加载测试用例失败: {str(e)}")
+            logger.warning(f"保存脚本输出失败: {str(e)}")
+            ref = None
+        return {
+            "output": f"...（省略 {len(output) - limit} 个字符）\n" + output[-limit:],
+            "output_truncated": True,
+            "output_ref": ref
+        }
+            
+    def _replay_har_path(self, script_path: str, options: dict):
+        """开启 HAR 回放且录制时保存了 HAR 时，返回 HAR 文件的绝对路径"""
+        if options["har_mode"] == "off":
+            return None
+        har_path = os.path.abspath(script_path[:-len(".py")] + ".har")
+        if not os.path.exists(har_path):
+            logger.warning(f"测试用例录制时没有保存 HAR，访问真实网络: {script_path}")
+            return None
+        return har_path
+            
+    def _execution_profile(self, project_id: str, options: dict):
+        """返回选项中指定的执行配置，未指定时返回 None，配置不存在时抛出 ValueError"""
+        if not options.get("execution_profile"):
+            return None
+        return self.profiles.get(project_id, options["execution_profile"])
+            
+    async def _storage_state(self, project_id: str, test_case_id: str, options: dict):
+        """返回可注入的登录状态，缓存过期时先执行 setup 用例重新生成；setup 用例本身不注入"""
+        setup_case_id = options.get("setup_case_id")
+        if not setup_case_id or setup_case_id == test_case_id:
             return None
+        # 并发执行的用例只需要一个执行 setup 用例，其余等待后直接使用新的缓存
+        lock = self._state_locks.setdefault(project_id, asyncio.Lock())
+        async with lock:
+            state = self.storage_states.get(project_id, setup_case_id, int(options["storage_state_ttl"]))
+            if state is None:
+                state = await self._refresh_storage_state(project_id, setup_case_id, options)
+        if state:
+            state["setup_script"] = os.path.abspath(f"projects/{project_id}/results/{setup_case_id}.py")
+        return state
             
-    def execute_step(self, step):
-        """执行单个测试步骤"""
+    async def _refresh_storage_state(self, project_id: str, setup_case_id: str, options: dict):
+        """执行 setup 用例并缓存其登录状态，失败时返回 None，用例按原样执行其中的登录步骤"""
+        script_path = f"projects/{project_id}/results/{setup_case_id}.py"
+        if not os.path.exists(script_path):
+            logger.warning(f"setup 用例不存在: {project_id}/{setup_case_id}")
+            return None
+        fd, state_path = tempfile.mkstemp(prefix="autotest-state-", suffix=".json")
+        os.close(fd)
         try:
-            if step["type"] == "click":
-                self.page.click(step["selector"])
-            elif step["type"] == "fill":
-                self.page.fill(step["selector"], step["value"])
-            
-            # 捕获截图
-            screenshot = self.page.screenshot()
-            screenshot_base64 = base64.b64encode(screenshot).decode()
-            
-            result = {
-                "status": "success",
-                "screenshot": screenshot_base64,
-                "timestamp": datetime.now().isoformat()
+            logger.info(f"登录状态缓存已过期，执行 setup 用例: {project_id}/{setup_case_id}")
+            # 除 subprocess 模式外都在浏览器池的常驻浏览器中执行 setup 用例
+            setup_options = {
+                **options,
+                "execution_mode": "subprocess" if options["execution_mode"] == "subprocess" else "pooled",
+                "trace": False
             }
-            logger.info(f"步骤执行成功: {step['type']}")
-            return result
+            returncode, _, stderr, _, _ = await self._execute_script(
+                project_id, script_path, setup_options, extra_env={"AUTOTEST_STORAGE_STATE_OUT": state_path},
+                profile=self._execution_profile(project_id, options)
+            )
+            if returncode != 0:
+                logger.warning(f"setup 用例执行失败: {setup_case_id}, {stderr.strip()[-500:]}")
+                return None
+            with open(state_path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return self.storage_states.save(project_id, setup_case_id, data["storage_state"], data["url"])
         except Exception as e:
-            logger.error(f"步骤执行失败: {str(e)}")
-            return {
-                "status": "failed",
-                "error": str(e),
-                "timestamp": datetime.now().isoformat()
-            }
+            logger.error(f"生成登录状态失败: {setup_case_id}, {str(e)}")
+            return None
+        finally:
+            os.remove(state_path)
             
-    def execute_test_case_sync(self, project_id, test_case_id):
-        """执行完整测试用例"""
+    async def _execute_script(self, project_id: str, script_path: str, options: dict, har_path: str = None,
+                              extra_env: dict = None, profile: dict = None, log=None):
+        """通过 script_runner 在子进程中执行录制脚本，并收集各阶段耗时和 trace"""
+        timings = Timings()
+        fd, timings_path = tempfile.mkstemp(prefix="autotest-timings-", suffix=".json")
+        os.close(fd)
+        trace_path = timings_path[:-len(".json")] + ".zip" if options["trace"] else None
+        env = dict(os.environ, AUTOTEST_TIMINGS_FILE=timings_path, **(extra_env or {}))
+        if trace_path:
+            env["AUTOTEST_TRACE_FILE"] = trace_path
+        if har_path:
+            env["AUTOTEST_HAR_FILE"] = har_path
+            env["AUTOTEST_HAR_NOT_FOUND"] = "abort" if options["har_mode"] == "offline" else "fallback"
+        if profile:
+            env["AUTOTEST_EXECUTION_PROFILE_JSON"] = json.dumps(profile)
         try:
-            # 加载测试用例
-            test_case = self._load_test_case(project_id, test_case_id)
-            
-            results = []
-            for step in test_case["steps"]:
-                result = self.execute_step(step)
-                results.append({
-                    "step": step,
-                    "result": result
-                })
-            
-            # 保存执行结果
-            execution_result = {
-                "project_id": project_id,
-                "test_case_id": test_case_id,
-                "execution_time": datetime.now().isoformat(),
-                "status": "success" if all(r["result"]["status"] == "success" for r in results) else "failed",
-                "steps": results
-            }
+            if options["execution_mode"] == "pooled":
+                # 在浏览器池中常驻浏览器的全新上下文里执行脚本
+                started = time.monotonic()
+                async with self.browser_pool.acquire() as pooled:
+                    timings.record("browser_acquire", "browser_acquire", started)
+                    env["AUTOTEST_CDP_ENDPOINT"] = pooled.cdp_endpoint
+                    returncode, stdout, stderr, runner_phases = await self._run_instrumented(
+                        env, script_path, timings_path, timings, log
+                    )
+            else:
+                returncode, stdout, stderr, runner_phases = await self._run_instrumented(
+                    env, script_path, timings_path, timings, log
+                )
+            timings.phases.extend(runner_phases)
+            trace = None
+            if trace_path and os.path.exists(trace_path):
+                with open(trace_path, "rb") as f:
+                    trace = BlobStore(f"projects/{project_id}/blobs").put(f.read(), "zip")
+            return returncode, stdout, stderr, summarize(timings.phases), trace
+        finally:
+            for path in (timings_path, trace_path):
+                if path and os.path.exists(path):
+                    os.remove(path)
+            
+    async def _run_instrumented(self, env, script_path, timings_path, timings, log=None):
+        """执行脚本，将 script_runner 记录的阶段换算为相对本次执行开始的时间"""
+        offset = time.monotonic() - timings.origin
+        env["AUTOTEST_SPAWN_TIME"] = str(time.time())
+        if self.runner_pool.enabled:
+            returncode, stdout, stderr = await self._run_in_runner(script_path, env, log)
+        else:
+            returncode, stdout, stderr = await self._run_script([SCRIPT_RUNNER_PATH, script_path], env, log)
+        elapsed = time.monotonic() - timings.origin
+        
+        phases = []
+        try:
+            with open(timings_path, "r", encoding="utf-8") as f:
+                phases = json.load(f)
+        except (OSError, ValueError):
+            logger.warning("未能读取脚本执行的阶段耗时")
+        for phase in phases:
+            phase["start"] = round(phase["start"] + offset, 4)
+        # 脚本结束到进程退出的耗时
+        end = max((phase["start"] + phase["duration"] for phase in phases), default=offset)
+        phases.append({
+            "name": "process_exit",
+            "category": "teardown",
+            "start": round(end, 4),
+            "duration": round(max(0.0, elapsed - end), 4)
+        })
+        return returncode, stdout, stderr, phases
+            
+    async def _execute_native(self, project_id: str, test_case_id: str, script_path: str, options: dict,
+                              har_path: str = None, state: dict = None, profile: dict = None, log=None):
+        """在浏览器池的全新上下文中直接解释执行步骤 IR，不启动 Python 进程"""
+        steps = self.parser.parse_file(script_path)
+        if state:
+            # 跳过与 setup 用例相同的登录步骤
+            steps = skip_setup_steps(steps, self.parser.parse_file(state["setup_script"]), state["url"])
+        screenshots = ScreenshotCapturer(
+            BlobStore(f"projects/{project_id}/blobs"),
+            policy=options["screenshot_policy"],
+            every=int(options["screenshot_every"]),
+            fmt=options["screenshot_format"],
+            quality=settings.SCREENSHOT_QUALITY,
+            thumbnail_width=settings.SCREENSHOT_THUMBNAIL_WIDTH
+        )
+        timings = Timings()
+        trace = None
+        started = time.monotonic()
+        async with self.browser_pool.acquire() as pooled:
+            timings.record("browser_acquire", "browser_acquire", started)
+            with timings.phase("context_creation"):
+                context = await pooled.browser.new_context(
+                    storage_state=state["path"] if state else None,
+                    reduced_motion="reduce" if profile and profile["disable_animations"] else None
+                )
+                context.set_default_timeout(settings.STEP_TIMEOUT_MS)
+                if har_path:
+                    await context.route_from_har(
+                        har_path, not_found="abort" if options["har_mode"] == "offline" else "fallback"
+                    )
+                if profile:
+                    await apply_profile(context, profile)
+                if options["trace"]:
+                    await context.tracing.start(screenshots=True, snapshots=True)
+            try:
+                step_results = await StepEngine(context, screenshots, timings, log).run(steps)
+            finally:
+                with timings.phase("context_close", "teardown"):
+                    if options["trace"]:
+                        trace = await self._stop_tracing(project_id, context)
+                    await context.close()
+        duration = round(time.monotonic() - started, 3)
+        
+        result = {
+            "status": "success",
+            "project_id": project_id,
+            "test_case_id": test_case_id,
+            "execution_time": datetime.now().isoformat(),
+            "message": "测试用例执行成功",
+            "duration": duration,
+            "steps": step_results,
+            "timings": summarize(timings.phases)
+        }
+        if trace:
+            result["trace"] = trace
+        failed = next((r["result"] for r in step_results if r["result"]["status"] == "failed"), None)
+        if failed:
+            error_info = self._parse_error(failed.get("error"))
+            result["status"] = "error"
+            result["message"] = self._format_error(error_info)
+            result["error_details"] = error_info
+        return result
             
-            result_path = f"projects/{project_id}/results/{test_case_id}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.json"
-            os.makedirs(os.path.dirname(result_path), exist_ok=True)
+    async def _stop_tracing(self, project_id: str, context):
+        """停止 tracing 并将 trace 文件保存到内容寻址存储，返回引用"""
+        fd, trace_path = tempfile.mkstemp(prefix="autotest-trace-", suffix=".zip")
+        os.close(fd)
+        try:
+            await context.tracing.stop(path=trace_path)
+            with open(trace_path, "rb") as f:
+                return BlobStore(f"projects/{project_id}/blobs").put(f.read(), "zip")
+        except Exception as e:
+            logger.warning(f"保存 trace 失败: {str(e)}")
+            return None
+        finally:
+            os.remove(trace_path)
+            
+    async def _record_run(self, project_id: str, result: dict):
+        """将执行结果追加到执行记录，并同步到元数据索引；文件和数据库写入在线程中进行，不阻塞事件循环"""
+        try:
+            await asyncio.to_thread(self._write_run, project_id, result)
+        except Exception as e:
+            logger.error(f"记录执行结果失败: {str(e)}")
+            
+    def _write_run(self, project_id: str, result: dict):
+        self.run_history.append(project_id, result)
+        self.store.record_run(
+            project_id,
+            result["test_case_id"],
+            result["status"],
+            result.get("duration"),
+            result["execution_time"],
+            result.get("message")
+        )
+            
+    async def dispatch_test_case(self, project_id: str, test_case_id: str, options: dict = None, run_id: str = None):
+        """按执行后端分派用例：在本进程中执行，或提交到任务队列由 worker 执行"""
+        if settings.EXECUTION_BACKEND == "queue":
+            if not self.task_queue:
+                self.task_queue = TaskQueue(settings.TASK_QUEUE_PATH)
+            # 用例在 worker 进程中执行，执行指标在 API 进程中按队列返回的结果记录；正在执行的用例数包括排队中的任务
+            mode = (options or {}).get("execution_mode") or settings.EXECUTION_DEFAULTS["execution_mode"]
+            metrics.EXECUTIONS_IN_FLIGHT.inc(mode=mode)
+            started = time.monotonic()
+            try:
+                result = await self.task_queue.run(
+                    project_id, test_case_id, options,
+                    claim_timeout=settings.TASK_CLAIM_TIMEOUT,
+                    worker_timeout=settings.TASK_LEASE_SECONDS,
+                    timeout=settings.TASK_WAIT_TIMEOUT or None,
+                    run_id=run_id
+                )
+            finally:
+                metrics.EXECUTIONS_IN_FLIGHT.dec(mode=mode)
+            if result.get("timed_out"):
+                metrics.EXECUTION_TIMEOUTS.inc(mode=mode)
+            # 耗时使用 worker 记录的执行耗时，不包括排队时间
+            self._observe(mode, result, result.get("duration") or time.monotonic() - started)
+            return result
+        return await self.execute_test_case(project_id, test_case_id, options, run_id)
             
-            with open(result_path, "w", encoding="utf-8") as f:
-                json.dump(execution_result, f, ensure_ascii=False, indent=2)
+    async def list_live_logs(self, project_id: str):
+        """列出项目中正在执行、可以实时订阅输出的用例，包括任务队列中正在由 worker 执行的用例"""
+        active = self.logs.list_active(project_id)
+        if settings.EXECUTION_BACKEND == "queue":
+            if not self.task_queue:
+                self.task_queue = TaskQueue(settings.TASK_QUEUE_PATH)
+            tasks = await asyncio.to_thread(self.task_queue.list_running, project_id)
+            active += [
+                {
+                    "run_id": task["run_id"],
+                    "project_id": project_id,
+                    "test_case_id": task["test_case_id"],
+                    "started_at": task["started_at"],
+                    "worker_id": task["worker_id"]
+                }
+                for task in tasks if task["run_id"]
+            ]
+        return active
             
-            logger.info(f"测试用例执行完成，结果已保存到: {result_path}")
-            return execution_result
+    async def _dispatch_with_retries(self, project_id: str, test_case_id: str, options: dict, retries: int,
+                                     on_attempt=None):
+        """执行用例，失败后最多重试 retries 次；重试后通过的用例标记为 flaky
+
+        每次执行前以该次执行的执行记录ID调用 on_attempt。
+        """
+        attempts = []
+        attempt_options = options
+        while True:
+            run_id = uuid.uuid4().hex
+            if on_attempt:
+                on_attempt(run_id)
+            try:
+                result = await self.dispatch_test_case(project_id, test_case_id, attempt_options, run_id)
+            except Exception as e:
+                result = {
+                    "status": "error",
+                    "test_case_id": test_case_id,
+                    "message": str(e),
+                    "execution_time": datetime.now().isoformat()
+                }
+            attempts.append(result)
+            if result["status"] == "success" or len(attempts) > retries:
+                break
+            # subprocess 模式每次都要重新启动浏览器，重试改用浏览器池中的常驻浏览器
+            mode = (options or {}).get("execution_mode") or settings.EXECUTION_DEFAULTS["execution_mode"]
+            if mode == "subprocess":
+                attempt_options = {**(options or {}), "execution_mode": "pooled"}
+            logger.info(f"测试用例执行失败，开始第 {len(attempts)} 次重试: {test_case_id}")
+
+        if len(attempts) > 1:
+            result["attempts"] = [
+                {key: attempt.get(key) for key in ("run_id", "status", "execution_time", "duration", "message")}
+                for attempt in attempts
+            ]
+            result["flaky"] = result["status"] == "success"
+        return result
+
+    async def execute_project(self, project_id: str, test_case_ids, concurrency: int = 1, options: dict = None,
+                              on_result=None, order: str = None, max_failures: int = None, retries: int = None,
+                              rerun_of: str = None, keep_results: bool = True, run_timeout: float = None):
+        """按调度顺序通过有界并发池执行多个测试用例，并汇总执行结果
+        
+        order 为用例执行顺序，未指定时使用全局配置；max_failures 为失败上限，失败数达到上限后
+        不再开始新的用例，剩余用例记为 skipped；retries 为失败用例的自动重试次数。on_result 为
+        可选的异步回调，每个用例执行完成或被跳过后立即以其最终结果调用。rerun_of 为重新执行失败
+        用例时对应的上一次项目执行ID。keep_results 为 False 时汇总中每个用例只保留状态等摘要，
+        完整结果只传给 on_result，流式输出结果时内存不随用例数增长。run_timeout 为项目执行的时间上限（秒），
+        超过后中止正在执行的用例，剩余用例记为 skipped，未指定时使用全局配置
+        """
+        order, max_failures = resolve_schedule(order, max_failures)
+        retries = resolve_retries(retries)
+        run_timeout = resolve_run_timeout(run_timeout)
+        project_run_id = uuid.uuid4().hex
+        started_at = datetime.now().isoformat()
+        scheduled = order_test_cases(test_case_ids, self.store.get_schedule_history(project_id), order)
+        pending = deque(enumerate(scheduled))
+        results = [None] * len(scheduled)
+        aggregator = Aggregator()
+        failures = 0
+        # 正在执行的用例序号 -> (本次执行的开始时间, 执行记录ID)
+        running = {}
+        
+        async def finish(index, result):
+            aggregator.add(result)
+            results[index] = result if keep_results else compact_result(result)
+            if on_result:
+                await on_result(result)
+        
+        async def worker():
+            nonlocal failures
+            while pending:
+                index, test_case_id = pending.popleft()
+                if max_failures and failures >= max_failures:
+                    result = {
+                        "status": "skipped",
+                        "test_case_id": test_case_id,
+                        "message": f"失败数已达到上限 {max_failures}，跳过执行",
+                        "execution_time": datetime.now().isoformat()
+                    }
+                else:
+                    def on_attempt(run_id, index=index):
+                        running[index] = (time.monotonic(), run_id)
+
+                    result = await self._dispatch_with_retries(project_id, test_case_id, options, retries, on_attempt)
+                    running.pop(index, None)
+                    if result["status"] != "success":
+                        failures += 1
+                await finish(index, result)
+                    
+        logger.info(f"开始执行项目: {project_id}, 用例数: {len(scheduled)}, 并发数: {concurrency}, 执行顺序: {order}")
+        # 每个 worker 按调度顺序领取下一个用例，保证较早排定的用例较早开始
+        timed_out = False
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(worker() for _ in range(max(1, min(concurrency, len(scheduled)))))),
+                run_timeout
+            )
+        except asyncio.TimeoutError:
+            # 正在执行的用例已被中止，其脚本进程树已结束
+            timed_out = True
+            logger.warning(f"项目执行超过时间上限 {run_timeout:g} 秒，已中止: {project_id}")
+            for index, test_case_id in enumerate(scheduled):
+                if results[index] is not None:
+                    continue
+                result = {
+                    "status": "error" if index in running else "skipped",
+                    "test_case_id": test_case_id,
+                    "message": f"项目执行超过时间上限 {run_timeout:g} 秒，"
+                               + ("已中止执行" if index in running else "跳过执行"),
+                    "execution_time": datetime.now().isoformat()
+                }
+                if index in running:
+                    # 被中止的用例没有写入执行记录，与单个用例超时一样记录，沿用执行日志的执行记录ID；
+                    # 跳过的用例没有执行，不计入执行统计
+                    started, run_id = running[index]
+                    result["timed_out"] = True
+                    result["duration"] = round(time.monotonic() - started, 3)
+                    result["run_id"] = run_id
+                    await self._record_run(project_id, result)
+                await finish(index, result)
+        
+        success_count = sum(1 for r in results if r["status"] == "success")
+        skipped_count = sum(1 for r in results if r["status"] == "skipped")
+        failed_count = len(results) - success_count - skipped_count
+        # 首次执行的结果，重试前的状态记录在 attempts 中
+        first_statuses = [r["attempts"][0]["status"] if r.get("attempts") else r["status"] for r in results]
+        first_success = sum(1 for status in first_statuses if status == "success")
+        flaky_cases = [r["test_case_id"] for r in results if r.get("flaky")]
+        message = f"执行完成: 成功 {success_count} 个, 失败 {failed_count} 个"
+        if skipped_count:
+            message += f", 跳过 {skipped_count} 个"
+        if flaky_cases:
+            message += f", 其中 {len(flaky_cases)} 个重试后通过"
+        if timed_out:
+            message += f", 超过时间上限 {run_timeout:g} 秒后中止"
+        summary = {
+            "status": "success",
+            "message": message,
+            "project_run_id": project_run_id,
+            "rerun_of": rerun_of,
+            "total": len(results),
+            "success": success_count,
+            "failed": failed_count,
+            "skipped": skipped_count,
+            "first_attempt": {
+                "success": first_success,
+                "failed": len(results) - skipped_count - first_success
+            },
+            "flaky": len(flaky_cases),
+            "flaky_cases": flaky_cases,
+            "concurrency": concurrency,
+            "order": order,
+            "max_failures": max_failures,
+            "retries": retries,
+            "run_timeout": run_timeout,
+            "timed_out": timed_out,
+            "timings": aggregator.summary(),
+            "results": results
+        }
+        await self._record_project_run(project_id, started_at, summary)
+        return summary
+        
+    async def _record_project_run(self, project_id: str, started_at: str, summary: dict):
+        """记录项目执行的汇总和每个用例的最终状态，供重新执行失败用例时使用；数据库写入在线程中进行"""
+        try:
+            await asyncio.to_thread(self.store.record_project_run, {
+                "project_run_id": summary["project_run_id"],
+                "project_id": project_id,
+                "rerun_of": summary["rerun_of"],
+                "started_at": started_at,
+                "finished_at": datetime.now().isoformat(),
+                "total": summary["total"],
+                "success": summary["success"],
+                "failed": summary["failed"],
+                "skipped": summary["skipped"],
+                "first_attempt_success": summary["first_attempt"]["success"],
+                "first_attempt_failed": summary["first_attempt"]["failed"],
+                "flaky": summary["flaky"],
+                "case_statuses": {r["test_case_id"]: r["status"] for r in summary["results"]}
+            })
         except Exception as e:
-            logger.error(f"测试用例执行失败: {str(e)}")
-            return None 
\ No newline at end of file
+            logger.error(f"记录项目执行结果失败: {str(e)}")
+            
+    def failed_test_cases(self, project_id: str, project_run_id: str):
+        """返回某次项目执行中失败或被跳过、且仍然存在的测试用例，执行记录不存在时返回 None"""
+        run = self.store.get_project_run(project_id, project_run_id)
+        if not run:
+            return None
+        return [
+            test_case_id for test_case_id, status in run["case_statuses"].items()
+            if status != "success" and os.path.exists(f"projects/{project_id}/results/{test_case_id}.py")
+        ]
@@ -0,0 +1,174 @@
+from loguru import logger
+from collections import OrderedDict
+from datetime import datetime
+import asyncio
+import uuid
+from core.executor import compact_result
+
+
+class Job:
+    """一次后台执行任务，可以是单个测试用例或整个项目"""
+
+    def __init__(self, kind, project_id, test_case_ids, concurrency=1, options=None, order=None, max_failures=None,
+                 retries=None, rerun_of=None, run_timeout=None):
+        self.job_id = uuid.uuid4().hex
+        self.kind = kind
+        self.project_id = project_id
+        self.test_case_ids = list(test_case_ids)
+        self.concurrency = concurrency
+        self.options = options
+        self.order = order
+        self.max_failures = max_failures
+        self.retries = retries
+        self.rerun_of = rerun_of
+        self.run_timeout = run_timeout
+        self.status = "pending"
+        self.created_at = datetime.now().isoformat()
+        self.started_at = None
+        self.finished_at = None
+        self.completed = 0
+        self.success = 0
+        self.failed = 0
+        self.skipped = 0
+        self.result = None
+        self.error = None
+        self.events = []
+        self.subscribers = set()
+        self.task = None
+
+    @property
+    def done(self):
+        return self.status in ("completed", "failed", "cancelled")
+
+    def info(self):
+        """任务状态摘要，不包含完整结果"""
+        return {
+            "job_id": self.job_id,
+            "kind": self.kind,
+            "project_id": self.project_id,
+            "status": self.status,
+            "total": len(self.test_case_ids),
+            "completed": self.completed,
+            "success": self.success,
+            "failed": self.failed,
+            "skipped": self.skipped,
+            "created_at": self.created_at,
+            "started_at": self.started_at,
+            "finished_at": self.finished_at,
+            "error": self.error
+        }
+
+
+class JobManager:
+    def __init__(self, executor, max_running_jobs=4, history_limit=200):
+        self.executor = executor
+        self.history_limit = history_limit
+        self.jobs = OrderedDict()
+        self._slots = asyncio.Semaphore(max(1, max_running_jobs))
+
+    def submit(self, kind, project_id, test_case_ids, concurrency=1, options=None, order=None, max_failures=None,
+               retries=None, rerun_of=None, run_timeout=None):
+        """提交任务并立即返回，任务在后台调度执行"""
+        job = Job(
+            kind, project_id, test_case_ids, concurrency, options, order, max_failures, retries, rerun_of, run_timeout
+        )
+        self.jobs[job.job_id] = job
+        self._evict()
+        job.task = asyncio.create_task(self._run(job))
+        logger.info(f"任务已提交: {job.job_id}, 项目: {project_id}, 用例数: {len(job.test_case_ids)}")
+        return job
+
+    def get(self, job_id):
+        return self.jobs.get(job_id)
+
+    def list(self):
+        return [job.info() for job in reversed(self.jobs.values())]
+
+    async def cancel(self, job_id, wait=10):
+        """取消尚未结束的任务，正在执行的用例被中止并结束其脚本进程树；任务已结束时返回 False"""
+        job = self.jobs.get(job_id)
+        if not job or job.done:
+            return False
+        job.task.cancel()
+        # 等待正在执行的用例结束进程树，超时后任务在后台继续结束
+        await asyncio.wait({job.task}, timeout=wait)
+        logger.info(f"任务已取消: {job_id}")
+        return True
+
+    def _evict(self):
+        """只保留最近的已结束任务"""
+        while len(self.jobs) > self.history_limit:
+            finished = next((job_id for job_id, job in self.jobs.items() if job.done), None)
+            if not finished:
+                break
+            del self.jobs[finished]
+
+    def _publish(self, job, event, data, replay=None):
+        """记录事件并推送给所有订阅者，replay 为记录下来供之后的订阅者回放的数据，默认与推送的相同"""
+        message = {"event": event, "data": data}
+        job.events.append(message if replay is None else {"event": event, "data": replay})
+        for queue in job.subscribers:
+            queue.put_nowait(message)
+
+    async def _run(self, job):
+        async def on_result(result):
+            job.completed += 1
+            if result["status"] == "success":
+                job.success += 1
+            elif result["status"] == "skipped":
+                job.skipped += 1
+            else:
+                job.failed += 1
+            # 完整结果只推送给当前的订阅者，任务只保留摘要，内存不随用例数和输出长度增长
+            self._publish(job, "case_completed", result, compact_result(result))
+
+        try:
+            # 排队等待时被取消的任务同样标记为 cancelled
+            async with self._slots:
+                job.status = "running"
+                job.started_at = datetime.now().isoformat()
+                self._publish(job, "job_started", job.info())
+                summary = await self.executor.execute_project(
+                    job.project_id,
+                    job.test_case_ids,
+                    concurrency=job.concurrency,
+                    options=job.options,
+                    on_result=on_result,
+                    order=job.order,
+                    max_failures=job.max_failures,
+                    retries=job.retries,
+                    rerun_of=job.rerun_of,
+                    keep_results=job.kind == "test_case",
+                    run_timeout=job.run_timeout
+                )
+                # 单用例任务直接返回该用例的执行结果
+                job.result = summary["results"][0] if job.kind == "test_case" else summary
+                job.status = "completed"
+        except asyncio.CancelledError:
+            job.status = "cancelled"
+        except Exception as e:
+            logger.error(f"任务执行失败: {job.job_id}, {str(e)}")
+            job.status = "failed"
+            job.error = str(e)
+        finally:
+            job.finished_at = datetime.now().isoformat()
+            self._publish(job, "job_finished", job.info())
+            logger.info(f"任务已结束: {job.job_id}, 状态: {job.status}")
+
+    async def subscribe(self, job_id):
+        """订阅任务事件：先回放已发生的事件，再实时推送，任务结束后停止"""
+        job = self.jobs.get(job_id)
+        if not job:
+            return
+        queue = asyncio.Queue()
+        for message in job.events:
+            queue.put_nowait(message)
+        job.subscribers.add(queue)
+        try:
+            while True:
+                message = await queue.get()
+                yield message
+                if message["event"] == "job_finished":
+                    break
+        finally:
+            job.subscribers.discard(queue)
@@ -0,0 +1,170 @@
+from loguru import logger
+from collections import deque
+from datetime import datetime
+import asyncio
+import glob
+import os
+import re
+import time
+
+# 执行结束时写入日志文件的最后一行，跟随日志文件的订阅者据此判断执行已结束
+END_LINE = re.compile(r"\[system\] 执行结束(?:，状态: (\w+))?")
+
+
+class LogStream:
+    """一次执行的实时输出：逐行写入日志文件，并推送给订阅者
+
+    最近的输出保存在有界环形缓冲区中，执行中途订阅的客户端先回放缓冲区再接收实时输出。
+    每个订阅者的队列有上限，推送时等待队列腾出空间形成背压；等待超时的订阅者被标记为落后并断开，
+    不会无限拖慢用例执行。
+    """
+
+    def __init__(self, project_id, run_id, test_case_id, path, buffer_size, queue_size, put_timeout):
+        self.project_id = project_id
+        self.run_id = run_id
+        self.test_case_id = test_case_id
+        self.path = path
+        self.started_at = datetime.now().isoformat()
+        self.buffer = deque(maxlen=buffer_size)
+        self.queue_size = queue_size
+        self.put_timeout = put_timeout
+        self.subscribers = set()
+        self.seq = 0
+        self.closed = False
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._file = open(path, "a", encoding="utf-8")
+
+    def info(self):
+        return {
+            "run_id": self.run_id,
+            "project_id": self.project_id,
+            "test_case_id": self.test_case_id,
+            "started_at": self.started_at,
+            "lines": self.seq,
+            "subscribers": len(self.subscribers)
+        }
+
+    async def publish(self, text, stream="stdout"):
+        """写入一行输出并推送给订阅者"""
+        if self.closed:
+            return
+        text = text.rstrip("\n")
+        self.seq += 1
+        self._file.write(f"[{stream}] {text}\n" if stream != "stdout" else f"{text}\n")
+        self._file.flush()
+        message = {"type": "line", "seq": self.seq, "stream": stream, "text": text}
+        self.buffer.append(message)
+        await self._deliver(message)
+
+    async def close(self, status=None):
+        """执行结束，通知订阅者并关闭日志文件"""
+        if self.closed:
+            return
+        await self.publish(f"执行结束，状态: {status}" if status else "执行结束", "system")
+        self.closed = True
+        self._file.close()
+        await self._deliver({"type": "end", "seq": self.seq, "status": status})
+
+    async def _deliver(self, message):
+        for queue in list(self.subscribers):
+            try:
+                await asyncio.wait_for(queue.put(message), timeout=self.put_timeout)
+            except asyncio.TimeoutError:
+                # 丢弃最旧的一条，为落后通知腾出位置
+                self.subscribers.discard(queue)
+                queue.get_nowait()
+                queue.put_nowait({"type": "lagged", "seq": self.seq})
+                logger.warning(f"日志订阅者读取过慢，已断开: {self.run_id}")
+
+    async def subscribe(self):
+        """订阅输出：先回放环形缓冲区中的内容，再实时推送，执行结束或订阅者落后时停止"""
+        if self.closed:
+            for message in list(self.buffer):
+                yield message
+            yield {"type": "end", "seq": self.seq, "status": None}
+            return
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        replay = list(self.buffer)
+        self.subscribers.add(queue)
+        try:
+            for message in replay:
+                yield message
+            while True:
+                message = await queue.get()
+                yield message
+                if message["type"] in ("end", "lagged"):
+                    break
+        finally:
+            self.subscribers.discard(queue)
+
+
+class LogBroker:
+    """管理正在执行的用例的实时输出，日志文件保存在 projects/<项目ID>/runs/logs/<日期>/<执行记录ID>.log"""
+
+    def __init__(self, base_path="projects", buffer_size=1000, queue_size=1000, put_timeout=1.0,
+                 follow_idle_timeout=600.0):
+        self.base_path = base_path
+        self.buffer_size = buffer_size
+        self.queue_size = queue_size
+        self.put_timeout = put_timeout
+        self.follow_idle_timeout = follow_idle_timeout
+        self.streams = {}
+
+    def open(self, project_id, run_id, test_case_id):
+        """为一次执行创建输出流"""
+        path = os.path.join(
+            self.base_path, project_id, "runs", "logs", datetime.now().date().isoformat(), f"{run_id}.log"
+        )
+        stream = LogStream(
+            project_id, run_id, test_case_id, path, self.buffer_size, self.queue_size, self.put_timeout
+        )
+        self.streams[run_id] = stream
+        return stream
+
+    async def close(self, stream, status=None):
+        """执行结束，之后的订阅从日志文件读取"""
+        try:
+            await stream.close(status)
+        except Exception as e:
+            logger.error(f"关闭执行日志失败: {stream.run_id}, {str(e)}")
+        finally:
+            self.streams.pop(stream.run_id, None)
+
+    def get(self, project_id, run_id):
+        stream = self.streams.get(run_id)
+        return stream if stream and stream.project_id == project_id else None
+
+    def list_active(self, project_id):
+        return [stream.info() for stream in self.streams.values() if stream.project_id == project_id]
+
+    def log_path(self, project_id, run_id):
+        """查找已结束执行的日志文件，不存在时返回 None"""
+        if not run_id.isalnum():
+            return None
+        paths = glob.glob(os.path.join(self.base_path, project_id, "runs", "logs", "*", f"{run_id}.log"))
+        return paths[0] if paths else None
+
+    async def follow(self, path, poll_interval=0.5):
+        """跟随其他进程（如 worker）写入的日志文件：先推送文件的最后部分，再推送新增的行
+
+        读到执行结束行，或文件超过 follow_idle_timeout 秒没有变化（执行进程异常退出或执行早已结束）时停止。
+        """
+        seq = 0
+        with open(path, "r", encoding="utf-8", errors="replace") as f:
+            lines = list(deque(f, maxlen=self.buffer_size))
+            while True:
+                # 写入进程尚未写完的行留到下次读取
+                partial = lines.pop() if lines and not lines[-1].endswith("\n") else ""
+                for line in lines:
+                    seq += 1
+                    text = line.rstrip("\n")
+                    yield {"type": "line", "seq": seq, "stream": "file", "text": text}
+                    match = END_LINE.fullmatch(text)
+                    if match:
+                        yield {"type": "end", "seq": seq, "status": match.group(1)}
+                        return
+                if time.time() - os.path.getmtime(path) > self.follow_idle_timeout:
+                    break
+                await asyncio.sleep(poll_interval)
+                lines = (partial + f.read()).splitlines(keepends=True)
+        yield {"type": "end", "seq": seq, "status": None}
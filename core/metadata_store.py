@@ -0,0 +1,681 @@
+from loguru import logger
+from contextlib import contextmanager
+from datetime import datetime
+import base64
+import json
+import math
+import os
+import sqlite3
+from core import settings
+
+# 列表查询支持的排序字段及对应的 SQL 表达式，空值统一排在最前
+PROJECT_SORTS = {
+    "name": "project_name",
+    "created_at": "COALESCE(created_at, '')",
+}
+TEST_CASE_SORTS = {
+    "name": "test_case_id",
+    "recorded_at": "COALESCE(recorded_at, '')",
+    "last_run_at": "COALESCE(last_run_at, '')",
+    "last_duration": "COALESCE(last_duration, -1)",
+}
+
+# 用例统计支持的排序方式，问题最多的用例排在最前
+STATS_SORTS = {
+    "flakiness": "flakiness DESC",
+    "p95_duration": "COALESCE(p95_duration, -1) DESC",
+    "pass_rate": "COALESCE(pass_rate, 1) ASC",
+}
+
+
+def _percentile(values, q):
+    """最近秩法计算百分位数"""
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, math.ceil(q / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _window_stats(statuses, durations):
+    """根据窗口内的执行状态（1 成功 / 0 失败）和耗时计算统计值"""
+    flips = sum(1 for prev, cur in zip(statuses, statuses[1:]) if prev != cur)
+    return {
+        "pass_rate": round(sum(statuses) / len(statuses), 4) if statuses else None,
+        "p50_duration": _percentile(durations, 50),
+        "p95_duration": _percentile(durations, 95),
+        # 相邻两次执行结果不同的比例，结果稳定时为 0，每次都在成功和失败之间切换时为 1
+        "flakiness": round(flips / (len(statuses) - 1), 4) if len(statuses) > 1 else 0.0,
+    }
+
+
+def _encode_cursor(sort, value, key):
+    raw = json.dumps([sort, value, key], ensure_ascii=False).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii")
+
+
+def _decode_cursor(cursor, sort):
+    try:
+        cursor_sort, value, key = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except Exception:
+        raise ValueError("无效的分页游标")
+    if cursor_sort != sort:
+        raise ValueError("分页游标与排序方式不匹配")
+    return value, key
+
+
+class MetadataStore:
+    """项目、测试用例和最近执行结果的 SQLite 索引
+
+    projects/ 目录仍然是数据的来源，索引在创建、录制、删除和执行时同步更新，
+    列表和查询无需再遍历目录。目录在服务之外被修改时，通过比较目录的修改时间
+    发现变化并重新扫描对应部分。
+    """
+
+    def __init__(self, base_path="projects", db_path=None):
+        self.base_path = base_path
+        self.db_path = db_path or os.path.join(base_path, ".autotest", "metadata.db")
+        os.makedirs(os.path.dirname(self.db_path), exist_ok=True)
+        with self._connect() as conn:
+            # 与任务队列一致使用回滚日志：API 进程和 worker 都会写入索引，WAL 的共享内存文件不能跨主机共享。
+            # 从旧版 WAL 切换时需要独占数据库，其他进程仍在使用时保持原有模式
+            try:
+                conn.execute("PRAGMA journal_mode=DELETE")
+            except sqlite3.OperationalError as e:
+                logger.warning(f"切换元数据索引日志模式失败: {str(e)}")
+            conn.executescript("""
+                CREATE TABLE IF NOT EXISTS projects (
+                    project_id TEXT PRIMARY KEY,
+                    project_name TEXT NOT NULL,
+                    created_at TEXT,
+                    updated_at TEXT,
+                    info TEXT NOT NULL,
+                    results_mtime INTEGER
+                );
+                CREATE TABLE IF NOT EXISTS test_cases (
+                    project_id TEXT NOT NULL,
+                    test_case_id TEXT NOT NULL,
+                    file_size INTEGER,
+                    recorded_at TEXT,
+                    last_status TEXT,
+                    last_run_at TEXT,
+                    last_duration REAL,
+                    PRIMARY KEY (project_id, test_case_id)
+                );
+                CREATE INDEX IF NOT EXISTS idx_test_cases_recorded ON test_cases (project_id, recorded_at);
+                CREATE INDEX IF NOT EXISTS idx_test_cases_status ON test_cases (project_id, last_status);
+                CREATE INDEX IF NOT EXISTS idx_test_cases_duration ON test_cases (project_id, last_duration);
+                CREATE INDEX IF NOT EXISTS idx_projects_name ON projects (project_name);
+                CREATE TABLE IF NOT EXISTS step_ir (
+                    content_hash TEXT PRIMARY KEY,
+                    steps TEXT NOT NULL,
+                    created_at TEXT NOT NULL
+                );
+                CREATE TABLE IF NOT EXISTS runs (
+                    run_id TEXT PRIMARY KEY,
+                    project_id TEXT NOT NULL,
+                    test_case_id TEXT NOT NULL,
+                    status TEXT,
+                    run_at TEXT NOT NULL,
+                    duration REAL,
+                    segment TEXT NOT NULL,
+                    byte_offset INTEGER NOT NULL,
+                    byte_length INTEGER NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_runs_test_case ON runs (project_id, test_case_id, run_at);
+                CREATE INDEX IF NOT EXISTS idx_runs_segment ON runs (project_id, segment);
+                CREATE TABLE IF NOT EXISTS test_case_stats (
+                    project_id TEXT NOT NULL,
+                    test_case_id TEXT NOT NULL,
+                    total_runs INTEGER NOT NULL DEFAULT 0,
+                    passed_runs INTEGER NOT NULL DEFAULT 0,
+                    window_statuses TEXT NOT NULL DEFAULT '[]',
+                    window_durations TEXT NOT NULL DEFAULT '[]',
+                    pass_rate REAL,
+                    p50_duration REAL,
+                    p95_duration REAL,
+                    flakiness REAL NOT NULL DEFAULT 0,
+                    last_run_at TEXT,
+                    last_failure_at TEXT,
+                    last_failure_message TEXT,
+                    PRIMARY KEY (project_id, test_case_id)
+                );
+                CREATE TABLE IF NOT EXISTS project_stats (
+                    project_id TEXT PRIMARY KEY,
+                    total_runs INTEGER NOT NULL DEFAULT 0,
+                    passed_runs INTEGER NOT NULL DEFAULT 0,
+                    window_statuses TEXT NOT NULL DEFAULT '[]',
+                    window_durations TEXT NOT NULL DEFAULT '[]',
+                    pass_rate REAL,
+                    p50_duration REAL,
+                    p95_duration REAL,
+                    case_count INTEGER NOT NULL DEFAULT 0,
+                    flakiness_sum REAL NOT NULL DEFAULT 0,
+                    flaky_cases INTEGER NOT NULL DEFAULT 0,
+                    last_run_at TEXT,
+                    last_failure_at TEXT,
+                    last_failure_case TEXT,
+                    last_failure_message TEXT
+                );
+                CREATE TABLE IF NOT EXISTS project_runs (
+                    project_run_id TEXT PRIMARY KEY,
+                    project_id TEXT NOT NULL,
+                    rerun_of TEXT,
+                    started_at TEXT NOT NULL,
+                    finished_at TEXT,
+                    total INTEGER NOT NULL,
+                    success INTEGER NOT NULL,
+                    failed INTEGER NOT NULL,
+                    skipped INTEGER NOT NULL,
+                    first_attempt_success INTEGER NOT NULL,
+                    first_attempt_failed INTEGER NOT NULL,
+                    flaky INTEGER NOT NULL,
+                    case_statuses TEXT NOT NULL
+                );
+                CREATE INDEX IF NOT EXISTS idx_project_runs ON project_runs (project_id, started_at);
+                CREATE TABLE IF NOT EXISTS meta (
+                    key TEXT PRIMARY KEY,
+                    value TEXT
+                );
+            """)
+
+    @contextmanager
+    def _connect(self):
+        """打开自动提交模式的连接，使用完毕后关闭"""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _mtime(self, path):
+        try:
+            return os.stat(path).st_mtime_ns
+        except OSError:
+            return None
+
+    # ---------- 项目 ----------
+
+    def upsert_project(self, project_info, conn=None):
+        """写入或更新项目信息"""
+        if conn is None:
+            with self._connect() as conn:
+                return self.upsert_project(project_info, conn)
+        conn.execute(
+            """INSERT INTO projects (project_id, project_name, created_at, updated_at, info)
+               VALUES (?, ?, ?, ?, ?)
+               ON CONFLICT(project_id) DO UPDATE SET
+                   project_name = excluded.project_name,
+                   created_at = excluded.created_at,
+                   updated_at = excluded.updated_at,
+                   info = excluded.info""",
+            (
+                project_info["project_id"],
+                project_info.get("project_name", ""),
+                project_info.get("created_at"),
+                project_info.get("updated_at"),
+                json.dumps(project_info, ensure_ascii=False)
+            )
+        )
+
+    def delete_project(self, project_id):
+        """删除项目及其测试用例索引"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM test_cases WHERE project_id = ?", (project_id,))
+            conn.execute("DELETE FROM runs WHERE project_id = ?", (project_id,))
+            conn.execute("DELETE FROM test_case_stats WHERE project_id = ?", (project_id,))
+            conn.execute("DELETE FROM project_stats WHERE project_id = ?", (project_id,))
+            conn.execute("DELETE FROM project_runs WHERE project_id = ?", (project_id,))
+            conn.execute("DELETE FROM projects WHERE project_id = ?", (project_id,))
+
+    def get_project(self, project_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT info FROM projects WHERE project_id = ?", (project_id,)).fetchone()
+        return json.loads(row["info"]) if row else None
+
+    def list_projects(self):
+        """列出所有项目，目录在服务之外发生变化时先重新扫描"""
+        self.sync_projects_if_changed()
+        with self._connect() as conn:
+            rows = conn.execute("SELECT info FROM projects ORDER BY created_at").fetchall()
+        return [json.loads(row["info"]) for row in rows]
+
+    def query_projects(self, limit=50, cursor=None, name_prefix=None, sort="created_at", order="asc"):
+        """分页查询项目，按项目ID或名称前缀过滤，返回 (项目列表, 下一页游标)"""
+        self.sync_projects_if_changed()
+        where, params = [], []
+        if name_prefix:
+            where.append("(project_id >= ? AND project_id < ? OR project_name >= ? AND project_name < ?)")
+            params += [name_prefix, name_prefix + "\U0010ffff"] * 2
+        with self._connect() as conn:
+            rows, next_cursor = self._paginate(
+                conn, "projects", "project_id", PROJECT_SORTS, where, params, sort, order, limit, cursor
+            )
+        return [json.loads(row["info"]) for row in rows], next_cursor
+
+    def _paginate(self, conn, table, key_column, sorts, where, params, sort, order, limit, cursor):
+        """基于游标（上一页最后一条记录的排序值和主键）的分页查询，不使用 OFFSET"""
+        if sort not in sorts:
+            raise ValueError(f"不支持的排序字段: {sort}")
+        if order not in ("asc", "desc"):
+            raise ValueError(f"不支持的排序方向: {order}")
+        sort_expr = sorts[sort]
+        where, params = list(where), list(params)
+        if cursor:
+            value, key = _decode_cursor(cursor, sort)
+            op = ">" if order == "asc" else "<"
+            where.append(f"({sort_expr} {op} ? OR ({sort_expr} = ? AND {key_column} {op} ?))")
+            params += [value, value, key]
+
+        sql = f"SELECT *, {sort_expr} AS sort_value FROM {table}"
+        if where:
+            sql += " WHERE " + " AND ".join(where)
+        sql += f" ORDER BY {sort_expr} {order.upper()}, {key_column} {order.upper()} LIMIT ?"
+        rows = conn.execute(sql, params + [limit + 1]).fetchall()
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            last = rows[-1]
+            next_cursor = _encode_cursor(sort, last["sort_value"], last[key_column])
+        return rows, next_cursor
+
+    def sync_projects_if_changed(self):
+        mtime = self._mtime(self.base_path)
+        with self._connect() as conn:
+            row = conn.execute("SELECT value FROM meta WHERE key = 'projects_mtime'").fetchone()
+        if mtime is not None and (not row or row["value"] != str(mtime)):
+            self.sync_projects(mtime)
+
+    def sync_projects(self, mtime=None):
+        """扫描 projects 目录，重建项目索引"""
+        mtime = mtime or self._mtime(self.base_path)
+        project_infos = []
+        for project_id in os.listdir(self.base_path):
+            info_path = os.path.join(self.base_path, project_id, "project_info.json")
+            if project_id.startswith(".") or not os.path.exists(info_path):
+                continue
+            try:
+                with open(info_path, "r", encoding="utf-8") as f:
+                    project_infos.append(json.load(f))
+            except Exception as e:
+                logger.error(f"读取项目信息失败: {project_id}, {str(e)}")
+
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            existing = {row["project_id"] for row in conn.execute("SELECT project_id FROM projects")}
+            found = {info["project_id"] for info in project_infos}
+            for info in project_infos:
+                self.upsert_project(info, conn)
+            for project_id in existing - found:
+                conn.execute("DELETE FROM test_cases WHERE project_id = ?", (project_id,))
+                conn.execute("DELETE FROM projects WHERE project_id = ?", (project_id,))
+            conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('projects_mtime', ?)", (str(mtime),)
+            )
+            conn.execute("COMMIT")
+        logger.info(f"项目索引已重建，项目数: {len(project_infos)}")
+
+    def mark_synced(self, project_id=None):
+        """服务自身修改目录后记录新的修改时间，避免下次查询时不必要的重新扫描"""
+        with self._connect() as conn:
+            if project_id is None:
+                mtime = self._mtime(self.base_path)
+                conn.execute(
+                    "INSERT OR REPLACE INTO meta (key, value) VALUES ('projects_mtime', ?)", (str(mtime),)
+                )
+            else:
+                mtime = self._mtime(self._results_dir(project_id))
+                conn.execute("UPDATE projects SET results_mtime = ? WHERE project_id = ?", (mtime, project_id))
+
+    # ---------- 测试用例 ----------
+
+    def _results_dir(self, project_id):
+        return os.path.join(self.base_path, project_id, "results")
+
+    def upsert_test_case(self, project_id, test_case_id, conn=None):
+        """根据脚本文件写入或更新测试用例索引"""
+        if conn is None:
+            with self._connect() as conn:
+                return self.upsert_test_case(project_id, test_case_id, conn)
+        script_path = os.path.join(self._results_dir(project_id), f"{test_case_id}.py")
+        try:
+            file_stat = os.stat(script_path)
+        except OSError:
+            conn.execute(
+                "DELETE FROM test_cases WHERE project_id = ? AND test_case_id = ?", (project_id, test_case_id)
+            )
+            return
+        conn.execute(
+            """INSERT INTO test_cases (project_id, test_case_id, file_size, recorded_at)
+               VALUES (?, ?, ?, ?)
+               ON CONFLICT(project_id, test_case_id) DO UPDATE SET
+                   file_size = excluded.file_size,
+                   recorded_at = excluded.recorded_at""",
+            (project_id, test_case_id, file_stat.st_size, datetime.fromtimestamp(file_stat.st_mtime).isoformat())
+        )
+
+    def delete_test_case(self, project_id, test_case_id):
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "DELETE FROM test_cases WHERE project_id = ? AND test_case_id = ?", (project_id, test_case_id)
+            )
+            # 从项目统计中移除该用例的稳定性
+            row = conn.execute(
+                "SELECT flakiness FROM test_case_stats WHERE project_id = ? AND test_case_id = ?",
+                (project_id, test_case_id)
+            ).fetchone()
+            if row:
+                conn.execute(
+                    """UPDATE project_stats SET case_count = case_count - 1, flakiness_sum = flakiness_sum - ?,
+                       flaky_cases = flaky_cases - ? WHERE project_id = ?""",
+                    (row["flakiness"], 1 if row["flakiness"] > 0 else 0, project_id)
+                )
+                conn.execute(
+                    "DELETE FROM test_case_stats WHERE project_id = ? AND test_case_id = ?", (project_id, test_case_id)
+                )
+            conn.execute("COMMIT")
+
+    def get_test_case(self, project_id, test_case_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM test_cases WHERE project_id = ? AND test_case_id = ?", (project_id, test_case_id)
+            ).fetchone()
+        return self._test_case_dict(row) if row else None
+
+    def _test_case_dict(self, row):
+        test_case = dict(row)
+        test_case.pop("sort_value", None)
+        # 脚本文件中不包含结构化步骤
+        test_case["steps"] = []
+        return test_case
+
+    def list_test_cases(self, project_id):
+        """列出项目下的测试用例，结果目录在服务之外发生变化时先重新扫描"""
+        self.sync_test_cases_if_changed(project_id)
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM test_cases WHERE project_id = ? ORDER BY test_case_id", (project_id,)
+            ).fetchall()
+        return [self._test_case_dict(row) for row in rows]
+
+    def query_test_cases(self, project_id, limit=50, cursor=None, name_prefix=None, recorded_after=None,
+                         recorded_before=None, last_status=None, sort="name", order="asc"):
+        """分页查询测试用例，支持名称前缀、录制时间范围和最近执行状态过滤，返回 (用例列表, 下一页游标)"""
+        self.sync_test_cases_if_changed(project_id)
+        where, params = ["project_id = ?"], [project_id]
+        if name_prefix:
+            where.append("test_case_id >= ? AND test_case_id < ?")
+            params += [name_prefix, name_prefix + "\U0010ffff"]
+        if recorded_after:
+            where.append("recorded_at >= ?")
+            params.append(recorded_after)
+        if recorded_before:
+            where.append("recorded_at < ?")
+            params.append(recorded_before)
+        if last_status == "never":
+            where.append("last_status IS NULL")
+        elif last_status:
+            where.append("last_status = ?")
+            params.append(last_status)
+        with self._connect() as conn:
+            rows, next_cursor = self._paginate(
+                conn, "test_cases", "test_case_id", TEST_CASE_SORTS, where, params, sort, order, limit, cursor
+            )
+        return [self._test_case_dict(row) for row in rows], next_cursor
+
+    def sync_test_cases_if_changed(self, project_id):
+        # 项目尚未写入索引时无法记录结果目录的修改时间，会导致每次查询都重新扫描
+        self.sync_projects_if_changed()
+        mtime = self._mtime(self._results_dir(project_id))
+        with self._connect() as conn:
+            row = conn.execute("SELECT results_mtime FROM projects WHERE project_id = ?", (project_id,)).fetchone()
+        if mtime is not None and (not row or row["results_mtime"] != mtime):
+            self.sync_test_cases(project_id, mtime)
+
+    def sync_test_cases(self, project_id, mtime=None):
+        """扫描项目结果目录，重建该项目的测试用例索引"""
+        results_dir = self._results_dir(project_id)
+        mtime = mtime or self._mtime(results_dir)
+        if mtime is None:
+            return
+        found = {file_name[:-3] for file_name in os.listdir(results_dir) if file_name.endswith(".py")}
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            existing = {
+                row["test_case_id"]
+                for row in conn.execute("SELECT test_case_id FROM test_cases WHERE project_id = ?", (project_id,))
+            }
+            for test_case_id in found:
+                self.upsert_test_case(project_id, test_case_id, conn)
+            for test_case_id in existing - found:
+                conn.execute(
+                    "DELETE FROM test_cases WHERE project_id = ? AND test_case_id = ?", (project_id, test_case_id)
+                )
+            conn.execute("UPDATE projects SET results_mtime = ? WHERE project_id = ?", (mtime, project_id))
+            conn.execute("COMMIT")
+        logger.info(f"测试用例索引已重建: {project_id}, 用例数: {len(found)}")
+
+    def record_run(self, project_id, test_case_id, status, duration, run_at, message=None):
+        """记录测试用例最近一次执行的结果，并增量更新用例和项目的统计"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            conn.execute(
+                "UPDATE test_cases SET last_status = ?, last_duration = ?, last_run_at = ? WHERE project_id = ? AND test_case_id = ?",
+                (status, duration, run_at, project_id, test_case_id)
+            )
+            self._update_stats(conn, project_id, test_case_id, status == "success", duration, run_at, message)
+            conn.execute("COMMIT")
+
+    def _update_stats(self, conn, project_id, test_case_id, passed, duration, run_at, message):
+        """将一次执行合并到滑动窗口中，重新计算通过率、耗时百分位和稳定性"""
+        row = conn.execute(
+            "SELECT * FROM test_case_stats WHERE project_id = ? AND test_case_id = ?", (project_id, test_case_id)
+        ).fetchone()
+        statuses = json.loads(row["window_statuses"]) if row else []
+        durations = json.loads(row["window_durations"]) if row else []
+        statuses = (statuses + [1 if passed else 0])[-settings.STATS_WINDOW:]
+        if duration is not None:
+            durations = (durations + [duration])[-settings.STATS_WINDOW:]
+        stats = _window_stats(statuses, durations)
+        new_case = row is None
+        old_flakiness = row["flakiness"] if row else 0.0
+        conn.execute(
+            """INSERT OR REPLACE INTO test_case_stats
+               (project_id, test_case_id, total_runs, passed_runs, window_statuses, window_durations,
+                pass_rate, p50_duration, p95_duration, flakiness, last_run_at, last_failure_at, last_failure_message)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                project_id, test_case_id,
+                (row["total_runs"] if row else 0) + 1,
+                (row["passed_runs"] if row else 0) + (1 if passed else 0),
+                json.dumps(statuses), json.dumps(durations),
+                stats["pass_rate"], stats["p50_duration"], stats["p95_duration"], stats["flakiness"],
+                run_at,
+                row["last_failure_at"] if passed and row else (None if passed else run_at),
+                row["last_failure_message"] if passed and row else (None if passed else message)
+            )
+        )
+
+        row = conn.execute("SELECT * FROM project_stats WHERE project_id = ?", (project_id,)).fetchone()
+        statuses = json.loads(row["window_statuses"]) if row else []
+        durations = json.loads(row["window_durations"]) if row else []
+        statuses = (statuses + [1 if passed else 0])[-settings.PROJECT_STATS_WINDOW:]
+        if duration is not None:
+            durations = (durations + [duration])[-settings.PROJECT_STATS_WINDOW:]
+        project_stats = _window_stats(statuses, durations)
+        flaky_delta = (stats["flakiness"] > 0) - (old_flakiness > 0)
+        conn.execute(
+            """INSERT OR REPLACE INTO project_stats
+               (project_id, total_runs, passed_runs, window_statuses, window_durations, pass_rate, p50_duration,
+                p95_duration, case_count, flakiness_sum, flaky_cases, last_run_at, last_failure_at,
+                last_failure_case, last_failure_message)
+               VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+            (
+                project_id,
+                (row["total_runs"] if row else 0) + 1,
+                (row["passed_runs"] if row else 0) + (1 if passed else 0),
+                json.dumps(statuses), json.dumps(durations),
+                project_stats["pass_rate"], project_stats["p50_duration"], project_stats["p95_duration"],
+                (row["case_count"] if row else 0) + (1 if new_case else 0),
+                (row["flakiness_sum"] if row else 0.0) + stats["flakiness"] - old_flakiness,
+                (row["flaky_cases"] if row else 0) + flaky_delta,
+                run_at,
+                row["last_failure_at"] if passed and row else (None if passed else run_at),
+                row["last_failure_case"] if passed and row else (None if passed else test_case_id),
+                row["last_failure_message"] if passed and row else (None if passed else message)
+            )
+        )
+
+    def _stats_dict(self, row):
+        stats = dict(row)
+        stats.pop("window_durations")
+        stats["window_size"] = len(json.loads(stats.pop("window_statuses")))
+        return stats
+
+    def get_test_case_stats(self, project_id, test_case_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM test_case_stats WHERE project_id = ? AND test_case_id = ?", (project_id, test_case_id)
+            ).fetchone()
+        return self._stats_dict(row) if row else None
+
+    def query_test_case_stats(self, project_id, sort="flakiness", limit=50):
+        """按稳定性、耗时或通过率排序列出项目下测试用例的统计"""
+        if sort not in STATS_SORTS:
+            raise ValueError(f"不支持的排序字段: {sort}")
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM test_case_stats WHERE project_id = ? ORDER BY {STATS_SORTS[sort]}, test_case_id LIMIT ?",
+                (project_id, limit)
+            ).fetchall()
+        return [self._stats_dict(row) for row in rows]
+
+    def get_project_stats(self, project_id):
+        with self._connect() as conn:
+            row = conn.execute("SELECT * FROM project_stats WHERE project_id = ?", (project_id,)).fetchone()
+        if not row:
+            return None
+        stats = self._stats_dict(row)
+        flakiness_sum = stats.pop("flakiness_sum")
+        stats["flakiness"] = round(flakiness_sum / stats["case_count"], 4) if stats["case_count"] else 0.0
+        return stats
+
+    def get_schedule_history(self, project_id):
+        """读取项目下各用例最近一次的执行状态和耗时中位数，用于安排执行顺序"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                """SELECT c.test_case_id, c.last_status, COALESCE(s.p50_duration, c.last_duration) AS duration
+                   FROM test_cases c LEFT JOIN test_case_stats s
+                   ON s.project_id = c.project_id AND s.test_case_id = c.test_case_id
+                   WHERE c.project_id = ?""",
+                (project_id,)
+            ).fetchall()
+        return {row["test_case_id"]: {"last_status": row["last_status"], "duration": row["duration"]} for row in rows}
+
+    # ---------- 执行记录 ----------
+
+    def index_run(self, run):
+        """记录执行记录在分段文件中的位置"""
+        with self._connect() as conn:
+            conn.execute(
+                """INSERT OR REPLACE INTO runs
+                   (run_id, project_id, test_case_id, status, run_at, duration, segment, byte_offset, byte_length)
+                   VALUES (:run_id, :project_id, :test_case_id, :status, :run_at, :duration, :segment, :byte_offset, :byte_length)""",
+                run
+            )
+
+    def get_run(self, project_id, run_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM runs WHERE project_id = ? AND run_id = ?", (project_id, run_id)
+            ).fetchone()
+        return dict(row) if row else None
+
+    def query_runs(self, project_id, test_case_id=None, before=None, before_id=None, limit=50):
+        """按 (执行时间, 执行记录ID) 倒序查询执行记录
+
+        before 和 before_id 为上一页最后一条记录的 run_at 和 run_id，执行时间相同的记录按执行记录ID区分，
+        翻页时不会遗漏或重复；只传 before 时返回早于该时间的记录。
+        """
+        where, params = ["project_id = ?"], [project_id]
+        if test_case_id:
+            where.append("test_case_id = ?")
+            params.append(test_case_id)
+        if before and before_id:
+            where.append("(run_at < ? OR (run_at = ? AND run_id < ?))")
+            params += [before, before, before_id]
+        elif before:
+            where.append("run_at < ?")
+            params.append(before)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM runs WHERE {' AND '.join(where)} ORDER BY run_at DESC, run_id DESC LIMIT ?",
+                params + [limit]
+            ).fetchall()
+        return [dict(row) for row in rows]
+
+    def delete_segment_runs(self, project_id, segment):
+        """删除某个分段中的所有执行记录"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM runs WHERE project_id = ? AND segment = ?", (project_id, segment))
+
+    def record_project_run(self, run):
+        """记录一次项目执行的汇总，case_statuses 为 {用例ID: 最终状态}"""
+        with self._connect() as conn:
+            conn.execute(
+                """INSERT OR REPLACE INTO project_runs
+                   (project_run_id, project_id, rerun_of, started_at, finished_at, total, success, failed, skipped,
+                    first_attempt_success, first_attempt_failed, flaky, case_statuses)
+                   VALUES (:project_run_id, :project_id, :rerun_of, :started_at, :finished_at, :total, :success, :failed,
+                           :skipped, :first_attempt_success, :first_attempt_failed, :flaky, :case_statuses)""",
+                {**run, "case_statuses": json.dumps(run["case_statuses"], ensure_ascii=False)}
+            )
+
+    def _project_run_dict(self, row):
+        run = dict(row)
+        run["case_statuses"] = json.loads(run["case_statuses"])
+        return run
+
+    def get_project_run(self, project_id, project_run_id):
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT * FROM project_runs WHERE project_id = ? AND project_run_id = ?", (project_id, project_run_id)
+            ).fetchone()
+        return self._project_run_dict(row) if row else None
+
+    def query_project_runs(self, project_id, before=None, before_id=None, limit=50):
+        """按 (开始时间, 项目执行ID) 倒序查询项目执行记录
+
+        before 和 before_id 为上一页最后一条记录的 started_at 和 project_run_id；只传 before 时返回早于该时间的记录。
+        """
+        where, params = ["project_id = ?"], [project_id]
+        if before and before_id:
+            where.append("(started_at < ? OR (started_at = ? AND project_run_id < ?))")
+            params += [before, before, before_id]
+        elif before:
+            where.append("started_at < ?")
+            params.append(before)
+        with self._connect() as conn:
+            rows = conn.execute(
+                f"SELECT * FROM project_runs WHERE {' AND '.join(where)} ORDER BY started_at DESC, project_run_id DESC LIMIT ?",
+                params + [limit]
+            ).fetchall()
+        return [self._project_run_dict(row) for row in rows]
+
+    # ---------- 步骤 IR 缓存 ----------
+
+    def get_step_ir(self, content_hash):
+        """按脚本内容哈希读取缓存的步骤 IR"""
+        with self._connect() as conn:
+            row = conn.execute("SELECT steps FROM step_ir WHERE content_hash = ?", (content_hash,)).fetchone()
+        return json.loads(row["steps"]) if row else None
+
+    def save_step_ir(self, content_hash, steps):
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT OR REPLACE INTO step_ir (content_hash, steps, created_at) VALUES (?, ?, ?)",
+                (content_hash, json.dumps(steps, ensure_ascii=False), datetime.now().isoformat())
+            )
@@ -0,0 +1,177 @@
+"""Prometheus 文本格式的运行时指标
+
+不依赖 prometheus_client，指标保存在进程内存中，由 /metrics 接口按文本格式输出。
+"""
+from loguru import logger
+import threading
+
+# 默认的耗时分桶（秒），覆盖从接口请求到完整用例执行的范围
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names, values, extra=None):
+    pairs = list(zip(names, values)) + list(extra or [])
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in pairs) + "}"
+
+
+def _format_value(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Metric:
+    metric_type = "untyped"
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()
+        self._values = {}
+
+    def _key(self, labels):
+        if set(labels) != set(self.labelnames):
+            raise ValueError(f"指标 {self.name} 的标签应为 {self.labelnames}")
+        return tuple(str(labels[name]) for name in self.labelnames)
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.metric_type}"]
+        lines.extend(self._samples())
+        return lines
+
+    def _samples(self):
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}" for key, value in items]
+
+
+class Counter(Metric):
+    """只增不减的计数器"""
+    metric_type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    """可增可减的当前值；指定 collect 时在输出时调用它获取 {标签值元组: 值}"""
+    metric_type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=(), collect=None):
+        super().__init__(name, documentation, labelnames)
+        self.collect = collect
+
+    def set(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount=1, **labels):
+        self.inc(-amount, **labels)
+
+    def _samples(self):
+        if self.collect:
+            try:
+                values = self.collect()
+            except Exception as e:
+                logger.warning(f"采集指标失败: {self.name}, {str(e)}")
+                return []
+            with self._lock:
+                self._values = dict(values)
+        return super()._samples()
+
+
+class Histogram(Metric):
+    """按分桶统计观测值的分布"""
+    metric_type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets)) + (float("inf"),)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    def _samples(self):
+        with self._lock:
+            items = [(key, (list(counts), total)) for key, (counts, total) in self._values.items()]
+        lines = []
+        for key, (counts, total) in items:
+            for bound, count in zip(self.buckets, counts):
+                labels = _format_labels(self.labelnames, key, [("le", _format_value(bound))])
+                lines.append(f"{self.name}_bucket{labels} {count}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {counts[-1]}")
+        return lines
+
+
+class Registry:
+    """指标注册表，同名指标只注册一次"""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = threading.Lock()
+
+    def register(self, metric):
+        with self._lock:
+            return self._metrics.setdefault(metric.name, metric)
+
+    def render(self):
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+registry = Registry()
+
+EXECUTIONS = registry.register(Counter(
+    "autotest_executions_total", "测试用例执行次数", ("mode", "status")
+))
+EXECUTION_DURATION = registry.register(Histogram(
+    "autotest_execution_duration_seconds", "测试用例执行耗时（秒）", ("mode",)
+))
+EXECUTION_TIMEOUTS = registry.register(Counter(
+    "autotest_execution_timeouts_total", "超过执行时间上限被中止的测试用例数", ("mode",)
+))
+EXECUTIONS_IN_FLIGHT = registry.register(Gauge(
+    "autotest_executions_in_flight", "正在执行的测试用例数", ("mode",)
+))
+BROWSER_LAUNCH = registry.register(Histogram(
+    "autotest_browser_launch_seconds", "浏览器启动耗时（秒），source 为 pool 或 script", ("source",)
+))
+QUEUE_DEPTH = registry.register(Gauge(
+    "autotest_queue_depth", "排队等待执行的数量，queue 为 jobs（后台任务）或 tasks（持久化任务队列）", ("queue",)
+))
+RECORDINGS = registry.register(Counter(
+    "autotest_recordings_total", "启动的录制会话数", ("status",)
+))
+RECORDING_SESSIONS = registry.register(Gauge(
+    "autotest_recording_sessions", "正在进行的录制会话数"
+))
+HTTP_REQUEST_DURATION = registry.register(Histogram(
+    "autotest_http_request_duration_seconds", "API 请求耗时（秒）", ("router", "method", "status")
+))
@@ -0,0 +1,117 @@
+from loguru import logger
+import asyncio
+import os
+import signal
+import subprocess
+
+try:
+    import resource
+except ImportError:  # Windows 不支持 resource 模块，不限制子进程资源
+    resource = None
+
+
+def spawn_kwargs():
+    """启动子进程的额外参数：让子进程成为新进程组的组长，之后可以结束整个进程组"""
+    if os.name == "nt":
+        return {"creationflags": subprocess.CREATE_NEW_PROCESS_GROUP}
+    return {"start_new_session": True}
+
+
+def limit_resources(memory_mb=0, cpu_seconds=0, file_size_mb=0, open_files=0):
+    """返回在子进程启动前设置资源上限的 preexec_fn，没有需要设置的上限或系统不支持时返回 None
+
+    上限通过 setrlimit 设置，由子进程启动的所有子孙进程继承，并对每个进程分别生效：
+    memory_mb 为虚拟内存上限，cpu_seconds 为 CPU 时间上限，file_size_mb 为可写入的单个文件大小上限，
+    open_files 为打开的文件数上限，0 表示不限制。上限不会超过当前进程的硬上限。
+    """
+    if resource is None:
+        return None
+    requested = [
+        (resource.RLIMIT_AS, memory_mb * 1024 * 1024),
+        (resource.RLIMIT_CPU, cpu_seconds),
+        (resource.RLIMIT_FSIZE, file_size_mb * 1024 * 1024),
+        (resource.RLIMIT_NOFILE, open_files)
+    ]
+    limits = []
+    for which, value in requested:
+        if not value:
+            continue
+        hard = resource.getrlimit(which)[1]
+        if hard != resource.RLIM_INFINITY:
+            value = min(value, hard)
+        limits.append((which, value))
+    if not limits:
+        return None
+
+    def apply():
+        for which, value in limits:
+            resource.setrlimit(which, (value, value))
+
+    return apply
+
+
+def _descendants(pid):
+    """读取 /proc 获取进程的全部子孙进程ID，不支持 /proc 的系统返回空列表"""
+    children = {}
+    try:
+        entries = os.listdir("/proc")
+    except OSError:
+        return []
+    for entry in entries:
+        if not entry.isdigit():
+            continue
+        try:
+            with open(f"/proc/{entry}/stat", "rb") as f:
+                stat = f.read()
+        except OSError:
+            continue
+        # 进程名可能包含空格和括号，父进程ID是最后一个右括号之后的第二个字段
+        ppid = int(stat[stat.rfind(b")") + 2:].split()[1])
+        children.setdefault(ppid, []).append(int(entry))
+    result = []
+    stack = [pid]
+    while stack:
+        for child in children.get(stack.pop(), []):
+            result.append(child)
+            stack.append(child)
+    return result
+
+
+def _signal_group(pid, sig):
+    try:
+        os.killpg(pid, sig)
+    except OSError:
+        pass
+
+
+async def terminate_process_tree(process, grace=5.0):
+    """结束子进程及其全部子孙进程，包括脚本启动的浏览器
+
+    子进程需要以 spawn_kwargs() 启动。先向进程组发送 SIGTERM，让 Playwright 有机会关闭浏览器，
+    超过 grace 秒仍未退出时强制结束。Playwright 启动的浏览器位于单独的进程组，
+    因此在发送信号前记录全部子孙进程，最后逐个强制结束。
+    """
+    if os.name == "nt":
+        # taskkill /T 结束整个进程树
+        if process.returncode is None:
+            killer = await asyncio.create_subprocess_exec(
+                "taskkill", "/F", "/T", "/PID", str(process.pid),
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL
+            )
+            await killer.wait()
+        await process.wait()
+        return
+    descendants = _descendants(process.pid)
+    _signal_group(process.pid, signal.SIGTERM)
+    try:
+        await asyncio.wait_for(process.wait(), timeout=grace)
+    except asyncio.TimeoutError:
+        logger.warning(f"进程 {process.pid} 未在 {grace} 秒内退出，强制结束")
+    _signal_group(process.pid, signal.SIGKILL)
+    for pid in descendants:
+        try:
+            os.kill(pid, signal.SIGKILL)
+        except OSError:
+            pass
+    await process.wait()
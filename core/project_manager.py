@@ -3,13 +3,20 @@ import json
 from datetime import datetime
 from loguru import logger
 import shutil
+from core.metadata_store import MetadataStore
+from core.script_parser import ScriptParser
 
 class ProjectManager:
     def __init__(self, base_path="projects"):
         self.base_path = base_path
         os.makedirs(base_path, exist_ok=True)
+        self.store = MetadataStore(base_path)
+        self.parser = ScriptParser(self.store)
         
-    def create_project(self, project_id, project_name, description=""):
+    def create_project(self, project_id, project_name, description="", concurrency=None, execution_mode=None,
+                       screenshot_policy=None, screenshot_every=None, screenshot_format=None, har_mode=None,
+                       setup_case_id=None, storage_state_ttl=None, execution_profile=None,
+                       case_timeout=None):
         """创建新项目"""
         try:
             project_path = os.path.join(self.base_path, project_id)
@@ -24,12 +31,27 @@ class ProjectManager:
                 "project_id": project_id,
                 "project_name": project_name,
                 "description": description,
+                "concurrency": concurrency,
+                "execution_mode": execution_mode,
+                "screenshot_policy": screenshot_policy,
+                "screenshot_every": screenshot_every,
+                "screenshot_format": screenshot_format,
+                "har_mode": har_mode,
+                "setup_case_id": setup_case_id,
+                "storage_state_ttl": storage_state_ttl,
+                "execution_profile": execution_profile,
+                "case_timeout": case_timeout,
                 "created_at": datetime.now().isoformat(),
                 "updated_at": datetime.now().isoformat()
             }
             
             with open(os.path.join(project_path, "project_info.json"), "w", encoding="utf-8") as f:
                 json.dump(project_info, f, ensure_ascii=False, indent=2)
+            
+            # 同步更新索引
+            self.store.upsert_project(project_info)
+            self.store.mark_synced()
+            self.store.mark_synced(project_id)
                 
             logger.info(f"项目创建成功: {project_id}")
             return True
@@ -40,18 +62,20 @@ class ProjectManager:
     def get_project(self, project_id):
         """获取项目信息"""
         try:
-            project_path = os.path.join(self.base_path, project_id)
-            if not os.path.exists(project_path):
+            # 优先从索引读取，目录在服务之外发生变化时索引会先重新扫描
+            self.store.sync_projects_if_changed()
+            project_info = self.store.get_project(project_id)
+            if not project_info:
                 logger.error(f"项目不存在: {project_id}")
-                return None
-                
-            with open(os.path.join(project_path, "project_info.json"), "r", encoding="utf-8") as f:
-                return json.load(f)
+            return project_info
         except Exception as e:
             logger.error(f"获取项目信息失败: {str(e)}")
             return None
             
-    def update_project(self, project_id, project_name=None, description=None):
+    def update_project(self, project_id, project_name=None, description=None, concurrency=None, execution_mode=None,
+                       screenshot_policy=None, screenshot_every=None, screenshot_format=None, har_mode=None,
+                       setup_case_id=None, storage_state_ttl=None, execution_profile=None,
+                       case_timeout=None):
         """更新项目信息"""
         try:
             project_info = self.get_project(project_id)
@@ -62,11 +86,28 @@ class ProjectManager:
                 project_info["project_name"] = project_name
             if description:
                 project_info["description"] = description
+            # 执行相关配置传入空字符串表示清除，执行时改用全局默认值
+            settings_updates = {
+                "concurrency": concurrency,
+                "execution_mode": execution_mode,
+                "screenshot_policy": screenshot_policy,
+                "screenshot_every": screenshot_every,
+                "screenshot_format": screenshot_format,
+                "har_mode": har_mode,
+                "setup_case_id": setup_case_id,
+                "storage_state_ttl": storage_state_ttl,
+                "execution_profile": execution_profile,
+                "case_timeout": case_timeout
+            }
+            for key, value in settings_updates.items():
+                if value is not None:
+                    project_info[key] = None if value == "" else value
             project_info["updated_at"] = datetime.now().isoformat()
             
             project_path = os.path.join(self.base_path, project_id)
             with open(os.path.join(project_path, "project_info.json"), "w", encoding="utf-8") as f:
                 json.dump(project_info, f, ensure_ascii=False, indent=2)
+            self.store.upsert_project(project_info)
                 
             logger.info(f"项目更新成功: {project_id}")
             return True
@@ -77,16 +118,9 @@ class ProjectManager:
     def delete_project(self, project_id: str) -> bool:
         """删除项目"""
         try:
-            # 读取现有项目列表
-            projects = self._load_projects()
-            
-            # 找到并删除项目
-            projects = [p for p in projects if p["project_id"] != project_id]
-            
-            # 保存更新后的项目列表
-            with open(self.projects_file, 'w', encoding='utf-8') as f:
-                json.dump(projects, f, ensure_ascii=False, indent=2)
-            
+            # 从索引中删除项目及其测试用例
+            self.store.delete_project(project_id)
+            self.store.mark_synced()
             return True
         except Exception as e:
             logger.error(f"删除项目失败: {str(e)}")
@@ -95,26 +129,30 @@ class ProjectManager:
     def list_projects(self):
         """列出所有项目"""
         try:
-            projects = []
-            for project_id in os.listdir(self.base_path):
-                project_info = self.get_project(project_id)
-                if project_info:
-                    projects.append(project_info)
-            return projects
+            return self.store.list_projects()
         except Exception as e:
             logger.error(f"列出项目失败: {str(e)}")
             return []
             
+    def query_projects(self, **filters):
+        """分页查询项目，返回 (项目列表, 下一页游标)，参数不合法时抛出 ValueError"""
+        return self.store.query_projects(**filters)
+            
+    def query_test_cases(self, project_id, **filters):
+        """分页查询测试用例，返回 (用例列表, 下一页游标)，参数不合法时抛出 ValueError"""
+        return self.store.query_test_cases(project_id, **filters)
+            
     def get_test_cases(self, project_id):
         """获取项目的测试用例列表"""
         try:
-            project_path = os.path.join(self.base_path, project_id)
-            test_cases = []
-            for file_name in os.listdir(project_path):
-                if file_name.endswith(".json") and file_name != "project_info.json":
-                    with open(os.path.join(project_path, file_name), "r", encoding="utf-8") as f:
-                        test_cases.append(json.load(f))
-            return test_cases
+            return self.store.list_test_cases(project_id)
         except Exception as e:
             logger.error(f"获取测试用例列表失败: {str(e)}")
-            return [] 
\ No newline at end of file
+            return []
+            
+    def get_test_case_steps(self, project_id, test_case_id):
+        """获取测试用例脚本解析后的步骤，脚本内容未变化时直接使用缓存"""
+        script_path = os.path.join(self.base_path, project_id, "results", f"{test_case_id}.py")
+        if not os.path.exists(script_path):
+            return None
+        return self.parser.parse_file(script_path)
\ No newline at end of file
@@ -4,30 +4,114 @@ import json
 import os
 from datetime import datetime
 import asyncio
+import shutil
+import time
+import uuid
+from core.metadata_store import MetadataStore
+from core.script_parser import ScriptParser
+from core.process_tree import limit_resources, spawn_kwargs, terminate_process_tree
+from core import metrics, settings
 
-class Recorder:
-    def __init__(self):
-        self.recording_process = None
-        self.current_test_case_id = None
-        self.current_project_id = None
+class RecordingSession:
+    """一个录制会话，拥有独立的 codegen 进程和输出目录"""
+    
+    def __init__(self, project_id, test_case_id, url, save_har=False):
+        self.session_id = uuid.uuid4().hex
+        self.project_id = project_id
+        self.test_case_id = test_case_id
+        self.url = url
+        self.save_har = save_har
+        # 录制过程中写入会话自己的目录，结束后再移动到 results 目录，未完成的脚本不会被执行或覆盖原有用例
+        self.work_dir = f"projects/{project_id}/.autotest/recordings/{self.session_id}"
+        self.output_file = f"{self.work_dir}/{test_case_id}.py"
+        self.har_file = f"{self.work_dir}/{test_case_id}.har"
+        self.process = None
+        self.watcher = None
+        self.status = "starting"
+        self.started_at = datetime.now()
+        self.finished_at = None
+        self._started = time.monotonic()
+        
+    @property
+    def active(self):
+        return self.status in ("starting", "recording")
         
-    async def start_recording(self, url, project_id, test_case_id):
-        """启动录制会话"""
+    def idle_seconds(self):
+        """录制脚本最近一次变化至今的秒数，codegen 在每次录制到操作时更新输出文件"""
         try:
-            if self.recording_process:
-                logger.warning("已经在录制中")
-                return False
-                
-            self.current_test_case_id = test_case_id
-            self.current_project_id = project_id
+            last_change = os.stat(self.output_file).st_mtime
+        except OSError:
+            last_change = self.started_at.timestamp()
+        return time.time() - last_change
+        
+    def elapsed_seconds(self):
+        return time.monotonic() - self._started
+        
+    def info(self):
+        return {
+            "session_id": self.session_id,
+            "project_id": self.project_id,
+            "test_case_id": self.test_case_id,
+            "url": self.url,
+            "save_har": self.save_har,
+            "status": self.status,
+            "started_at": self.started_at.isoformat(),
+            "finished_at": self.finished_at.isoformat() if self.finished_at else None,
+            "idle_seconds": round(self.idle_seconds(), 1) if self.active else None
+        }
+
+class Recorder:
+    def __init__(self, max_sessions=None, idle_timeout=None, max_duration=None):
+        self.sessions = {}
+        self.max_sessions = max_sessions or settings.MAX_RECORDING_SESSIONS
+        self.idle_timeout = idle_timeout or settings.RECORDING_IDLE_TIMEOUT
+        self.max_duration = max_duration or settings.RECORDING_MAX_DURATION
+        self.preexec_fn = limit_resources(
+            memory_mb=settings.RECORDING_MEMORY_MB,
+            cpu_seconds=settings.RECORDING_CPU_SECONDS,
+            file_size_mb=settings.RECORDING_FILE_SIZE_MB,
+            open_files=settings.RECORDING_OPEN_FILES
+        )
+        self.store = MetadataStore()
+        self.parser = ScriptParser(self.store)
+        
+    def get_session(self, session_id):
+        return self.sessions.get(session_id)
+        
+    def list_sessions(self):
+        self._evict()
+        return [session.info() for session in self.sessions.values()]
+        
+    def _active_sessions(self):
+        return [session for session in self.sessions.values() if session.active]
+        
+    def _evict(self):
+        """已结束的会话保留一个空闲超时时长，供 /stop 读取录制结果，之后移除"""
+        now = datetime.now()
+        for session_id, session in list(self.sessions.items()):
+            if session.finished_at and (now - session.finished_at).total_seconds() > self.idle_timeout:
+                del self.sessions[session_id]
+        
+    async def start_recording(self, url, project_id, test_case_id, save_har=False, har_url_filter=None):
+        """启动录制会话，返回会话；save_har 为 True 时将网络请求保存到与脚本同名的 .har 文件，供执行时回放
+        
+        会话数达到上限或同一测试用例正在录制时抛出 ValueError
+        """
+        self._evict()
+        active = self._active_sessions()
+        if len(active) >= self.max_sessions:
+            raise ValueError(f"同时进行的录制会话数已达到上限 {self.max_sessions}")
+        if any(s.project_id == project_id and s.test_case_id == test_case_id for s in active):
+            raise ValueError(f"测试用例正在录制中: {project_id}/{test_case_id}")
             
+        session = RecordingSession(project_id, test_case_id, url, save_har)
+        self.sessions[session.session_id] = session
+        try:
             # 确保目录存在
-            results_dir = f"projects/{project_id}/results"
-            os.makedirs(results_dir, exist_ok=True)
-            
-            output_file = f"{results_dir}/{test_case_id}.py"
+            os.makedirs(f"projects/{project_id}/results", exist_ok=True)
+            os.makedirs(session.work_dir, exist_ok=True)
             
-            logger.info(f"正在启动录制，目标URL: {url}")
+            logger.info(f"正在启动录制，会话: {session.session_id}, 目标URL: {url}")
             # 使用 playwright codegen 启动录制
             cmd = [
                 "playwright",
@@ -35,39 +119,62 @@ class Recorder:
                 "--target",
                 "python",
                 "-o",
-                output_file,
+                session.output_file,
                 "-b",
-                "chromium",
-                url
+                "chromium"
             ]
+            if save_har:
+                cmd += ["--save-har", session.har_file]
+                if har_url_filter:
+                    # 只保存匹配的请求，例如只保存接口请求: **/api/**
+                    cmd += ["--save-har-glob", har_url_filter]
+            cmd.append(url)
             
-            # 在异步环境中启动子进程
-            self.recording_process = await asyncio.create_subprocess_exec(
+            # 在异步环境中启动子进程，输出不读取，丢弃以免管道写满阻塞 codegen；
+            # codegen 及其启动的浏览器进程按会话的资源上限运行
+            session.process = await asyncio.create_subprocess_exec(
                 *cmd,
-                stdout=asyncio.subprocess.PIPE,
-                stderr=asyncio.subprocess.PIPE
+                stdout=asyncio.subprocess.DEVNULL,
+                stderr=asyncio.subprocess.DEVNULL,
+                preexec_fn=self.preexec_fn,
+                **spawn_kwargs()
             )
+            session.status = "recording"
             
-            logger.info("录制已成功启动")
-            return True
+            # 监视录制进程，超时后结束录制，录制浏览器关闭后将脚本写入测试用例索引
+            session.watcher = asyncio.create_task(self._watch(session))
+            
+            metrics.RECORDINGS.inc(status="started")
+            metrics.RECORDING_SESSIONS.set(len(self._active_sessions()))
+            logger.info(f"录制已成功启动，会话: {session.session_id}")
+            return session
         except Exception as e:
             logger.error(f"启动录制失败: {str(e)}")
-            await self.cleanup()
-            return False
+            metrics.RECORDINGS.inc(status="failed")
+            session.status = "failed"
+            session.finished_at = datetime.now()
+            await self.cleanup(session.session_id)
+            return None
             
-    async def stop_recording(self):
-        """停止录制会话"""
+    async def stop_recording(self, session_id, terminate=False):
+        """停止录制会话，等待录制浏览器关闭后返回解析的步骤；terminate 为 True 时立即结束录制进程
+        
+        会话不存在时返回 None
+        """
+        session = self.sessions.get(session_id)
+        if not session:
+            logger.warning(f"录制会话不存在: {session_id}")
+            return None
         try:
-            if not self.recording_process:
-                logger.warning("没有正在进行的录制")
-                return []
-            
-            # 等待录制进程结束
-            await self.recording_process.wait()
+            if terminate and session.active:
+                await self._terminate(session, "stopped")
+            # 等待录制进程结束，并移动录制结果
+            if session.watcher:
+                await asyncio.shield(session.watcher)
             
             # 读取生成的测试脚本
-            output_file = f"projects/{self.current_project_id}/results/{self.current_test_case_id}.py"
-            if os.path.exists(output_file):
+            output_file = f"projects/{session.project_id}/results/{session.test_case_id}.py"
+            if session.status != "failed" and os.path.exists(output_file):
                 with open(output_file, 'r', encoding='utf-8') as f:
                     recorded_code = f.read()
                 
@@ -75,96 +182,89 @@ class Recorder:
                 steps = self._parse_recorded_code(recorded_code)
                 
                 # 保存步骤到JSON文件
-                await self.save_recording(self.current_project_id, self.current_test_case_id, steps, recorded_code)
+                await self.save_recording(session.project_id, session.test_case_id, steps, recorded_code)
                 
-                logger.info(f"录制已停止，共记录 {len(steps)} 个步骤")
+                logger.info(f"录制已停止，会话: {session_id}，共记录 {len(steps)} 个步骤")
                 return steps
             else:
-                logger.error("未找到录制的脚本文件")
+                logger.error(f"未找到录制的脚本文件，会话: {session_id}")
                 return []
                 
         except Exception as e:
             logger.error(f"停止录制失败: {str(e)}")
             return []
         finally:
-            await self.cleanup()
+            self.sessions.pop(session_id, None)
             
-    async def cleanup(self):
-        """清理资源"""
+    async def _watch(self, session):
+        """等待录制进程结束，录制空闲或超过最长时长时结束进程，然后移动录制结果并更新测试用例索引"""
+        process = session.process
+        while process.returncode is None:
+            try:
+                await asyncio.wait_for(process.wait(), timeout=min(10, self.idle_timeout))
+            except asyncio.TimeoutError:
+                if session.elapsed_seconds() > self.max_duration:
+                    logger.warning(f"录制超过最长时长 {self.max_duration} 秒，结束会话: {session.session_id}")
+                    await self._terminate(session, "timeout")
+                elif session.idle_seconds() > self.idle_timeout:
+                    logger.warning(f"录制空闲超过 {self.idle_timeout} 秒，结束会话: {session.session_id}")
+                    await self._terminate(session, "timeout")
+        if session.status == "recording":
+            session.status = "finished"
+        session.finished_at = datetime.now()
+        metrics.RECORDING_SESSIONS.set(len(self._active_sessions()))
         try:
-            if self.recording_process:
-                try:
-                    self.recording_process.terminate()
-                except:
-                    pass
-                self.recording_process = None
+            self._publish(session)
+        except Exception as e:
+            session.status = "failed"
+            logger.error(f"保存录制结果失败: {str(e)}")
             
-            self.current_test_case_id = None
-            self.current_project_id = None
-                
+    def _publish(self, session):
+        """将会话目录中的录制结果移动到 results 目录，并更新测试用例索引"""
+        results_dir = f"projects/{session.project_id}/results"
+        if os.path.exists(session.output_file):
+            os.replace(session.output_file, f"{results_dir}/{session.test_case_id}.py")
+            har_file = f"{results_dir}/{session.test_case_id}.har"
+            if os.path.exists(session.har_file):
+                os.replace(session.har_file, har_file)
+            elif os.path.exists(har_file):
+                # 重新录制后旧的 HAR 与新脚本不再对应
+                os.remove(har_file)
+            self.store.upsert_test_case(session.project_id, session.test_case_id)
+            self.store.mark_synced(session.project_id)
+        shutil.rmtree(session.work_dir, ignore_errors=True)
+            
+    async def _terminate(self, session, status):
+        """结束录制进程及其启动的浏览器，进程没有及时退出时强制结束"""
+        session.status = status
+        process = session.process
+        if not process or process.returncode is not None:
+            return
+        await terminate_process_tree(process, grace=5)
+            
+    async def cleanup(self, session_id=None):
+        """结束录制会话并清理资源，未指定会话时结束所有会话"""
+        try:
+            sessions = [self.sessions[session_id]] if session_id in self.sessions else []
+            if session_id is None:
+                sessions = list(self.sessions.values())
+            for session in sessions:
+                if session.active:
+                    await self._terminate(session, "stopped")
+                if session.watcher:
+                    await session.watcher
+                self.sessions.pop(session.session_id, None)
+            metrics.RECORDING_SESSIONS.set(len(self._active_sessions()))
         except Exception as e:
             logger.error(f"清理资源失败: {str(e)}")
             
     def _parse_recorded_code(self, code):
-        """解析录制的代码，提取步骤"""
-        steps = []
+        """解析录制的代码，提取结构化步骤"""
         try:
-            # 按行分割代码
-            lines = code.split('\n')
-            for line in lines:
-                line = line.strip()
-                if not line or line.startswith(('def', 'import', '#', '@')) or line == "":
-                    continue
-                    
-                # 解析每一行代码，转换为步骤
-                if 'click' in line:
-                    step = {
-                        "type": "click",
-                        "selector": self._extract_selector(line),
-                        "timestamp": datetime.now().isoformat()
-                    }
-                    steps.append(step)
-                elif 'fill' in line:
-                    step = {
-                        "type": "fill",
-                        "selector": self._extract_selector(line),
-                        "value": self._extract_value(line),
-                        "timestamp": datetime.now().isoformat()
-                    }
-                    steps.append(step)
-                elif 'goto' in line:
-                    step = {
-                        "type": "goto",
-                        "url": self._extract_url(line),
-                        "timestamp": datetime.now().isoformat()
-                    }
-                    steps.append(step)
-                    
+            return self.parser.parse(code)
         except Exception as e:
             logger.error(f"解析录制代码失败: {str(e)}")
-        return steps
-        
-    def _extract_selector(self, line):
-        """从代码行中提取选择器"""
-        if 'get_by_role' in line:
-            return line.split('get_by_role')[1].strip('()').strip()
-        elif 'get_by_placeholder' in line:
-            return line.split('get_by_placeholder')[1].strip('()').strip()
-        elif 'get_by_text' in line:
-            return line.split('get_by_text')[1].strip('()').strip()
-        return line
-        
-    def _extract_value(self, line):
-        """从代码行中提取填充的值"""
-        if 'fill' in line:
-            return line.split('fill')[1].strip('()').strip().strip('"\'')
-        return ""
-        
-    def _extract_url(self, line):
-        """从代码行中提取URL"""
-        if 'goto' in line:
-            return line.split('goto')[1].strip('()').strip().strip('"\'')
-        return ""
+            return []
             
     async def save_recording(self, project_id, test_case_id, steps, raw_code):
         """保存录制的步骤"""
@@ -0,0 +1,173 @@
+from loguru import logger
+from datetime import date, datetime, timedelta
+import asyncio
+import gzip
+import json
+import os
+import re
+import shutil
+import time
+import uuid
+
+# 旧版每次执行单独保存的结果文件: results/<用例ID>_<YYYYmmdd_HHMMSS>.json
+LEGACY_RESULT_PATTERN = re.compile(r"^(.+)_(\d{8}_\d{6})\.json$")
+
+# 分段在最后一次写入多久之后才压缩（秒），避免与跨零点的写入冲突
+SEAL_GRACE_SECONDS = 300
+
+
+class RunHistory:
+    """按项目追加写入的执行记录
+
+    执行记录以 JSON Lines 的形式追加到 projects/<项目ID>/runs/<日期>.jsonl，每天一个分段；
+    过去日期的分段压缩为 .jsonl.gz，超过保留天数的分段连同当天的执行日志整体删除。元数据索引记录每条执行
+    记录所在的分段和偏移量，按用例和时间查询时无需扫描分段文件。
+    """
+
+    def __init__(self, store, retention_days=30):
+        self.store = store
+        self.retention_days = retention_days
+
+    def _runs_dir(self, project_id):
+        return os.path.join(self.store.base_path, project_id, "runs")
+
+    def _segment_path(self, project_id, segment, compressed=False):
+        return os.path.join(self._runs_dir(project_id), f"{segment}.jsonl.gz" if compressed else f"{segment}.jsonl")
+
+    def append(self, project_id, result):
+        """追加一条执行记录并写入索引，返回执行记录ID"""
+        run_id = result.get("run_id") or uuid.uuid4().hex
+        result["run_id"] = run_id
+        run_at = result.get("execution_time") or datetime.now().isoformat()
+        segment = run_at[:10]
+
+        data = (json.dumps(result, ensure_ascii=False, separators=(",", ":")) + "\n").encode("utf-8")
+        os.makedirs(self._runs_dir(project_id), exist_ok=True)
+        # O_APPEND 保证多个进程同时追加时每条记录完整写入，写入后的位置即为本条记录的结束位置
+        fd = os.open(self._segment_path(project_id, segment), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+        try:
+            os.write(fd, data)
+            end = os.lseek(fd, 0, os.SEEK_CUR)
+        finally:
+            os.close(fd)
+
+        self.store.index_run({
+            "run_id": run_id,
+            "project_id": project_id,
+            "test_case_id": result.get("test_case_id", ""),
+            "status": result.get("status"),
+            "run_at": run_at,
+            "duration": result.get("duration"),
+            "segment": segment,
+            "byte_offset": end - len(data),
+            "byte_length": len(data)
+        })
+        return run_id
+
+    def _read_at(self, project_id, segment, offset, length):
+        try:
+            f = open(self._segment_path(project_id, segment), "rb")
+        except FileNotFoundError:
+            # 分段已被压缩，偏移量对应解压后的内容
+            f = gzip.open(self._segment_path(project_id, segment, compressed=True), "rb")
+        with f:
+            f.seek(offset)
+            return json.loads(f.read(length))
+
+    def get(self, project_id, run_id):
+        """读取一条完整的执行记录"""
+        run = self.store.get_run(project_id, run_id)
+        if not run:
+            return None
+        try:
+            return self._read_at(project_id, run["segment"], run["byte_offset"], run["byte_length"])
+        except FileNotFoundError:
+            logger.warning(f"执行记录所在分段不存在: {project_id}/{run['segment']}")
+            return None
+
+    def list_runs(self, project_id, test_case_id=None, before=None, before_id=None, limit=50):
+        """按时间倒序列出执行记录摘要"""
+        return self.store.query_runs(
+            project_id, test_case_id=test_case_id, before=before, before_id=before_id, limit=limit
+        )
+
+    def _seal(self, project_id, segment):
+        """将不再写入的分段压缩为 .jsonl.gz"""
+        path = self._segment_path(project_id, segment)
+        compressed_path = self._segment_path(project_id, segment, compressed=True)
+        tmp_path = f"{compressed_path}.tmp"
+        with open(path, "rb") as src, gzip.open(tmp_path, "wb") as dst:
+            shutil.copyfileobj(src, dst)
+        os.replace(tmp_path, compressed_path)
+        os.remove(path)
+        logger.info(f"执行记录分段已压缩: {project_id}/{segment}")
+
+    def _drop(self, project_id, segment):
+        """删除超过保留期的分段及其索引"""
+        self.store.delete_segment_runs(project_id, segment)
+        for compressed in (False, True):
+            path = self._segment_path(project_id, segment, compressed)
+            if os.path.exists(path):
+                os.remove(path)
+        # 同一天的实时执行日志
+        shutil.rmtree(os.path.join(self._runs_dir(project_id), "logs", segment), ignore_errors=True)
+        logger.info(f"执行记录分段已过期删除: {project_id}/{segment}")
+
+    def _import_legacy(self, project_id):
+        """将旧版的单个结果文件迁移到执行记录中"""
+        results_dir = os.path.join(self.store.base_path, project_id, "results")
+        if not os.path.isdir(results_dir):
+            return
+        for file_name in os.listdir(results_dir):
+            if not LEGACY_RESULT_PATTERN.match(file_name):
+                continue
+            path = os.path.join(results_dir, file_name)
+            try:
+                with open(path, "r", encoding="utf-8") as f:
+                    self.append(project_id, json.load(f))
+                os.remove(path)
+            except Exception as e:
+                logger.error(f"迁移旧版执行结果失败: {path}, {str(e)}")
+
+    def compact(self, project_id):
+        """压缩过去日期的分段，删除超过保留期的分段"""
+        self._import_legacy(project_id)
+        runs_dir = self._runs_dir(project_id)
+        if not os.path.isdir(runs_dir):
+            return
+        today = date.today().isoformat()
+        expire_before = (date.today() - timedelta(days=self.retention_days)).isoformat()
+        for file_name in sorted(os.listdir(runs_dir)):
+            if file_name.endswith(".jsonl.gz"):
+                segment, compressed = file_name[:-len(".jsonl.gz")], True
+            elif file_name.endswith(".jsonl"):
+                segment, compressed = file_name[:-len(".jsonl")], False
+            else:
+                continue
+            if segment < expire_before:
+                self._drop(project_id, segment)
+            elif not compressed and segment < today:
+                path = os.path.join(runs_dir, file_name)
+                if time.time() - os.path.getmtime(path) > SEAL_GRACE_SECONDS:
+                    self._seal(project_id, segment)
+
+    def compact_all(self):
+        """整理所有项目的执行记录"""
+        if not os.path.isdir(self.store.base_path):
+            return
+        for project_id in os.listdir(self.store.base_path):
+            if project_id.startswith(".") or not os.path.isdir(os.path.join(self.store.base_path, project_id)):
+                continue
+            try:
+                self.compact(project_id)
+            except Exception as e:
+                logger.error(f"整理执行记录失败: {project_id}, {str(e)}")
+
+    async def maintain(self, interval):
+        """后台定期整理执行记录"""
+        while True:
+            try:
+                await asyncio.to_thread(self.compact_all)
+            except Exception as e:
+                logger.error(f"整理执行记录失败: {str(e)}")
+            await asyncio.sleep(interval)
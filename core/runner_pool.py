@@ -0,0 +1,147 @@
+from loguru import logger
+from contextlib import asynccontextmanager
+from collections import deque
+import asyncio
+import json
+import sys
+from core.process_tree import spawn_kwargs, terminate_process_tree
+
+# 常驻运行进程中一次执行结束的标记，与 core/script_runner.py 中的相同
+RUNNER_DONE_MARKER = "\x1eautotest-runner-done"
+
+
+class Runner:
+    """一个已导入 Playwright、以 --serve 方式常驻的 script_runner 进程"""
+
+    def __init__(self, process):
+        self.process = process
+        self.runs = 0
+        self.broken = False
+
+    @property
+    def alive(self):
+        return not self.broken and self.process.returncode is None
+
+    async def send(self, script_path, env):
+        """提交一次执行请求，env 只对该次执行生效"""
+        request = json.dumps({"script_path": script_path, "env": env}, ensure_ascii=False) + "\n"
+        self.process.stdin.write(request.encode("utf-8"))
+        await self.process.stdin.drain()
+
+
+class RunnerPool:
+    """预先启动的脚本运行进程池
+
+    每个运行进程只在启动时导入一次 Playwright，之后依次执行分配给它的脚本，省去每个用例启动解释器和导入
+    Playwright 的耗时。同一时间一个运行进程只执行一个脚本，每个脚本以全新的模块加载并启动自己的 Playwright；
+    运行进程执行 max_runs 次后被替换，避免长期运行积累的内存泄漏。执行被中止的运行进程连同其启动的浏览器被结束。
+    """
+
+    def __init__(self, runner_path, size=2, max_runs=50, grace=5.0):
+        self.runner_path = runner_path
+        self.size = max(0, size)
+        self.max_runs = max(1, max_runs)
+        self.grace = grace
+        self._idle = deque()
+        self._busy = set()
+        self._spawning = set()
+        self._stopped = False
+
+    @property
+    def enabled(self):
+        return self.size > 0
+
+    async def _spawn(self):
+        process = await asyncio.create_subprocess_exec(
+            sys.executable, self.runner_path, "--serve",
+            stdin=asyncio.subprocess.PIPE,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE,
+            **spawn_kwargs()
+        )
+        return Runner(process)
+
+    async def _spawn_idle(self):
+        try:
+            runner = await self._spawn()
+        except Exception as e:
+            logger.error(f"启动脚本运行进程失败: {str(e)}")
+            return
+        if self._stopped:
+            await self._close(runner)
+        else:
+            self._idle.append(runner)
+
+    def _replenish(self):
+        """在后台补足运行进程，之后的用例不必等待进程启动"""
+        if self._stopped:
+            return
+        for _ in range(self.size - len(self._idle) - len(self._busy) - len(self._spawning)):
+            task = asyncio.create_task(self._spawn_idle())
+            self._spawning.add(task)
+            task.add_done_callback(self._spawning.discard)
+
+    async def start(self):
+        """预先启动运行进程"""
+        self._stopped = False
+        self._replenish()
+        if self._spawning:
+            await asyncio.wait(set(self._spawning))
+        logger.info(f"脚本运行进程池已初始化，进程数量: {len(self._idle)}")
+
+    async def stop(self):
+        """结束所有运行进程"""
+        self._stopped = True
+        for task in list(self._spawning):
+            task.cancel()
+        runners = list(self._idle) + list(self._busy)
+        self._idle.clear()
+        for runner in runners:
+            await self._close(runner)
+        logger.info("脚本运行进程池已关闭")
+
+    async def _close(self, runner):
+        """关闭标准输入让运行进程自行退出，没有及时退出时结束其进程树"""
+        runner.broken = True
+        if runner.process.returncode is None:
+            try:
+                runner.process.stdin.close()
+                await asyncio.wait_for(runner.process.wait(), timeout=self.grace)
+            except (asyncio.TimeoutError, OSError):
+                pass
+        await terminate_process_tree(runner.process, self.grace)
+
+    async def abort(self, runner):
+        """执行被中止时结束运行进程及其启动的浏览器，该进程不再复用"""
+        runner.broken = True
+        await terminate_process_tree(runner.process, self.grace)
+
+    @asynccontextmanager
+    async def acquire(self):
+        """独占一个运行进程，没有空闲的进程时启动一个新的；用完后放回，损坏或达到执行次数上限时替换"""
+        runner = None
+        while self._idle:
+            candidate = self._idle.popleft()
+            if candidate.alive:
+                runner = candidate
+                break
+            await self._close(candidate)
+        if runner is None:
+            runner = await self._spawn()
+        self._busy.add(runner)
+        # 未预先启动时在第一次使用时补足其余的运行进程
+        self._replenish()
+        try:
+            yield runner
+        except BaseException:
+            # 执行中途出错的运行进程状态未知，不再复用
+            runner.broken = True
+            raise
+        finally:
+            self._busy.discard(runner)
+            runner.runs += 1
+            if runner.alive and runner.runs < self.max_runs and not self._stopped and len(self._idle) < self.size:
+                self._idle.append(runner)
+            else:
+                await asyncio.shield(self._close(runner))
+                self._replenish()
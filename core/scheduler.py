@@ -0,0 +1,20 @@
+def order_test_cases(test_case_ids, history, order="history"):
+    """安排项目中用例的执行顺序
+
+    history 顺序下，最近一次执行失败的用例排在最前以便尽快得到反馈；同一组内按历史耗时从长到短
+    排列（最长处理时间优先），并发执行时避免最慢的用例最后才开始而拉长整体耗时。没有执行记录的
+    用例按已知耗时的中位数估计。
+    """
+    if order == "name":
+        return sorted(test_case_ids)
+
+    durations = sorted(item["duration"] for item in history.values() if item.get("duration") is not None)
+    estimate = durations[len(durations) // 2] if durations else 0
+
+    def key(test_case_id):
+        item = history.get(test_case_id) or {}
+        failed = item.get("last_status") not in (None, "success")
+        duration = item.get("duration")
+        return (not failed, -(estimate if duration is None else duration), test_case_id)
+
+    return sorted(test_case_ids, key=key)
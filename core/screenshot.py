@@ -0,0 +1,81 @@
+from loguru import logger
+import asyncio
+import io
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow 为可选依赖，缺失时不支持 WebP 和缩略图
+    Image = None
+
+EXTENSIONS = {"jpeg": "jpg", "webp": "webp", "png": "png"}
+
+# 关闭页面等清理步骤，执行后页面已不存在，last_step 策略在此之前截图
+TEARDOWN_STEPS = {"close"}
+
+
+def last_capture_index(steps):
+    """最后一个不是清理步骤的步骤序号，没有时返回 -1"""
+    for index in range(len(steps) - 1, -1, -1):
+        if steps[index]["type"] not in TEARDOWN_STEPS:
+            return index
+    return -1
+
+
+class ScreenshotCapturer:
+    """按截图策略捕获页面截图，压缩后保存到内容寻址存储中"""
+
+    def __init__(self, blob_store, policy="on_failure", every=5, fmt="jpeg", quality=70, thumbnail_width=0):
+        self.blob_store = blob_store
+        self.policy = policy
+        self.every = max(1, every)
+        self.quality = quality
+        self.thumbnail_width = thumbnail_width
+
+        if fmt == "webp" and Image is None:
+            logger.warning("未安装 Pillow，截图格式 webp 回退为 jpeg")
+            fmt = "jpeg"
+        if thumbnail_width and Image is None:
+            logger.warning("未安装 Pillow，不生成截图缩略图")
+            self.thumbnail_width = 0
+        self.format = fmt
+
+    def should_capture(self, index, last_index, failed):
+        """判断第 index 个步骤（从 0 开始）执行后是否需要截图，last_index 为 last_capture_index 的返回值"""
+        if self.policy == "never":
+            return False
+        if failed:
+            return True
+        if self.policy == "every_n":
+            return (index + 1) % self.every == 0
+        if self.policy == "last_step":
+            return index == last_index
+        return False
+
+    def _encode(self, image_bytes):
+        """转换格式并生成缩略图，返回 (截图引用, 缩略图引用)"""
+        ext = EXTENSIONS[self.format]
+        thumbnail = None
+        if Image is not None and (self.format == "webp" or self.thumbnail_width):
+            image = Image.open(io.BytesIO(image_bytes))
+            if self.format == "webp":
+                buffer = io.BytesIO()
+                image.save(buffer, "WEBP", quality=self.quality)
+                image_bytes = buffer.getvalue()
+            if self.thumbnail_width and image.width > self.thumbnail_width:
+                image.thumbnail((self.thumbnail_width, self.thumbnail_width * image.height // image.width))
+                buffer = io.BytesIO()
+                image.convert("RGB").save(buffer, "WEBP" if self.format == "webp" else "JPEG", quality=self.quality)
+                thumbnail = self.blob_store.put(buffer.getvalue(), "webp" if self.format == "webp" else "jpg")
+        return self.blob_store.put(image_bytes, ext), thumbnail
+
+    async def capture(self, page):
+        """截取页面并保存，返回截图和缩略图的引用"""
+        if self.format == "png":
+            image_bytes = await page.screenshot(type="png")
+        elif self.format == "jpeg":
+            image_bytes = await page.screenshot(type="jpeg", quality=self.quality)
+        else:
+            # WebP 由 Pillow 从无损的 PNG 转换，避免二次压缩
+            image_bytes = await page.screenshot(type="png")
+        # 编码和写文件在线程中完成，不阻塞事件循环
+        return await asyncio.to_thread(self._encode, image_bytes)
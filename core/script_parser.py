@@ -0,0 +1,273 @@
+from loguru import logger
+from collections import OrderedDict
+import ast
+import hashlib
+
+# 页面级操作（直接在 page 对象上调用）
+PAGE_ACTIONS = {
+    "goto", "reload", "go_back", "go_forward", "close", "bring_to_front",
+    "wait_for_timeout", "wait_for_load_state", "wait_for_url", "set_viewport_size",
+}
+
+# 录制脚本中用于创建和关闭浏览器的语句，不属于测试步骤
+SETUP_CALLS = {"launch", "new_context", "launch_persistent_context", "stop"}
+
+# 带事件等待的上下文管理器，例如 with page.expect_popup() as page1_info:
+EXPECT_EVENTS = {
+    "expect_popup": "popup",
+    "expect_download": "download",
+    "expect_file_chooser": "filechooser",
+    "expect_navigation": "navigation",
+    "expect_request": "request",
+    "expect_response": "response",
+}
+
+
+def content_hash(code):
+    """脚本内容的哈希值，用于缓存解析结果"""
+    return hashlib.sha256(code.encode("utf-8")).hexdigest()
+
+
+def _value(node):
+    """将参数节点转换为可序列化的值，无法静态求值的参数保留其源码"""
+    try:
+        return ast.literal_eval(node)
+    except Exception:
+        pass
+    # re.compile("...") 常用于 get_by_text / to_have_url 等参数
+    if (
+        isinstance(node, ast.Call)
+        and isinstance(node.func, ast.Attribute)
+        and node.func.attr == "compile"
+        and getattr(node.func.value, "id", None) == "re"
+        and node.args
+    ):
+        try:
+            return {"regex": ast.literal_eval(node.args[0])}
+        except Exception:
+            pass
+    return {"expr": ast.unparse(node)}
+
+
+def _call_args(call):
+    args = [_value(arg) for arg in call.args]
+    kwargs = {kw.arg: _value(kw.value) for kw in call.keywords if kw.arg}
+    return args, kwargs
+
+
+def _chain(node):
+    """将 page.get_by_role(...).first.click() 这样的调用链展开为 (根变量名, 片段列表)"""
+    if isinstance(node, ast.Name):
+        return node.id, []
+    if isinstance(node, ast.Attribute):
+        root, segments = _chain(node.value)
+        return root, segments + [{"method": node.attr}]
+    if isinstance(node, ast.Call):
+        if isinstance(node.func, ast.Attribute):
+            root, segments = _chain(node.func.value)
+            args, kwargs = _call_args(node)
+            segment = {"method": node.func.attr}
+            if args:
+                segment["args"] = args
+            if kwargs:
+                segment["kwargs"] = kwargs
+            return root, segments + [segment]
+        if isinstance(node.func, ast.Name):
+            # 例如 expect(...)，由调用方单独处理
+            return None, []
+    return None, []
+
+
+def _value_text(value):
+    if isinstance(value, dict) and "regex" in value:
+        return f"re.compile({value['regex']!r})"
+    if isinstance(value, dict) and "expr" in value:
+        return value["expr"]
+    return repr(value)
+
+
+def _selector_text(segments):
+    """生成便于阅读的定位器描述，兼容旧版步骤中的 selector 字段"""
+    parts = []
+    for segment in segments:
+        text = segment["method"]
+        if "args" in segment or "kwargs" in segment:
+            params = [_value_text(arg) for arg in segment.get("args", [])]
+            params += [f"{key}={_value_text(value)}" for key, value in segment.get("kwargs", {}).items()]
+            text += f"({', '.join(params)})"
+        parts.append(text)
+    return ".".join(parts)
+
+
+class ScriptParser:
+    """基于 ast 的录制脚本解析器，将 codegen 脚本转换为结构化的步骤 IR
+
+    每个步骤是一个可 JSON 序列化的字典：
+        type      操作类型，例如 goto / click / fill / press / check / select_option / expect
+        page      执行操作的页面变量名，例如 page、page1
+        locator   定位器调用链，例如 [{"method": "get_by_role", "args": ["button"], "kwargs": {"name": "登录"}}]
+        args      操作参数; kwargs 操作的关键字参数
+        line      在脚本中的行号
+    解析结果按脚本内容哈希缓存在内存和元数据索引中，脚本未变化时不会重新解析。
+    """
+
+    def __init__(self, store=None, cache_size=256):
+        self.store = store
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+
+    def parse(self, code):
+        """解析脚本内容并返回步骤列表，优先使用缓存"""
+        key = content_hash(code)
+        steps = self._cache.get(key)
+        if steps is None and self.store:
+            steps = self.store.get_step_ir(key)
+        if steps is None:
+            steps = self.parse_uncached(code)
+            if self.store:
+                self.store.save_step_ir(key, steps)
+        self._cache[key] = steps
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_size:
+            self._cache.popitem(last=False)
+        return steps
+
+    def parse_file(self, script_path):
+        with open(script_path, "r", encoding="utf-8") as f:
+            return self.parse(f.read())
+
+    def parse_uncached(self, code):
+        tree = ast.parse(code)
+        run = next(
+            (node for node in tree.body if isinstance(node, ast.FunctionDef) and node.name == "run"),
+            None
+        )
+        if run is None:
+            logger.warning("录制脚本中没有 run 函数")
+            return []
+        return self._parse_body(run.body)
+
+    def _parse_body(self, body):
+        steps = []
+        for stmt in body:
+            steps.extend(self._parse_statement(stmt))
+        return steps
+
+    def _parse_statement(self, stmt):
+        line = getattr(stmt, "lineno", None)
+
+        # with page.expect_popup() as page1_info: ...
+        if isinstance(stmt, ast.With) and len(stmt.items) == 1:
+            item = stmt.items[0]
+            root, segments = _chain(item.context_expr)
+            if root and len(segments) == 1 and segments[0]["method"] in EXPECT_EVENTS:
+                return [{
+                    "type": "expect_event",
+                    "event": EXPECT_EVENTS[segments[0]["method"]],
+                    "page": root,
+                    "alias": item.optional_vars.id if isinstance(item.optional_vars, ast.Name) else None,
+                    "args": segments[0].get("args", []),
+                    "kwargs": segments[0].get("kwargs", {}),
+                    "steps": self._parse_body(stmt.body),
+                    "line": line
+                }]
+
+        if isinstance(stmt, ast.Assign) and len(stmt.targets) == 1 and isinstance(stmt.targets[0], ast.Name):
+            name = stmt.targets[0].id
+            root, segments = _chain(stmt.value)
+            # page1 = page1_info.value
+            if root and segments == [{"method": "value"}]:
+                return [{"type": "assign_event_value", "name": name, "alias": root, "line": line}]
+            if root and segments and segments[-1]["method"] in SETUP_CALLS:
+                return []
+            # page = context.new_page()
+            if root and segments and segments[-1]["method"] == "new_page":
+                return [{"type": "new_page", "name": name, "line": line}]
+
+        if isinstance(stmt, ast.Expr) and isinstance(stmt.value, ast.Call):
+            step = self._parse_call(stmt.value)
+            if step is not None:
+                if step:
+                    step["line"] = line
+                    return [step]
+                return []
+
+        if isinstance(stmt, (ast.Pass, ast.Import, ast.ImportFrom)):
+            return []
+
+        # 无法识别的语句原样保留，避免步骤丢失
+        return [{"type": "unsupported", "code": ast.unparse(stmt), "line": line}]
+
+    def _parse_call(self, call):
+        """解析表达式语句，返回步骤；返回空字典表示应忽略的语句，返回 None 表示无法识别"""
+        # expect(locator).to_be_visible()
+        if (
+            isinstance(call.func, ast.Attribute)
+            and isinstance(call.func.value, ast.Call)
+            and getattr(call.func.value.func, "id", None) == "expect"
+            and call.func.value.args
+        ):
+            root, target = _chain(call.func.value.args[0])
+            if not root:
+                return None
+            args, kwargs = _call_args(call)
+            return {
+                "type": "expect",
+                "assertion": call.func.attr,
+                "page": root,
+                "locator": target or None,
+                "selector": _selector_text(target) if target else None,
+                "args": args,
+                "kwargs": kwargs
+            }
+
+        root, segments = _chain(call)
+        if not root or not segments:
+            return None
+        action = segments[-1]
+        method = action["method"]
+        args = action.get("args", [])
+        kwargs = action.get("kwargs", {})
+
+        # context.close() / browser.close() 属于清理代码
+        if root in ("context", "browser") and method in ("close",):
+            return {}
+        if root in ("context", "browser", "playwright"):
+            return None
+
+        # page.once("dialog", lambda dialog: dialog.dismiss())
+        if method in ("on", "once") and len(segments) == 1 and args and args[0] == "dialog":
+            handler = call.args[1] if len(call.args) > 1 else None
+            dialog_action = "dismiss"
+            if isinstance(handler, ast.Lambda) and isinstance(handler.body, ast.Call):
+                _, handler_segments = _chain(handler.body)
+                if handler_segments:
+                    dialog_action = handler_segments[-1]["method"]
+            return {"type": "dialog", "page": root, "action": dialog_action, "once": method == "once"}
+
+        # page.keyboard.press("Enter") / page.mouse.click(10, 20)
+        if len(segments) == 2 and segments[0]["method"] in ("keyboard", "mouse"):
+            return {
+                "type": f"{segments[0]['method']}.{method}",
+                "page": root,
+                "args": args,
+                "kwargs": kwargs
+            }
+
+        locator = segments[:-1]
+        step = {
+            "type": method,
+            "page": root,
+            "locator": locator or None,
+            "selector": _selector_text(locator) if locator else None,
+            "args": args,
+            "kwargs": kwargs
+        }
+        # 兼容旧版步骤格式中的 url / value 字段
+        if method == "goto" and args:
+            step["url"] = args[0]
+        elif locator and args and isinstance(args[0], str):
+            step["value"] = args[0]
+        if not locator and method not in PAGE_ACTIONS:
+            logger.debug(f"未知的页面操作: {method}")
+        return step
@@ -0,0 +1,510 @@
+"""测试脚本运行器
+
+加载 playwright codegen 录制的脚本并调用其中的 run(playwright)。
+设置 AUTOTEST_CDP_ENDPOINT 环境变量时，脚本中的 chromium.launch() 会改为
+连接浏览器池中已启动的浏览器，并在全新的 BrowserContext 中执行。
+设置 AUTOTEST_TIMINGS_FILE 环境变量时，记录解释器启动、浏览器启动、上下文创建、
+每个操作和清理阶段的耗时，执行结束后写入该文件；设置 AUTOTEST_TRACE_FILE 时，
+为脚本创建的第一个上下文开启 Playwright tracing 并保存到该文件；设置 AUTOTEST_HAR_FILE 时，
+脚本创建的上下文和页面从该 HAR 返回网络响应，AUTOTEST_HAR_NOT_FOUND 为 abort 时 HAR 中没有的
+请求直接失败，为 fallback 时访问真实网络。
+设置 AUTOTEST_STORAGE_STATE_FILE 时，脚本创建的上下文加载该登录状态；同时设置 AUTOTEST_SETUP_SCRIPT
+和 AUTOTEST_RESUME_URL 时，脚本开头与 setup 脚本相同的登录语句被跳过，改为直接打开登录后的页面。
+设置 AUTOTEST_STORAGE_STATE_OUT 时，脚本结束前将第一个上下文的登录状态和当前页面地址写入该文件。
+设置 AUTOTEST_EXECUTION_PROFILE_JSON 时，按其中的执行配置屏蔽命中的请求并关闭页面动画。
+
+以 --serve 启动时作为常驻运行进程，Playwright 只导入一次：从标准输入逐行读取
+{"script_path": ..., "env": {...}} 执行请求，依次在本进程中执行，env 只对该次执行生效。
+每次执行结束后在标准输出和标准错误各写入一行 RUNNER_DONE_MARKER，标准输出的一行带有退出码。
+
+用法: python script_runner.py <script_path>
+      python script_runner.py --serve
+"""
+import time
+
+# 尽早记录，用于计算解释器启动耗时
+_STARTED = time.time()
+
+from playwright.sync_api import sync_playwright, expect as playwright_expect
+from contextlib import contextmanager
+from fnmatch import fnmatchcase
+import ast
+import importlib.util
+import json
+import os
+import sys
+import traceback
+
+# 调用后直接返回的值类型，不需要包装
+PRIMITIVE_TYPES = (type(None), bool, int, float, str, bytes, list, dict, tuple)
+# 只构造定位器、不与页面交互的返回类型，不计入操作耗时
+BUILDER_TYPES = {"Locator", "FrameLocator"}
+NAVIGATION_METHODS = {"goto", "reload", "go_back", "go_forward", "wait_for_url", "wait_for_load_state"}
+TEARDOWN_TYPES = {"Browser", "BrowserContext", "PooledBrowser"}
+BROWSER_TYPES = {"Browser", "PooledBrowser"}
+# 跳过登录语句时需要保留的浏览器、上下文和页面创建语句
+CREATION_METHODS = {"launch", "launch_persistent_context", "new_context", "new_page"}
+# 常驻模式下一次执行结束的标记，与 core/runner_pool.py 中的相同
+RUNNER_DONE_MARKER = "\x1eautotest-runner-done"
+# 与 core/execution_profile.py 中的脚本相同，运行器作为独立脚本执行，不导入 core 包
+DISABLE_ANIMATIONS_CSS = (
+    "*, *::before, *::after { animation-duration: 0s !important; animation-delay: 0s !important;"
+    " transition-duration: 0s !important; transition-delay: 0s !important; scroll-behavior: auto !important; }"
+)
+DISABLE_ANIMATIONS_SCRIPT = """(() => {
+    const style = document.createElement("style");
+    style.textContent = %s;
+    const append = () => (document.head || document.documentElement).appendChild(style);
+    if (document.documentElement) {
+        append();
+    } else {
+        document.addEventListener("DOMContentLoaded", append);
+    }
+})();""" % json.dumps(DISABLE_ANIMATIONS_CSS)
+
+
+class PooledBrowser:
+    """注入给录制脚本的浏览器，close() 只关闭本脚本创建的上下文"""
+
+    def __init__(self, browser):
+        self._browser = browser
+        self._contexts = []
+
+    def new_context(self, **kwargs):
+        context = self._browser.new_context(**kwargs)
+        self._contexts.append(context)
+        return context
+
+    def new_page(self, **kwargs):
+        return self.new_context(**kwargs).new_page()
+
+    def close(self, **kwargs):
+        for context in self._contexts:
+            try:
+                context.close()
+            except Exception:
+                pass
+        self._contexts = []
+
+    def __getattr__(self, name):
+        return getattr(self._browser, name)
+
+
+class PooledBrowserType:
+    """注入给录制脚本的 chromium，launch() 连接池中的浏览器"""
+
+    def __init__(self, browser_type, cdp_endpoint):
+        self._browser_type = browser_type
+        self._cdp_endpoint = cdp_endpoint
+        self._browser = None
+
+    def launch(self, **kwargs):
+        if self._browser is None:
+            self._browser = self._browser_type.connect_over_cdp(self._cdp_endpoint)
+        return PooledBrowser(self._browser)
+
+    def __getattr__(self, name):
+        return getattr(self._browser_type, name)
+
+
+class PooledPlaywright:
+    """注入给录制脚本的 playwright 对象"""
+
+    def __init__(self, playwright, cdp_endpoint):
+        self._playwright = playwright
+        self.chromium = PooledBrowserType(playwright.chromium, cdp_endpoint)
+
+    def __getattr__(self, name):
+        return getattr(self._playwright, name)
+
+
+def _is_entry_block(node):
+    """判断是否为录制脚本末尾的 with sync_playwright() / if __name__ 入口代码"""
+    if isinstance(node, ast.With):
+        return any(
+            isinstance(item.context_expr, ast.Call)
+            and getattr(item.context_expr.func, "id", None) == "sync_playwright"
+            for item in node.items
+        )
+    if isinstance(node, ast.If):
+        test = node.test
+        return (
+            isinstance(test, ast.Compare)
+            and getattr(test.left, "id", None) == "__name__"
+        )
+    return False
+
+
+def _run_body(tree):
+    return next((node.body for node in tree.body if isinstance(node, ast.FunctionDef) and node.name == "run"), None)
+
+
+def _call_method(node):
+    """语句中调用的方法名，例如 page = context.new_page() 返回 new_page"""
+    value = node.value if isinstance(node, (ast.Assign, ast.Expr)) else None
+    if isinstance(value, ast.Call) and isinstance(value.func, ast.Attribute):
+        return value.func.attr
+    return None
+
+
+def _is_teardown(node):
+    """context.close() / browser.close() 等清理语句"""
+    return (
+        isinstance(node, ast.Expr)
+        and _call_method(node) == "close"
+        and getattr(node.value.func.value, "id", None) in ("context", "browser")
+    )
+
+
+def skip_setup_statements(tree, setup_tree, resume_url):
+    """run() 以 setup 脚本的全部语句开头时，去掉其中的登录语句，改为打开登录后的页面
+
+    浏览器、上下文和页面的创建语句保留。只匹配到部分语句时不做改动，返回是否修改了脚本。
+    """
+    body, setup_body = _run_body(tree), _run_body(setup_tree)
+    if body is None or setup_body is None or not resume_url:
+        return False
+    while setup_body and _is_teardown(setup_body[-1]):
+        setup_body = setup_body[:-1]
+    if len(body) <= len(setup_body) or any(ast.dump(a) != ast.dump(b) for a, b in zip(body, setup_body)):
+        return False
+    kept = [node for node in body[:len(setup_body)] if isinstance(node, ast.Assign) and _call_method(node) in CREATION_METHODS]
+    if len(kept) == len(setup_body):
+        return False
+    page = next(
+        (node.targets[0].id for node in reversed(kept)
+         if _call_method(node) == "new_page" and isinstance(node.targets[0], ast.Name)),
+        "page"
+    )
+    resume = ast.parse(f"{page}.goto({resume_url!r})").body[0]
+    body[:] = kept + [resume] + body[len(setup_body):]
+    ast.fix_missing_locations(tree)
+    return True
+
+
+def load_script(script_path, module_name="recorded_script", setup_script=None, resume_url=None):
+    """以模块方式加载录制脚本，去掉入口代码，只保留 run 等定义"""
+    with open(script_path, "r", encoding="utf-8") as f:
+        tree = ast.parse(f.read(), filename=script_path)
+    tree.body = [node for node in tree.body if not _is_entry_block(node)]
+    if setup_script:
+        with open(setup_script, "r", encoding="utf-8") as f:
+            setup_tree = ast.parse(f.read(), filename=setup_script)
+        if skip_setup_statements(tree, setup_tree, resume_url):
+            print(f"已使用缓存的登录状态，跳过登录步骤，打开: {resume_url}")
+
+    spec = importlib.util.spec_from_loader(module_name, loader=None, origin=script_path)
+    module = importlib.util.module_from_spec(spec)
+    module.__file__ = script_path
+    exec(compile(tree, script_path, "exec"), module.__dict__)
+    if not callable(getattr(module, "run", None)):
+        raise Exception("测试脚本中缺少 run(playwright) 函数")
+    return module
+
+
+class Instrumentation:
+    """记录各阶段的耗时，负责开启和保存 tracing，以及从 HAR 回放网络请求"""
+
+    def __init__(self, trace_path=None, har_path=None, har_not_found="abort", storage_state=None,
+                 storage_state_out=None, profile=None):
+        self.origin = float(os.environ.get("AUTOTEST_SPAWN_TIME") or _STARTED)
+        self.phases = []
+        self.trace_path = trace_path
+        self.traced_context = None
+        self.har_path = har_path
+        self.har_not_found = har_not_found
+        self.storage_state = storage_state
+        self.storage_state_out = storage_state_out
+        self.state_context = None
+        self.profile = profile
+
+    def record(self, name, category, started, error=False):
+        phase = {
+            "name": name,
+            "category": category,
+            "start": round(started - self.origin, 4),
+            "duration": round(time.time() - started, 4)
+        }
+        if error:
+            phase["error"] = True
+        self.phases.append(phase)
+
+    @contextmanager
+    def phase(self, name, category=None):
+        started = time.time()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record(name, category or name, started, error)
+
+    def route_from_har(self, target):
+        """让上下文或页面从 HAR 返回网络响应"""
+        if self.har_path:
+            target.route_from_har(self.har_path, not_found=self.har_not_found)
+
+    def apply_profile(self, target):
+        """按执行配置屏蔽请求并关闭动画，在 route_from_har 之后注册，未屏蔽的请求交给 HAR 回放处理"""
+        profile = self.profile
+        if not profile:
+            return
+        if profile["block_resource_types"] or profile["block_url_patterns"]:
+            def handle(route):
+                request = route.request
+                if request.resource_type in profile["block_resource_types"] or any(
+                    fnmatchcase(request.url, pattern) for pattern in profile["block_url_patterns"]
+                ):
+                    route.abort("blockedbyclient")
+                else:
+                    route.fallback()
+            target.route("**/*", handle)
+        if profile["disable_animations"]:
+            target.add_init_script(script=DISABLE_ANIMATIONS_SCRIPT)
+
+    def prepare_kwargs(self, kwargs):
+        """创建上下文或页面时注入缓存的登录状态，执行配置关闭动画时同时减少动态效果"""
+        if self.storage_state and "storage_state" not in kwargs:
+            kwargs["storage_state"] = self.storage_state
+        if self.profile and self.profile["disable_animations"] and "reduced_motion" not in kwargs:
+            kwargs["reduced_motion"] = "reduce"
+        return kwargs
+
+    def watch_state(self, context):
+        if self.storage_state_out and self.state_context is None:
+            self.state_context = context
+
+    def save_state(self):
+        """保存第一个上下文的登录状态和当前页面地址，只保存一次"""
+        if self.state_context is not None:
+            context, self.state_context = self.state_context, None
+            try:
+                pages = context.pages
+                state = {"storage_state": context.storage_state(), "url": pages[-1].url if pages else None}
+                with open(self.storage_state_out, "w", encoding="utf-8") as f:
+                    json.dump(state, f)
+            except Exception as e:
+                print(f"保存登录状态失败: {e}", file=sys.stderr)
+
+    def start_tracing(self, context):
+        if self.trace_path and self.traced_context is None:
+            context.tracing.start(screenshots=True, snapshots=True)
+            self.traced_context = context
+
+    def stop_tracing(self):
+        if self.traced_context is not None:
+            context, self.traced_context = self.traced_context, None
+            try:
+                context.tracing.stop(path=self.trace_path)
+            except Exception as e:
+                print(f"保存 trace 失败: {e}", file=sys.stderr)
+
+    def save(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.phases, f)
+
+
+def _unwrap(value):
+    return value._target if isinstance(value, Instrumented) else value
+
+
+def _category(type_name, method):
+    if method in ("launch", "connect_over_cdp"):
+        return "browser_launch"
+    if method == "new_context":
+        return "context_creation"
+    if method == "new_page":
+        return "page_creation"
+    if method == "close" and type_name in TEARDOWN_TYPES:
+        return "teardown"
+    if type_name.endswith("Assertions"):
+        return "assertion"
+    if method in NAVIGATION_METHODS:
+        return "navigation"
+    if method.startswith("wait_for"):
+        return "wait"
+    return "action"
+
+
+class Instrumented:
+    """包装 playwright 对象，记录每次方法调用的耗时，返回的对象同样被包装"""
+
+    def __init__(self, target, instrumentation):
+        object.__setattr__(self, "_target", target)
+        object.__setattr__(self, "_instrumentation", instrumentation)
+
+    def _wrap(self, value):
+        if isinstance(value, PRIMITIVE_TYPES) or isinstance(value, Instrumented):
+            return value
+        return Instrumented(value, self._instrumentation)
+
+    def __getattr__(self, name):
+        attr = getattr(self._target, name)
+        if not callable(attr) or isinstance(attr, type):
+            return self._wrap(attr)
+
+        type_name = type(self._target).__name__
+        instrumentation = self._instrumentation
+
+        def call(*args, **kwargs):
+            args = [_unwrap(arg) for arg in args]
+            kwargs = {key: _unwrap(value) for key, value in kwargs.items()}
+            if name == "close" and _unwrap(self) is instrumentation.traced_context:
+                instrumentation.stop_tracing()
+            if name == "close" and type_name in TEARDOWN_TYPES:
+                instrumentation.save_state()
+            if name == "new_context" or (name == "new_page" and type_name in BROWSER_TYPES):
+                kwargs = instrumentation.prepare_kwargs(kwargs)
+            started = time.time()
+            try:
+                result = attr(*args, **kwargs)
+            except BaseException:
+                instrumentation.record(f"{type_name}.{name}", _category(type_name, name), started, error=True)
+                raise
+            if type(result).__name__ not in BUILDER_TYPES and not name.startswith("expect_"):
+                instrumentation.record(f"{type_name}.{name}", _category(type_name, name), started)
+            if name == "new_context":
+                instrumentation.route_from_har(result)
+                instrumentation.apply_profile(result)
+                instrumentation.start_tracing(result)
+                instrumentation.watch_state(result)
+            elif name == "new_page" and type_name in BROWSER_TYPES:
+                # 不经过 new_context 直接创建的页面
+                instrumentation.route_from_har(result)
+                instrumentation.apply_profile(result)
+                instrumentation.watch_state(result.context)
+            return self._wrap(result)
+
+        return call
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, _unwrap(value))
+
+    def __enter__(self):
+        return self._wrap(self._target.__enter__())
+
+    def __exit__(self, *exc_info):
+        return self._target.__exit__(*exc_info)
+
+    def __iter__(self):
+        return (self._wrap(item) for item in self._target)
+
+    def __len__(self):
+        return len(self._target)
+
+    def __bool__(self):
+        return bool(self._target)
+
+    def __repr__(self):
+        return repr(self._target)
+
+
+def run_script(script_path, cdp_endpoint=None, timings_path=None, trace_path=None, har_path=None,
+               har_not_found="abort", storage_state=None, setup_script=None, resume_url=None,
+               storage_state_out=None, profile=None):
+    """执行录制脚本"""
+    instrumentation = Instrumentation(trace_path, har_path, har_not_found, storage_state, storage_state_out, profile)
+    instrumented = bool(timings_path or trace_path or har_path or storage_state or storage_state_out or profile)
+    instrumentation.record("interpreter_start", "interpreter_start", instrumentation.origin)
+    try:
+        with instrumentation.phase("script_load"):
+            module = load_script(
+                script_path, setup_script=setup_script if storage_state else None, resume_url=resume_url
+            )
+        if instrumented:
+            # 录制脚本中的 expect 断言同样需要记录耗时
+            module.expect = lambda actual, *args, **kwargs: Instrumented(
+                playwright_expect(_unwrap(actual), *args, **kwargs), instrumentation
+            )
+
+        started = time.time()
+        stop_started = None
+        try:
+            with sync_playwright() as playwright:
+                instrumentation.record("playwright_start", "playwright_start", started)
+                if cdp_endpoint:
+                    playwright = PooledPlaywright(playwright, cdp_endpoint)
+                if instrumented:
+                    playwright = Instrumented(playwright, instrumentation)
+                try:
+                    module.run(playwright)
+                finally:
+                    # 脚本没有关闭上下文时在这里保存 trace 和登录状态
+                    instrumentation.stop_tracing()
+                    instrumentation.save_state()
+                    stop_started = time.time()
+        finally:
+            if stop_started:
+                instrumentation.record("playwright_stop", "teardown", stop_started)
+    finally:
+        if timings_path:
+            instrumentation.save(timings_path)
+
+
+def run_from_env(script_path):
+    """按环境变量中的配置执行录制脚本"""
+    run_script(
+        script_path,
+        os.environ.get("AUTOTEST_CDP_ENDPOINT"),
+        os.environ.get("AUTOTEST_TIMINGS_FILE"),
+        os.environ.get("AUTOTEST_TRACE_FILE"),
+        os.environ.get("AUTOTEST_HAR_FILE"),
+        os.environ.get("AUTOTEST_HAR_NOT_FOUND", "abort"),
+        os.environ.get("AUTOTEST_STORAGE_STATE_FILE"),
+        os.environ.get("AUTOTEST_SETUP_SCRIPT"),
+        os.environ.get("AUTOTEST_RESUME_URL"),
+        os.environ.get("AUTOTEST_STORAGE_STATE_OUT"),
+        json.loads(os.environ.get("AUTOTEST_EXECUTION_PROFILE_JSON") or "null")
+    )
+
+
+def serve():
+    """常驻模式：依次执行标准输入中的请求，每次执行后恢复环境变量、工作目录和 sys.path"""
+    base_env = dict(os.environ)
+    base_cwd = os.getcwd()
+    base_path = list(sys.path)
+    for line in sys.stdin:
+        if not line.strip():
+            continue
+        returncode = 0
+        try:
+            request = json.loads(line)
+            os.environ.update(request.get("env") or {})
+            run_from_env(request["script_path"])
+        except SystemExit as e:
+            # 与脚本单独执行时的退出码一致
+            if isinstance(e.code, int) or e.code is None:
+                returncode = e.code or 0
+            else:
+                print(e.code, file=sys.stderr)
+                returncode = 1
+        except Exception:
+            traceback.print_exc()
+            returncode = 1
+        finally:
+            os.environ.clear()
+            os.environ.update(base_env)
+            os.chdir(base_cwd)
+            sys.path[:] = base_path
+        sys.stdout.flush()
+        sys.stderr.flush()
+        sys.stdout.write(f"{RUNNER_DONE_MARKER} {json.dumps({'returncode': returncode})}\n")
+        sys.stderr.write(f"{RUNNER_DONE_MARKER}\n")
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+
+def main():
+    if sys.argv[1:] == ["--serve"]:
+        serve()
+        return
+    if len(sys.argv) != 2:
+        print("用法: python script_runner.py <script_path> 或 python script_runner.py --serve", file=sys.stderr)
+        sys.exit(2)
+    run_from_env(sys.argv[1])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import os
+
+# 执行并发配置
+DEFAULT_CONCURRENCY = int(os.getenv("AUTOTEST_DEFAULT_CONCURRENCY", "1"))
+MAX_CONCURRENCY = int(os.getenv("AUTOTEST_MAX_CONCURRENCY", "16"))
+
+# 执行模式: subprocess 由脚本自行启动浏览器; pooled 在浏览器池的全新上下文中执行脚本;
+# native 不启动 Python 进程，在浏览器池的全新上下文中直接解释执行步骤 IR
+EXECUTION_MODES = ("subprocess", "pooled", "native")
+# native 模式下每个步骤的默认超时（毫秒）
+STEP_TIMEOUT_MS = int(os.getenv("AUTOTEST_STEP_TIMEOUT_MS", "30000"))
+
+# 截图策略: never 不截图; on_failure 仅失败步骤; every_n 每 N 个步骤及失败步骤; last_step 仅最后执行的步骤
+SCREENSHOT_POLICIES = ("never", "on_failure", "every_n", "last_step")
+# webp 和缩略图需要安装 Pillow
+SCREENSHOT_FORMATS = ("jpeg", "webp", "png")
+SCREENSHOT_QUALITY = int(os.getenv("AUTOTEST_SCREENSHOT_QUALITY", "70"))
+# 缩略图宽度（像素），0 表示不生成缩略图
+SCREENSHOT_THUMBNAIL_WIDTH = int(os.getenv("AUTOTEST_SCREENSHOT_THUMBNAIL_WIDTH", "0"))
+
+# HAR 回放: off 访问真实网络; offline 只从录制时保存的 HAR 返回响应，HAR 中没有的请求直接失败;
+# fallback 优先从 HAR 返回响应，HAR 中没有的请求访问真实网络
+HAR_MODES = ("off", "offline", "fallback")
+
+# 执行结果中内联保存的脚本输出上限（字符），超出部分只保留末尾，完整输出保存到项目的内容寻址存储中
+OUTPUT_INLINE_LIMIT = int(os.getenv("AUTOTEST_OUTPUT_INLINE_LIMIT", "8192"))
+
+# 实时执行日志：环形缓冲区保留的行数（供中途订阅的客户端回放），每个订阅者的队列上限，
+# 以及订阅者队列已满时推送的最长等待时间（秒），超时的订阅者被断开
+LOG_BUFFER_LINES = int(os.getenv("AUTOTEST_LOG_BUFFER_LINES", "1000"))
+LOG_SUBSCRIBER_QUEUE = int(os.getenv("AUTOTEST_LOG_SUBSCRIBER_QUEUE", "1000"))
+LOG_SUBSCRIBER_TIMEOUT = float(os.getenv("AUTOTEST_LOG_SUBSCRIBER_TIMEOUT", "1.0"))
+# 跟随其他进程（worker）写入的日志文件时，文件超过多少秒没有变化视为执行已结束
+LOG_FOLLOW_IDLE_TIMEOUT = float(os.getenv("AUTOTEST_LOG_FOLLOW_IDLE_TIMEOUT", "600"))
+
+# 浏览器池配置
+BROWSER_POOL_SIZE = int(os.getenv("AUTOTEST_BROWSER_POOL_SIZE", "2"))
+# 每个浏览器创建多少个上下文后重启，避免长期运行的浏览器占用过多内存
+BROWSER_MAX_CONTEXTS = int(os.getenv("AUTOTEST_BROWSER_MAX_CONTEXTS", "50"))
+BROWSER_HEADLESS = os.getenv("AUTOTEST_BROWSER_HEADLESS", "true").lower() == "true"
+
+# 脚本运行进程池：预先启动并导入 Playwright 的 script_runner 进程数，0 表示每个用例启动新的进程；
+# 每个运行进程执行多少个用例后被替换，避免长期运行积累的内存泄漏
+RUNNER_POOL_SIZE = int(os.getenv("AUTOTEST_RUNNER_POOL_SIZE", "2"))
+RUNNER_MAX_RUNS = int(os.getenv("AUTOTEST_RUNNER_MAX_RUNS", "50"))
+
+# 后台任务配置
+MAX_RUNNING_JOBS = int(os.getenv("AUTOTEST_MAX_RUNNING_JOBS", "4"))
+JOB_HISTORY_LIMIT = int(os.getenv("AUTOTEST_JOB_HISTORY_LIMIT", "200"))
+
+# 执行后端: local 在API进程内执行; queue 提交到持久化任务队列，由 worker.py 进程执行
+EXECUTION_BACKEND = os.getenv("AUTOTEST_EXECUTION_BACKEND", "local")
+TASK_QUEUE_PATH = os.getenv("AUTOTEST_TASK_QUEUE_PATH", "projects/.autotest/task_queue.db")
+# worker 领取任务的租约时长（秒），worker 异常退出后任务在租约过期后重新入队
+TASK_LEASE_SECONDS = int(os.getenv("AUTOTEST_TASK_LEASE_SECONDS", "60"))
+# 连续多少秒没有存活的 worker 时，等待中的任务判定为失败
+TASK_CLAIM_TIMEOUT = int(os.getenv("AUTOTEST_TASK_CLAIM_TIMEOUT", "60"))
+# API 进程等待单个任务结果的最长时间（秒），包括排队时间，0 表示不限制
+TASK_WAIT_TIMEOUT = int(os.getenv("AUTOTEST_TASK_WAIT_TIMEOUT", "3600"))
+
+# 项目执行的用例顺序: history 按历史记录排序，最近失败的用例优先，其余按历史耗时从长到短;
+# name 按用例编号排序
+SCHEDULE_ORDERS = ("history", "name")
+SCHEDULE_ORDER = os.getenv("AUTOTEST_SCHEDULE_ORDER", "history")
+
+# 用例失败后自动重试的次数，重试时复用浏览器池中的常驻浏览器；重试后通过的用例标记为不稳定
+RETRIES = int(os.getenv("AUTOTEST_RETRIES", "0"))
+MAX_RETRIES = int(os.getenv("AUTOTEST_MAX_RETRIES", "5"))
+
+# 项目执行的时间上限（秒），超过后中止正在执行的用例并跳过剩余用例，0 表示不限制
+RUN_TIMEOUT = int(os.getenv("AUTOTEST_RUN_TIMEOUT", "0"))
+# 中止执行时等待脚本进程退出的时间（秒），超过后强制结束脚本进程及其启动的浏览器
+PROCESS_KILL_GRACE = float(os.getenv("AUTOTEST_PROCESS_KILL_GRACE", "5"))
+
+# 录制会话配置：同时进行的录制会话数上限，录制脚本超过空闲时长（秒）没有变化或会话超过最长时长（秒）后结束录制
+MAX_RECORDING_SESSIONS = int(os.getenv("AUTOTEST_MAX_RECORDING_SESSIONS", "4"))
+RECORDING_IDLE_TIMEOUT = int(os.getenv("AUTOTEST_RECORDING_IDLE_TIMEOUT", "900"))
+RECORDING_MAX_DURATION = int(os.getenv("AUTOTEST_RECORDING_MAX_DURATION", "3600"))
+# 每个录制会话的 codegen 进程及其启动的浏览器进程的资源上限，分别对每个进程生效，0 表示不限制：
+# 虚拟内存（MB，Chromium 会预留大量虚拟地址空间，需要设置为数 GB 以上）、CPU 时间（秒）、
+# 写入的单个文件大小（MB，包括录制脚本和 HAR 文件）和打开的文件数
+RECORDING_MEMORY_MB = int(os.getenv("AUTOTEST_RECORDING_MEMORY_MB", "0"))
+RECORDING_CPU_SECONDS = int(os.getenv("AUTOTEST_RECORDING_CPU_SECONDS", "3600"))
+RECORDING_FILE_SIZE_MB = int(os.getenv("AUTOTEST_RECORDING_FILE_SIZE_MB", "1024"))
+RECORDING_OPEN_FILES = int(os.getenv("AUTOTEST_RECORDING_OPEN_FILES", "4096"))
+
+# 执行记录按天分段保存，超过保留天数的分段被删除
+RUN_RETENTION_DAYS = int(os.getenv("AUTOTEST_RUN_RETENTION_DAYS", "30"))
+# 后台整理执行记录的间隔（秒）
+RUN_COMPACT_INTERVAL = int(os.getenv("AUTOTEST_RUN_COMPACT_INTERVAL", "3600"))
+
+# 统计滑动窗口：用例和项目分别按最近多少次执行计算通过率、耗时百分位和稳定性
+STATS_WINDOW = int(os.getenv("AUTOTEST_STATS_WINDOW", "50"))
+PROJECT_STATS_WINDOW = int(os.getenv("AUTOTEST_PROJECT_STATS_WINDOW", "500"))
+
+# 执行选项默认值，可被项目配置和请求参数覆盖
+EXECUTION_DEFAULTS = {
+    "execution_mode": os.getenv("AUTOTEST_EXECUTION_MODE", "subprocess"),
+    "screenshot_policy": os.getenv("AUTOTEST_SCREENSHOT_POLICY", "on_failure"),
+    "screenshot_every": int(os.getenv("AUTOTEST_SCREENSHOT_EVERY", "5")),
+    "screenshot_format": os.getenv("AUTOTEST_SCREENSHOT_FORMAT", "jpeg"),
+    # 是否记录 Playwright trace，trace 文件保存到项目的内容寻址存储中
+    "trace": os.getenv("AUTOTEST_TRACE", "false").lower() == "true",
+    # 用例录制时保存了 HAR 才生效
+    "har_mode": os.getenv("AUTOTEST_HAR_MODE", "off"),
+    # 项目的 setup 用例（通常为登录），其执行后的登录状态被缓存并注入其他用例的浏览器上下文
+    "setup_case_id": None,
+    # 登录状态缓存的有效期（秒），过期后重新执行 setup 用例
+    "storage_state_ttl": int(os.getenv("AUTOTEST_STORAGE_STATE_TTL", "3600")),
+    # 执行配置名称，对应项目 execution_profiles.json 中的配置，用于屏蔽图片、字体、统计脚本等请求和关闭动画
+    "execution_profile": os.getenv("AUTOTEST_EXECUTION_PROFILE") or None,
+    # 单个用例的执行时间上限（秒），包括执行 setup 用例的时间，超过后结束脚本进程树，0 表示不限制
+    "case_timeout": int(os.getenv("AUTOTEST_CASE_TIMEOUT", "600")),
+}
+
+
+def resolve_concurrency(requested=None, project_info=None):
+    """按 请求参数 > 项目配置 > 全局默认 的顺序确定并发数"""
+    concurrency = requested
+    if concurrency is None and project_info:
+        concurrency = project_info.get("concurrency")
+    if concurrency is None:
+        concurrency = DEFAULT_CONCURRENCY
+    return max(1, min(int(concurrency), MAX_CONCURRENCY))
+
+
+def resolve_retries(requested=None):
+    """确定失败用例的自动重试次数，请求参数优先于全局默认"""
+    retries = RETRIES if requested is None else requested
+    return max(0, min(int(retries), MAX_RETRIES))
+
+
+def resolve_run_timeout(requested=None):
+    """确定项目执行的时间上限（秒），请求参数优先于全局默认，返回 None 表示不限制"""
+    timeout = RUN_TIMEOUT if requested is None else requested
+    if float(timeout) < 0:
+        raise ValueError("项目执行时间上限不能小于 0")
+    return float(timeout) or None
+
+
+def resolve_execution_options(project_info=None, **overrides):
+    """按 请求参数 > 项目配置 > 全局默认 的顺序确定执行选项"""
+    options = {}
+    for key, default in EXECUTION_DEFAULTS.items():
+        value = overrides.get(key)
+        if value is None and project_info:
+            value = project_info.get(key)
+        options[key] = default if value is None else value
+
+    if options["execution_mode"] not in EXECUTION_MODES:
+        raise ValueError(f"不支持的执行模式: {options['execution_mode']}")
+    if options["screenshot_policy"] not in SCREENSHOT_POLICIES:
+        raise ValueError(f"不支持的截图策略: {options['screenshot_policy']}")
+    if options["screenshot_format"] not in SCREENSHOT_FORMATS:
+        raise ValueError(f"不支持的截图格式: {options['screenshot_format']}")
+    if options["har_mode"] not in HAR_MODES:
+        raise ValueError(f"不支持的 HAR 回放模式: {options['har_mode']}")
+    if int(options["storage_state_ttl"]) < 0:
+        raise ValueError("登录状态有效期不能小于 0")
+    if int(options["screenshot_every"]) < 1:
+        raise ValueError("截图间隔必须大于 0")
+    if float(options["case_timeout"]) < 0:
+        raise ValueError("用例执行时间上限不能小于 0")
+    return options
+
+
+def resolve_schedule(order=None, max_failures=None):
+    """确定项目执行的用例顺序和失败上限，max_failures 为空或 0 表示不限制"""
+    order = order or SCHEDULE_ORDER
+    if order not in SCHEDULE_ORDERS:
+        raise ValueError(f"不支持的执行顺序: {order}")
+    if max_failures is not None and int(max_failures) < 0:
+        raise ValueError("失败上限不能小于 0")
+    return order, int(max_failures) if max_failures else None
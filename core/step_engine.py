@@ -0,0 +1,166 @@
+from playwright.async_api import expect
+from loguru import logger
+from datetime import datetime
+import asyncio
+import inspect
+import re
+import time
+from core.screenshot import last_capture_index
+from core.script_parser import EXPECT_EVENTS
+from core.timings import step_category
+
+# 事件名到 page.expect_xxx 方法名的映射
+EXPECT_METHODS = {event: method for method, event in EXPECT_EVENTS.items()}
+
+
+class StepError(Exception):
+    """步骤无法执行"""
+
+
+class StepEngine:
+    """在浏览器上下文中直接解释执行步骤 IR，无需启动 Python 解释器或导入录制脚本"""
+
+    def __init__(self, context, screenshots=None, timings=None, log=None):
+        self.context = context
+        self.screenshots = screenshots
+        self.timings = timings
+        self.log = log
+        self.pages = {}
+        self.event_infos = {}
+
+    async def _page(self, name):
+        """获取步骤所在的页面，录制脚本中未显式创建时按需创建"""
+        if name not in self.pages:
+            self.pages[name] = await self.context.new_page()
+        return self.pages[name]
+
+    def _value(self, value):
+        """还原解析器序列化的参数值"""
+        if isinstance(value, dict) and "regex" in value:
+            return re.compile(value["regex"])
+        if isinstance(value, dict) and "expr" in value:
+            raise StepError(f"不支持的参数表达式: {value['expr']}")
+        return value
+
+    def _args(self, item):
+        args = [self._value(arg) for arg in item.get("args") or []]
+        kwargs = {key: self._value(value) for key, value in (item.get("kwargs") or {}).items()}
+        return args, kwargs
+
+    def _locate(self, page, locator):
+        """按定位器调用链从页面构造 Locator"""
+        target = page
+        for segment in locator or []:
+            attr = getattr(target, segment["method"])
+            if "args" in segment or "kwargs" in segment:
+                args, kwargs = self._args(segment)
+                target = attr(*args, **kwargs)
+            elif inspect.ismethod(attr):
+                target = attr()
+            else:
+                # first / last / content_frame 等属性
+                target = attr
+        return target
+
+    async def _run_step(self, step):
+        step_type = step["type"]
+
+        if step_type == "new_page":
+            self.pages[step["name"]] = await self.context.new_page()
+            return
+        if step_type == "assign_event_value":
+            info = self.event_infos.get(step["alias"])
+            if info is None:
+                raise StepError(f"未找到事件: {step['alias']}")
+            value = await info.value
+            self.pages[step["name"]] = value
+            return
+        if step_type == "unsupported":
+            raise StepError(f"不支持的脚本语句: {step['code']}")
+
+        page = await self._page(step["page"])
+
+        if step_type == "expect_event":
+            method = getattr(page, EXPECT_METHODS[step["event"]])
+            args, kwargs = self._args(step)
+            async with method(*args, **kwargs) as info:
+                for nested in step.get("steps", []):
+                    await self._run_step(nested)
+            if step.get("alias"):
+                self.event_infos[step["alias"]] = info
+            return
+        if step_type == "dialog":
+            action = step.get("action", "dismiss")
+
+            def handle(dialog):
+                asyncio.ensure_future(getattr(dialog, action)())
+
+            (page.once if step.get("once") else page.on)("dialog", handle)
+            return
+
+        args, kwargs = self._args(step)
+        if step_type == "expect":
+            target = self._locate(page, step.get("locator"))
+            await getattr(expect(target), step["assertion"])(*args, **kwargs)
+            return
+        if "." in step_type:
+            # keyboard.press / mouse.click
+            device, method = step_type.split(".", 1)
+            await getattr(getattr(page, device), method)(*args, **kwargs)
+            return
+
+        target = self._locate(page, step.get("locator"))
+        method = getattr(target, step_type, None)
+        if method is None:
+            raise StepError(f"不支持的操作: {step_type}")
+        await method(*args, **kwargs)
+
+    async def _capture(self, page_name, result):
+        """按截图策略保存截图，结果中只记录截图引用"""
+        page = self.pages.get(page_name)
+        if not page or page.is_closed():
+            return
+        try:
+            result["screenshot"], thumbnail = await self.screenshots.capture(page)
+            if thumbnail:
+                result["thumbnail"] = thumbnail
+        except Exception as e:
+            logger.warning(f"截图失败: {str(e)}")
+
+    async def run(self, steps):
+        """依次执行所有步骤，遇到失败后跳过剩余步骤，返回每个步骤的状态和耗时"""
+        results = []
+        failed = False
+        last_index = last_capture_index(steps)
+        for index, step in enumerate(steps):
+            if failed:
+                results.append({
+                    "step": step,
+                    "result": {"status": "skipped", "timestamp": datetime.now().isoformat(), "duration": 0}
+                })
+                continue
+
+            started_at = datetime.now().isoformat()
+            started = time.monotonic()
+            result = {"status": "success", "timestamp": started_at}
+            try:
+                await self._run_step(step)
+                logger.debug(f"步骤执行成功: {step['type']}")
+            except Exception as e:
+                logger.error(f"步骤执行失败: {step['type']}, {str(e)}")
+                result["status"] = "failed"
+                result["error"] = str(e)
+                failed = True
+            result["duration"] = round(time.monotonic() - started, 3)
+            if self.timings:
+                self.timings.record(step["type"], step_category(step["type"]), started, error=failed)
+            if self.log:
+                line = f"步骤 {index + 1}/{len(steps)}: {step['type']} {result['status']} ({result['duration']}s)"
+                await self.log.publish(line + (f" {result['error']}" if failed else ""), "step")
+
+            # 捕获截图
+            page_name = step.get("page") or step.get("name")
+            if self.screenshots and page_name and self.screenshots.should_capture(index, last_index, failed):
+                await self._capture(page_name, result)
+            results.append({"step": step, "result": result})
+        return results
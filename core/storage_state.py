@@ -0,0 +1,101 @@
+from loguru import logger
+from datetime import datetime
+import json
+import os
+import time
+import uuid
+
+
+def _same_step(a, b):
+    """比较两个步骤，忽略所在行号"""
+    return {k: v for k, v in a.items() if k != "line"} == {k: v for k, v in b.items() if k != "line"}
+
+
+def skip_setup_steps(steps, setup_steps, resume_url):
+    """用例以 setup 用例的全部步骤开头时，去掉这些登录步骤
+
+    保留页面创建步骤，并跳转到 setup 用例结束时所在的页面，之后的步骤从该页面继续执行。
+    只匹配到部分步骤时不做改动，避免改变用例的语义。
+    """
+    actions = [step for step in setup_steps if step["type"] != "new_page"]
+    if not actions or not resume_url or len(steps) <= len(setup_steps):
+        return steps
+    if not all(_same_step(step, setup) for step, setup in zip(steps, setup_steps)):
+        return steps
+    kept = [step for step in steps[:len(setup_steps)] if step["type"] == "new_page"]
+    resume = {
+        "type": "goto",
+        "page": actions[0].get("page") or "page",
+        "locator": None,
+        "selector": None,
+        "args": [resume_url],
+        "kwargs": {},
+        "url": resume_url
+    }
+    return kept + [resume] + steps[len(setup_steps):]
+
+
+class StorageStateCache:
+    """项目级登录状态缓存
+
+    执行项目配置的 setup 用例后保存浏览器的 storage state（cookies 和 localStorage）以及结束时的页面地址，
+    保存在 projects/<项目ID>/.autotest/ 下。缓存超过有效期、setup 用例变更或脚本被修改后重新生成。
+    """
+
+    def __init__(self, base_path="projects"):
+        self.base_path = base_path
+
+    def _dir(self, project_id):
+        return os.path.join(self.base_path, project_id, ".autotest")
+
+    def path(self, project_id):
+        return os.path.join(self._dir(project_id), "storage_state.json")
+
+    def _meta_path(self, project_id):
+        return os.path.join(self._dir(project_id), "storage_state_meta.json")
+
+    def _script_mtime(self, project_id, setup_case_id):
+        try:
+            return os.stat(os.path.join(self.base_path, project_id, "results", f"{setup_case_id}.py")).st_mtime_ns
+        except OSError:
+            return None
+
+    def get(self, project_id, setup_case_id, ttl):
+        """返回仍然有效的缓存信息 {path, url, created_at}，没有有效缓存时返回 None"""
+        try:
+            with open(self._meta_path(project_id), "r", encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if (
+            meta.get("setup_case_id") != setup_case_id
+            or meta.get("script_mtime") != self._script_mtime(project_id, setup_case_id)
+            or time.time() - meta.get("saved_at", 0) > ttl
+            or not os.path.exists(self.path(project_id))
+        ):
+            return None
+        return {"path": os.path.abspath(self.path(project_id)), "url": meta.get("url"), "created_at": meta.get("created_at")}
+
+    def save(self, project_id, setup_case_id, storage_state, url):
+        """保存 setup 用例执行后的 storage state 和页面地址"""
+        os.makedirs(self._dir(project_id), exist_ok=True)
+        meta = {
+            "setup_case_id": setup_case_id,
+            "script_mtime": self._script_mtime(project_id, setup_case_id),
+            "url": url,
+            "saved_at": time.time(),
+            "created_at": datetime.now().isoformat()
+        }
+        for path, data in ((self.path(project_id), storage_state), (self._meta_path(project_id), meta)):
+            tmp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(data, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        logger.info(f"登录状态已缓存: {project_id}, setup 用例: {setup_case_id}")
+        return self.get(project_id, setup_case_id, float("inf"))
+
+    def invalidate(self, project_id):
+        """删除项目的登录状态缓存"""
+        for path in (self.path(project_id), self._meta_path(project_id)):
+            if os.path.exists(path):
+                os.remove(path)
@@ -0,0 +1,264 @@
+from loguru import logger
+from contextlib import contextmanager
+from datetime import datetime
+import asyncio
+import json
+import os
+import sqlite3
+import time
+import uuid
+
+
+class TaskQueue:
+    """基于 SQLite 的持久化任务队列
+
+    API 进程提交测试用例执行任务，worker 进程领取任务并写回结果。领取的任务带有租约，
+    worker 异常退出后任务会被重新放回队列。SQLite 依赖文件锁保证领取任务的原子性，
+    数据库文件必须位于本地磁盘，不能放在 NFS/SMB 等网络文件系统上。
+    """
+
+    def __init__(self, db_path="projects/.autotest/task_queue.db", max_attempts=3):
+        self.db_path = db_path
+        self.max_attempts = max_attempts
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        with self._connect() as conn:
+            # WAL 依赖共享内存文件，多个进程跨主机访问时会损坏数据库，使用回滚日志并以 BEGIN IMMEDIATE 领取任务
+            conn.execute("PRAGMA journal_mode=DELETE")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS tasks (
+                    task_id TEXT PRIMARY KEY,
+                    project_id TEXT NOT NULL,
+                    test_case_id TEXT NOT NULL,
+                    options TEXT,
+                    status TEXT NOT NULL,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    worker_id TEXT,
+                    lease_until REAL,
+                    result TEXT,
+                    created_at TEXT NOT NULL,
+                    started_at TEXT,
+                    finished_at TEXT,
+                    run_id TEXT
+                )
+            """)
+            # 旧版队列没有 run_id 列
+            if "run_id" not in {row["name"] for row in conn.execute("PRAGMA table_info(tasks)")}:
+                conn.execute("ALTER TABLE tasks ADD COLUMN run_id TEXT")
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_tasks_status ON tasks (status, created_at)")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS workers (
+                    worker_id TEXT PRIMARY KEY,
+                    seen_at REAL NOT NULL
+                )
+            """)
+
+    @contextmanager
+    def _connect(self):
+        """打开自动提交模式的连接，使用完毕后关闭"""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _to_dict(self, row):
+        if not row:
+            return None
+        task = dict(row)
+        task["options"] = json.loads(task["options"]) if task["options"] else None
+        task["result"] = json.loads(task["result"]) if task["result"] else None
+        return task
+
+    def enqueue(self, project_id, test_case_id, options=None, run_id=None):
+        """提交任务，返回任务ID；run_id 为 worker 执行时使用的执行记录ID，提交时即可用于订阅执行日志"""
+        task_id = uuid.uuid4().hex
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO tasks (task_id, project_id, test_case_id, options, status, created_at, run_id) VALUES (?, ?, ?, ?, 'pending', ?, ?)",
+                (task_id, project_id, test_case_id, json.dumps(options, ensure_ascii=False), datetime.now().isoformat(), run_id)
+            )
+        return task_id
+
+    def claim(self, worker_id, lease_seconds=60):
+        """原子地领取最早提交的待执行任务，没有任务时返回 None"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT * FROM tasks WHERE status = 'pending' ORDER BY created_at LIMIT 1"
+            ).fetchone()
+            if row:
+                conn.execute(
+                    "UPDATE tasks SET status = 'running', worker_id = ?, lease_until = ?, attempts = attempts + 1, started_at = ? WHERE task_id = ?",
+                    (worker_id, time.time() + lease_seconds, datetime.now().isoformat(), row["task_id"])
+                )
+            conn.execute("COMMIT")
+        if not row:
+            return None
+        task = self._to_dict(row)
+        task["attempts"] += 1
+        return task
+
+    def heartbeat(self, task_id, worker_id, lease_seconds=60):
+        """延长任务租约，任务已被取消或不再由该 worker 执行时返回 False"""
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE tasks SET lease_until = ? WHERE task_id = ? AND worker_id = ? AND status = 'running'",
+                (time.time() + lease_seconds, task_id, worker_id)
+            ).rowcount > 0
+
+    def complete(self, task_id, result):
+        """写回任务结果，已取消或已被判定失败的任务不再写回"""
+        with self._connect() as conn:
+            conn.execute(
+                "UPDATE tasks SET status = 'done', result = ?, lease_until = NULL, finished_at = ? WHERE task_id = ? AND status IN ('pending', 'running')",
+                (json.dumps(result, ensure_ascii=False), datetime.now().isoformat(), task_id)
+            )
+
+    def cancel(self, task_id):
+        """取消尚未结束的任务：待执行的任务不再被领取，执行中的任务由 worker 在下次续约时中止"""
+        with self._connect() as conn:
+            return conn.execute(
+                "UPDATE tasks SET status = 'cancelled', lease_until = NULL, finished_at = ? WHERE task_id = ? AND status IN ('pending', 'running')",
+                (datetime.now().isoformat(), task_id)
+            ).rowcount > 0
+
+    def fail(self, task_id, message):
+        """将尚未结束的任务标记为执行失败并写回错误结果，执行中的任务由 worker 在下次续约时中止"""
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            row = conn.execute(
+                "SELECT test_case_id FROM tasks WHERE task_id = ? AND status IN ('pending', 'running')", (task_id,)
+            ).fetchone()
+            if row:
+                result = {
+                    "status": "error",
+                    "test_case_id": row["test_case_id"],
+                    "execution_time": datetime.now().isoformat(),
+                    "message": message
+                }
+                conn.execute(
+                    "UPDATE tasks SET status = 'done', result = ?, lease_until = NULL, finished_at = ? WHERE task_id = ?",
+                    (json.dumps(result, ensure_ascii=False), datetime.now().isoformat(), task_id)
+                )
+            conn.execute("COMMIT")
+        if row:
+            logger.warning(f"任务 {task_id} 执行失败: {message}")
+        return row is not None
+
+    def worker_heartbeat(self, worker_id):
+        """记录 worker 仍在运行"""
+        with self._connect() as conn:
+            conn.execute(
+                "INSERT INTO workers (worker_id, seen_at) VALUES (?, ?) ON CONFLICT (worker_id) DO UPDATE SET seen_at = excluded.seen_at",
+                (worker_id, time.time())
+            )
+
+    def remove_worker(self, worker_id):
+        """worker 正常退出时移除其记录"""
+        with self._connect() as conn:
+            conn.execute("DELETE FROM workers WHERE worker_id = ?", (worker_id,))
+
+    def live_workers(self, within=60):
+        """最近 within 秒内上报过心跳的 worker 数"""
+        with self._connect() as conn:
+            return conn.execute(
+                "SELECT COUNT(*) FROM workers WHERE seen_at >= ?", (time.time() - within,)
+            ).fetchone()[0]
+
+    def requeue_expired(self):
+        """将租约过期的任务放回队列，超过最大尝试次数的标记为失败"""
+        now = time.time()
+        with self._connect() as conn:
+            conn.execute("BEGIN IMMEDIATE")
+            rows = conn.execute(
+                "SELECT task_id, test_case_id, attempts FROM tasks WHERE status = 'running' AND lease_until < ?",
+                (now,)
+            ).fetchall()
+            for row in rows:
+                if row["attempts"] >= self.max_attempts:
+                    result = {
+                        "status": "error",
+                        "test_case_id": row["test_case_id"],
+                        "execution_time": datetime.now().isoformat(),
+                        "message": "执行节点多次异常退出，任务已放弃"
+                    }
+                    conn.execute(
+                        "UPDATE tasks SET status = 'done', result = ?, finished_at = ? WHERE task_id = ?",
+                        (json.dumps(result, ensure_ascii=False), datetime.now().isoformat(), row["task_id"])
+                    )
+                else:
+                    conn.execute(
+                        "UPDATE tasks SET status = 'pending', worker_id = NULL, lease_until = NULL WHERE task_id = ?",
+                        (row["task_id"],)
+                    )
+            conn.execute("COMMIT")
+        if rows:
+            logger.warning(f"已回收 {len(rows)} 个租约过期的任务")
+        return len(rows)
+
+    def purge(self, max_age_seconds=86400):
+        """删除已结束较久的任务记录和长时间没有心跳的 worker"""
+        cutoff = datetime.fromtimestamp(time.time() - max_age_seconds).isoformat()
+        with self._connect() as conn:
+            conn.execute("DELETE FROM workers WHERE seen_at < ?", (time.time() - max_age_seconds,))
+            return conn.execute(
+                "DELETE FROM tasks WHERE status IN ('done', 'cancelled') AND finished_at < ?", (cutoff,)
+            ).rowcount
+
+    def get(self, task_id):
+        with self._connect() as conn:
+            return self._to_dict(conn.execute("SELECT * FROM tasks WHERE task_id = ?", (task_id,)).fetchone())
+
+    def list_running(self, project_id):
+        """项目中正在由 worker 执行的任务"""
+        with self._connect() as conn:
+            rows = conn.execute(
+                "SELECT * FROM tasks WHERE project_id = ? AND status = 'running' ORDER BY started_at", (project_id,)
+            ).fetchall()
+        return [self._to_dict(row) for row in rows]
+
+    def depth(self):
+        """待执行的任务数"""
+        with self._connect() as conn:
+            return conn.execute("SELECT COUNT(*) FROM tasks WHERE status = 'pending'").fetchone()[0]
+
+    async def run(self, project_id, test_case_id, options=None, poll_interval=0.5,
+                  claim_timeout=60, worker_timeout=60, timeout=None, run_id=None):
+        """提交任务并等待 worker 写回结果，等待被取消时同时取消队列中的任务
+
+        连续 claim_timeout 秒没有 worker 上报心跳（worker_timeout 秒内）时，任务不会再被执行，
+        等待超过 timeout 秒时同样放弃等待；两种情况都将任务标记为失败并返回错误结果。timeout 为 None 时不限制。
+        """
+        task_id = await asyncio.to_thread(self.enqueue, project_id, test_case_id, options, run_id)
+        loop = asyncio.get_running_loop()
+        started = last_alive = loop.time()
+        try:
+            while True:
+                await asyncio.sleep(poll_interval)
+                task = await asyncio.to_thread(self.get, task_id)
+                if task and task["status"] == "done":
+                    return task["result"]
+                if task and task["status"] == "cancelled":
+                    return {
+                        "status": "error",
+                        "test_case_id": test_case_id,
+                        "execution_time": datetime.now().isoformat(),
+                        "message": "任务已被取消"
+                    }
+                now = loop.time()
+                if timeout and now - started > timeout:
+                    message = f"等待 worker 执行超过 {timeout} 秒"
+                elif now - last_alive > claim_timeout:
+                    if await asyncio.to_thread(self.live_workers, worker_timeout):
+                        last_alive = now
+                        continue
+                    message = f"{claim_timeout} 秒内没有可用的 worker"
+                else:
+                    continue
+                # worker 恰好写回结果时 fail 不生效，下一轮读取到结果
+                await asyncio.to_thread(self.fail, task_id, message)
+        except asyncio.CancelledError:
+            # 在线程中写入，再次被取消时写入仍会在线程中完成
+            await asyncio.to_thread(self.cancel, task_id)
+            raise
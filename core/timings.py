@@ -0,0 +1,85 @@
+from contextlib import contextmanager
+import time
+
+# 页面导航类操作
+NAVIGATION_STEPS = {"goto", "reload", "go_back", "go_forward", "wait_for_url", "wait_for_load_state"}
+# 汇总时展示的最慢操作数
+SLOWEST_LIMIT = 10
+
+
+def step_category(step_type):
+    """步骤类型对应的耗时分类，与 script_runner 中的分类保持一致"""
+    if step_type in NAVIGATION_STEPS:
+        return "navigation"
+    if step_type == "expect":
+        return "assertion"
+    if step_type.startswith("wait_for") or step_type == "expect_event":
+        return "wait"
+    if step_type == "new_page":
+        return "page_creation"
+    return "action"
+
+
+class Timings:
+    """记录一次执行中各阶段的耗时，start 为相对执行开始的秒数"""
+
+    def __init__(self):
+        self.origin = time.monotonic()
+        self.phases = []
+
+    def record(self, name, category, started, error=False):
+        phase = {
+            "name": name,
+            "category": category,
+            "start": round(started - self.origin, 4),
+            "duration": round(time.monotonic() - started, 4)
+        }
+        if error:
+            phase["error"] = True
+        self.phases.append(phase)
+
+    @contextmanager
+    def phase(self, name, category=None):
+        started = time.monotonic()
+        error = False
+        try:
+            yield
+        except BaseException:
+            error = True
+            raise
+        finally:
+            self.record(name, category or name, started, error)
+
+
+def summarize(phases):
+    """按分类汇总各阶段耗时"""
+    by_category = {}
+    for phase in phases:
+        by_category[phase["category"]] = round(by_category.get(phase["category"], 0) + phase["duration"], 4)
+    return {"phases": phases, "by_category": by_category}
+
+
+class Aggregator:
+    """逐个累加用例的耗时，只保留分类合计和最慢的操作，内存不随用例数增长"""
+
+    def __init__(self):
+        self.by_category = {}
+        self.slowest = []
+
+    def add(self, result):
+        timings = result.get("timings")
+        if not timings:
+            return
+        for category, duration in timings["by_category"].items():
+            self.by_category[category] = round(self.by_category.get(category, 0) + duration, 4)
+        for phase in timings["phases"]:
+            if phase["category"] in ("navigation", "action", "assertion", "wait"):
+                self.slowest.append({"test_case_id": result.get("test_case_id"), **phase})
+        self.slowest.sort(key=lambda phase: phase["duration"], reverse=True)
+        del self.slowest[SLOWEST_LIMIT:]
+
+    def summary(self):
+        return {
+            "by_category": dict(sorted(self.by_category.items(), key=lambda item: item[1], reverse=True)),
+            "slowest_actions": list(self.slowest)
+        }
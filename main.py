@@ -1,11 +1,16 @@
 import uvicorn
 from fastapi import FastAPI, Request
+from fastapi.responses import PlainTextResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
-from api.routers import project, testcase, recorder
+from api.routers import project, testcase, recorder, job
+from core import metrics, settings
+from core.task_queue import TaskQueue
 from loguru import logger
+import asyncio
 import os
+import time
 
 # 配置日志
 os.makedirs("logs", exist_ok=True)
@@ -31,10 +36,68 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+# 指标中的路由标签，只使用已知的路由模块，避免任意路径导致标签数量无限增长
+API_ROUTERS = {"project", "testcase", "recorder", "job"}
+TOP_LEVEL_PATHS = {"": "root", "static": "static", "metrics": "metrics", "docs": "docs", "openapi.json": "docs"}
+
+def _router_label(path):
+    parts = path.split("/")
+    if len(parts) > 3 and parts[1] == "api":
+        return parts[3] if parts[3] in API_ROUTERS else "other"
+    return TOP_LEVEL_PATHS.get(parts[1] if len(parts) > 1 else "", "other")
+
+# 记录每个路由的请求耗时
+@app.middleware("http")
+async def record_request_latency(request: Request, call_next):
+    started = time.monotonic()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        metrics.HTTP_REQUEST_DURATION.observe(
+            time.monotonic() - started, router=_router_label(request.url.path), method=request.method, status=status
+        )
+
 # 注册路由
 app.include_router(project.router, prefix="/api/v1/project", tags=["项目管理"])
 app.include_router(testcase.router, prefix="/api/v1/testcase", tags=["测试用例"])
 app.include_router(recorder.router, prefix="/api/v1/recorder", tags=["录制功能"])
+app.include_router(job.router, prefix="/api/v1/job", tags=["执行任务"])
+
+task_queue = TaskQueue(settings.TASK_QUEUE_PATH) if settings.EXECUTION_BACKEND == "queue" else None
+
+def _queue_depth():
+    depth = {("jobs",): sum(1 for item in job.job_manager.jobs.values() if item.status == "pending")}
+    if task_queue:
+        depth[("tasks",)] = task_queue.depth()
+    return depth
+
+metrics.QUEUE_DEPTH.collect = _queue_depth
+
+@app.on_event("startup")
+async def startup():
+    # 后台定期压缩和清理执行记录
+    app.state.run_history_task = asyncio.create_task(
+        testcase.executor.run_history.maintain(settings.RUN_COMPACT_INTERVAL)
+    )
+    # 在本进程中执行用例时预先启动浏览器池和脚本运行进程池，第一个用例不必等待冷启动
+    if settings.EXECUTION_BACKEND != "queue":
+        await testcase.executor.start_session()
+
+@app.on_event("shutdown")
+async def shutdown():
+    app.state.run_history_task.cancel()
+    # 结束所有录制会话
+    await recorder.recorder.cleanup()
+    # 关闭常驻的浏览器池
+    await testcase.executor.close_session()
+
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    """Prometheus 格式的运行时指标"""
+    return PlainTextResponse(metrics.registry.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 async def root(request: Request):
@@ -2,6 +2,16 @@
 let currentProjectId = null;
 let isRecording = false;
 let currentTestCaseId = null;
+// 当前录制会话ID，多人可以同时录制，停止录制时需要指定会话
+let currentRecordingSessionId = null;
+// 列表每页数量
+const PAGE_SIZE = 50;
+// 实时日志最多显示的行数，超出后移除最早的行
+const LIVE_LOG_MAX_LINES = 2000;
+// 当前订阅实时日志的 WebSocket
+let liveLogSocket = null;
+// 正在执行的后台任务，可以通过取消按钮中止
+let currentJobId = null;
 
 // 页面加载完成后执行
 document.addEventListener('DOMContentLoaded', () => {
@@ -26,85 +36,155 @@ document.addEventListener('DOMContentLoaded', () => {
     isRecording = false;
 });
 
-// 加载项目列表
-async function loadProjects() {
+// 加载项目列表，传入游标时追加下一页
+async function loadProjects(cursor = null) {
     try {
-        const response = await fetch('/api/v1/project/list');
-        const projects = await response.json();
+        const params = new URLSearchParams({ limit: PAGE_SIZE });
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+        const response = await fetch(`/api/v1/project/list?${params}`);
+        const page = await response.json();
         
         const projectList = document.getElementById('projectList');
-        projectList.innerHTML = '';
+        if (!cursor) {
+            projectList.innerHTML = '';
+        }
+        removeLoadMoreItem(projectList);
         
-        projects.forEach(project => {
+        page.items.forEach(project => {
             const item = createProjectListItem(project);
             projectList.appendChild(item);
         });
+        
+        if (page.next_cursor) {
+            projectList.appendChild(createLoadMoreItem(() => loadProjects(page.next_cursor)));
+        }
     } catch (error) {
         console.error('加载项目列表失败:', error);
         alert('加载项目列表失败');
     }
 }
 
+// 创建"加载更多"列表项
+function createLoadMoreItem(onClick) {
+    const item = document.createElement('button');
+    item.type = 'button';
+    item.className = 'list-group-item list-group-item-action text-center text-primary load-more';
+    item.textContent = '加载更多';
+    item.addEventListener('click', (event) => {
+        event.stopPropagation();
+        item.disabled = true;
+        onClick();
+    });
+    return item;
+}
+
+// 移除列表末尾的"加载更多"列表项
+function removeLoadMoreItem(list) {
+    const loadMore = list.querySelector('.load-more');
+    if (loadMore) {
+        loadMore.remove();
+    }
+}
+
 // 选择项目
 async function selectProject(projectId) {
     currentProjectId = projectId;
     document.querySelectorAll('#projectList .list-group-item').forEach(item => {
         item.classList.remove('active');
-        if (item.querySelector('small').textContent === projectId) {
+        if (item.getAttribute('data-project-id') === projectId) {
             item.classList.add('active');
         }
     });
     
     await loadTestCases(projectId);
+    await loadLiveLogs();
 }
 
-// 加载测试用例
-async function loadTestCases(projectId) {
+// 加载测试用例，按筛选条件分页查询，传入游标时追加下一页
+async function loadTestCases(projectId, cursor = null) {
     try {
-        const response = await fetch(`/api/v1/testcase/list/${projectId}`);
+        const params = new URLSearchParams({
+            limit: PAGE_SIZE,
+            sort: document.getElementById('testCaseSort').value,
+            order: document.getElementById('testCaseSort').value === 'name' ? 'asc' : 'desc'
+        });
+        const namePrefix = document.getElementById('testCaseFilterPrefix').value.trim();
+        const lastStatus = document.getElementById('testCaseFilterStatus').value;
+        if (namePrefix) {
+            params.set('name_prefix', namePrefix);
+        }
+        if (lastStatus) {
+            params.set('last_status', lastStatus);
+        }
+        if (cursor) {
+            params.set('cursor', cursor);
+        }
+        
+        const response = await fetch(`/api/v1/testcase/list/${projectId}?${params}`);
         if (!response.ok) {
             throw new Error('加载测试用例失败');
         }
         
-        const testCases = await response.json();
-        console.log('加载到的测试用例:', testCases); // 添加调试日志
+        const page = await response.json();
         
         const testCaseList = document.getElementById('testCaseList');
-        testCaseList.innerHTML = '';
+        if (!cursor) {
+            testCaseList.innerHTML = '';
+        }
+        removeLoadMoreItem(testCaseList);
         
-        if (!testCases || testCases.length === 0) {
+        if (!cursor && page.items.length === 0) {
             testCaseList.innerHTML = '<div class="list-group-item text-center text-muted">暂无测试用例</div>';
             return;
         }
         
-        testCases.forEach(testCase => {
-            const recordedDate = new Date(testCase.recorded_at);
-            const item = document.createElement('div');
-            item.className = 'list-group-item';
-            item.innerHTML = `
-                <div class="d-flex justify-content-between align-items-center">
-                    <div>
-                        <h6 class="mb-0">${testCase.test_case_id}</h6>
-                        <small class="text-muted">
-                            录制时间: ${recordedDate.toLocaleString()}<br>
-                            文件大小: ${(testCase.file_size / 1024).toFixed(2)} KB
-                        </small>
-                    </div>
-                    <div class="btn-group">
-                        <button class="btn btn-sm btn-info me-2" onclick="viewScript('${testCase.test_case_id}')">查看脚本</button>
-                        <button class="btn btn-sm btn-primary me-2" onclick="executeTestCase('${testCase.test_case_id}')">执行</button>
-                        <button class="btn btn-sm btn-danger" onclick="deleteTestCase('${testCase.test_case_id}')">删除</button>
-                    </div>
-                </div>
-            `;
-            testCaseList.appendChild(item);
+        page.items.forEach(testCase => {
+            testCaseList.appendChild(createTestCaseListItem(testCase));
         });
+        
+        if (page.next_cursor) {
+            testCaseList.appendChild(createLoadMoreItem(() => loadTestCases(projectId, page.next_cursor)));
+        }
     } catch (error) {
         console.error('加载测试用例失败:', error);
         alert('加载测试用例失败: ' + error.message);
     }
 }
 
+// 创建测试用例列表项
+function createTestCaseListItem(testCase) {
+    const recordedDate = new Date(testCase.recorded_at);
+    const item = document.createElement('div');
+    item.className = 'list-group-item';
+    item.innerHTML = `
+        <div class="d-flex justify-content-between align-items-center">
+            <div>
+                <h6 class="mb-0">${testCase.test_case_id}</h6>
+                <small class="text-muted">
+                    录制时间: ${recordedDate.toLocaleString()}<br>
+                    文件大小: ${(testCase.file_size / 1024).toFixed(2)} KB
+                    ${testCase.last_status ? `<br>最近执行: <span class="badge ${testCase.last_status === 'success' ? 'bg-success' : 'bg-danger'}">${testCase.last_status}</span> ${testCase.last_duration != null ? testCase.last_duration.toFixed(2) + ' 秒' : ''}` : ''}
+                </small>
+            </div>
+            <div class="btn-group">
+                <button class="btn btn-sm btn-info me-2" onclick="viewScript('${testCase.test_case_id}')">查看脚本</button>
+                <button class="btn btn-sm btn-primary me-2" onclick="executeTestCase('${testCase.test_case_id}')">执行</button>
+                <button class="btn btn-sm btn-danger" onclick="deleteTestCase('${testCase.test_case_id}')">删除</button>
+            </div>
+        </div>
+    `;
+    return item;
+}
+
+// 筛选条件变化时重新加载测试用例
+function reloadTestCases() {
+    if (currentProjectId) {
+        loadTestCases(currentProjectId);
+    }
+}
+
 // 显示新建项目模态框
 function showNewProjectModal() {
     const modal = new bootstrap.Modal(document.getElementById('newProjectModal'));
@@ -116,6 +196,7 @@ async function createProject() {
     const projectId = document.getElementById('projectId').value;
     const projectName = document.getElementById('projectName').value;
     const description = document.getElementById('projectDescription').value;
+    const concurrency = parseInt(document.getElementById('projectConcurrency').value, 10);
     
     try {
         const response = await fetch('/api/v1/project/create', {
@@ -126,7 +207,8 @@ async function createProject() {
             body: JSON.stringify({
                 project_id: projectId,
                 project_name: projectName,
-                description: description
+                description: description,
+                concurrency: Number.isNaN(concurrency) ? null : concurrency
             })
         });
         
@@ -200,7 +282,9 @@ async function startRecordingSession() {
             body: JSON.stringify({
                 url: url,
                 project_id: currentProjectId,
-                test_case_id: testCaseId
+                test_case_id: testCaseId,
+                save_har: document.getElementById('recordSaveHar').checked,
+                har_url_filter: document.getElementById('recordHarFilter').value || null
             })
         });
         
@@ -211,6 +295,7 @@ async function startRecordingSession() {
         }
 
         isRecording = true;
+        currentRecordingSessionId = data.session_id;
         bootstrap.Modal.getInstance(document.getElementById('recordUrlModal')).hide();
         
         // 显示录制说明
@@ -233,7 +318,7 @@ async function stopRecording() {
     recordButton.innerHTML = '<span class="spinner-border spinner-border-sm" role="status" aria-hidden="true"></span> 正在停止...';
 
     try {
-        const response = await fetch('/api/v1/recorder/stop', {
+        const response = await fetch(`/api/v1/recorder/stop?session_id=${encodeURIComponent(currentRecordingSessionId)}`, {
             method: 'POST',
             headers: {
                 'Content-Type': 'application/json'
@@ -250,6 +335,7 @@ async function stopRecording() {
         await saveRecording(currentTestCaseId);
 
         isRecording = false;
+        currentRecordingSessionId = null;
         recordButton.innerHTML = '开始录制';
         recordButton.addEventListener('click', showRecordUrlModal);
         recordButton.disabled = false;
@@ -291,6 +377,83 @@ async function saveRecording(testCaseId, steps) {
     }
 }
 
+// 提交后台执行任务，通过 Server-Sent Events 接收进度，任务结束后返回执行结果
+async function runJob(submitUrl, onProgress) {
+    const response = await fetch(submitUrl, {
+        method: 'POST'
+    });
+    
+    if (!response.ok) {
+        throw new Error(await response.text());
+    }
+    
+    const job = await response.json();
+    // 任务开始执行后刷新可以订阅的实时日志
+    setTimeout(loadLiveLogs, 1000);
+    currentJobId = job.job_id;
+    const cancelButton = document.getElementById('cancelJobButton');
+    cancelButton.style.display = '';
+    
+    try {
+        await new Promise((resolve, reject) => {
+            const source = new EventSource(`/api/v1/job/events/${job.job_id}`);
+            let completed = 0;
+            
+            source.addEventListener('case_completed', (event) => {
+                completed += 1;
+                if (onProgress) {
+                    onProgress(JSON.parse(event.data), completed, job.total);
+                }
+            });
+            source.addEventListener('job_finished', (event) => {
+                source.close();
+                if (JSON.parse(event.data).status === 'cancelled') {
+                    reject(new Error('任务已取消'));
+                } else {
+                    resolve();
+                }
+            });
+            source.onerror = () => {
+                source.close();
+                reject(new Error('任务进度连接中断'));
+            };
+        });
+    } finally {
+        if (currentJobId === job.job_id) {
+            currentJobId = null;
+            cancelButton.style.display = 'none';
+        }
+    }
+    
+    const resultResponse = await fetch(`/api/v1/job/result/${job.job_id}`);
+    if (!resultResponse.ok) {
+        throw new Error(await resultResponse.text());
+    }
+    return await resultResponse.json();
+}
+
+// 取消正在执行的后台任务，正在执行的用例会被中止
+async function cancelCurrentJob() {
+    if (!currentJobId || !confirm('确定要取消正在执行的任务吗？')) {
+        return;
+    }
+    const cancelButton = document.getElementById('cancelJobButton');
+    cancelButton.disabled = true;
+    try {
+        const response = await fetch(`/api/v1/job/cancel/${currentJobId}`, {
+            method: 'POST'
+        });
+        if (!response.ok && response.status !== 409) {
+            throw new Error(await response.text());
+        }
+    } catch (error) {
+        console.error('取消任务失败:', error);
+        alert('取消任务失败: ' + error.message);
+    } finally {
+        cancelButton.disabled = false;
+    }
+}
+
 // 执行单个测试用例
 async function executeTestCase(testCaseId) {
     if (!currentProjectId) {
@@ -305,15 +468,7 @@ async function executeTestCase(testCaseId) {
     executeButton.innerHTML = '<span class="spinner-border spinner-border-sm" role="status" aria-hidden="true"></span> 执行中...';
 
     try {
-        const response = await fetch(`/api/v1/testcase/execute/${currentProjectId}/${testCaseId}`, {
-            method: 'POST'
-        });
-        
-        if (!response.ok) {
-            throw new Error(await response.text());
-        }
-        
-        const result = await response.json();
+        const result = await runJob(`/api/v1/job/execute/${currentProjectId}/${testCaseId}`);
         
         // 显示执行结果
         const resultsContainer = document.getElementById('executionResults');
@@ -554,8 +709,8 @@ async function viewScript(testCaseId) {
     }
 }
 
-// 执行项目中的所有测试用例
-async function executeProject(projectId) {
+// 执行项目中的所有测试用例，指定 rerunOf 时只重新执行该次项目执行中失败的用例
+async function executeProject(projectId, rerunOf) {
     if (!projectId) {
         alert('请先选择一个项目');
         return;
@@ -571,16 +726,14 @@ async function executeProject(projectId) {
         const projectElement = document.querySelector(`[data-project-id="${projectId}"]`);
         const projectName = projectElement ? projectElement.querySelector('h6').textContent : projectId;
 
-        const response = await fetch(`/api/v1/testcase/execute_project/${projectId}`, {
-            method: 'POST'
+        // 提交后台任务，并根据推送的进度更新按钮
+        const submitUrl = rerunOf
+            ? `/api/v1/job/rerun_failed/${projectId}/${rerunOf}`
+            : `/api/v1/job/execute_project/${projectId}`;
+        const result = await runJob(submitUrl, (caseResult, completed, total) => {
+            executeButton.innerHTML = `<span class="spinner-border spinner-border-sm" role="status" aria-hidden="true"></span> 执行中 ${completed}/${total}`;
         });
         
-        if (!response.ok) {
-            throw new Error(await response.text());
-        }
-        
-        const result = await response.json();
-        
         // 显示执行结果
         const resultsContainer = document.getElementById('executionResults');
         const resultElement = document.createElement('div');
@@ -592,7 +745,13 @@ async function executeProject(projectId) {
             <div class="mb-2">总计: ${result.total} 个测试用例</div>
             <div class="mb-2">成功: ${result.success} 个</div>
             <div class="mb-2">失败: ${result.failed} 个</div>
+            ${result.skipped ? `<div class="mb-2">跳过: ${result.skipped} 个</div>` : ''}
+            ${result.first_attempt ? `<div class="mb-2">首次执行: 成功 ${result.first_attempt.success} 个, 失败 ${result.first_attempt.failed} 个</div>` : ''}
+            ${result.flaky ? `<div class="mb-2">重试后通过: ${result.flaky} 个</div>` : ''}
             <div class="mt-2">${result.message}</div>
+            ${result.project_run_id && result.failed + result.skipped > 0 ? `
+                <button class="btn btn-sm btn-warning mt-2" onclick="executeProject('${projectId}', '${result.project_run_id}')">重新执行失败用例</button>
+            ` : ''}
             <hr>
             <div class="mt-2">
                 <button class="btn btn-sm btn-info" onclick="toggleDetails(this)">显示详细结果</button>
@@ -602,7 +761,9 @@ async function executeProject(projectId) {
                             <div class="card-body">
                                 <h6 class="card-title">${r.test_case_id}</h6>
                                 <p class="card-text">
-                                    状态: <span class="badge ${r.status === 'success' ? 'bg-success' : 'bg-danger'}">${r.status}</span><br>
+                                    状态: <span class="badge ${r.status === 'success' ? 'bg-success' : r.status === 'skipped' ? 'bg-secondary' : 'bg-danger'}">${r.status}</span>
+                                    ${r.flaky ? '<span class="badge bg-warning text-dark">不稳定</span>' : ''}
+                                    ${r.timed_out ? '<span class="badge bg-dark">超时</span>' : ''}<br>
                                     执行时间: ${new Date(r.execution_time).toLocaleString()}<br>
                                     ${r.message ? `消息: ${r.message}` : ''}
                                 </p>
@@ -702,6 +863,83 @@ async function deleteProject(projectId, projectName) {
     }
 }
 
+// 加载当前项目中正在执行的用例，点击后订阅其实时输出
+async function loadLiveLogs() {
+    const list = document.getElementById('liveLogList');
+    if (!currentProjectId) {
+        list.innerHTML = '';
+        return;
+    }
+    try {
+        const response = await fetch(`/api/v1/testcase/live_logs/${currentProjectId}`);
+        if (!response.ok) {
+            throw new Error(await response.text());
+        }
+        const runs = await response.json();
+        list.innerHTML = runs.length ? '' : '<small class="text-muted">没有正在执行的用例</small>';
+        runs.forEach(run => {
+            const button = document.createElement('button');
+            button.className = 'btn btn-sm btn-outline-primary me-2 mb-1';
+            button.textContent = run.test_case_id;
+            button.addEventListener('click', () => openLiveLog(currentProjectId, run.run_id, run.test_case_id));
+            list.appendChild(button);
+        });
+    } catch (error) {
+        console.error('加载实时日志列表失败:', error);
+    }
+}
+
+// 通过 WebSocket 订阅一次执行的输出，逐行追加显示
+function openLiveLog(projectId, runId, testCaseId) {
+    if (liveLogSocket) {
+        liveLogSocket.close();
+    }
+    const output = document.getElementById('liveLogOutput');
+    const title = document.getElementById('liveLogTitle');
+    output.innerHTML = '';
+    title.textContent = `${testCaseId}（执行中）`;
+
+    const protocol = window.location.protocol === 'https:' ? 'wss' : 'ws';
+    const socket = new WebSocket(`${protocol}://${window.location.host}/api/v1/testcase/logs/${projectId}/${runId}`);
+    liveLogSocket = socket;
+    socket.onmessage = (event) => {
+        const message = JSON.parse(event.data);
+        if (message.type === 'line') {
+            appendLiveLogLine(output, message.text, message.stream);
+        } else if (message.type === 'end') {
+            title.textContent = `${testCaseId}（已结束${message.status ? ': ' + message.status : ''}）`;
+        } else if (message.type === 'lagged') {
+            appendLiveLogLine(output, '读取过慢，实时日志已断开，可以重新打开', 'meta');
+        } else if (message.type === 'error') {
+            appendLiveLogLine(output, message.message, 'meta');
+        }
+    };
+    socket.onclose = () => {
+        if (liveLogSocket === socket) {
+            liveLogSocket = null;
+        }
+    };
+}
+
+function appendLiveLogLine(output, text, stream) {
+    const line = document.createElement('div');
+    line.textContent = text;
+    if (stream === 'stderr') {
+        line.className = 'stderr';
+    } else if (stream === 'system' || stream === 'step' || stream === 'meta') {
+        line.className = 'meta';
+    }
+    // 只在已经滚动到底部时自动跟随
+    const following = output.scrollTop + output.clientHeight >= output.scrollHeight - 5;
+    output.appendChild(line);
+    while (output.childElementCount > LIVE_LOG_MAX_LINES) {
+        output.removeChild(output.firstChild);
+    }
+    if (following) {
+        output.scrollTop = output.scrollHeight;
+    }
+}
+
 // 确保所有需要的函数都可以在全局范围内访问
 window.executeProject = executeProject;
 window.toggleDetails = toggleDetails;
@@ -712,4 +950,7 @@ window.handleRecordingInstructionsClose = handleRecordingInstructionsClose;
 window.executeTestCase = executeTestCase;
 window.deleteTestCase = deleteTestCase;
 window.viewScript = viewScript;
-window.deleteProject = deleteProject;
\ No newline at end of file
+window.deleteProject = deleteProject;
+window.loadLiveLogs = loadLiveLogs;
+window.cancelCurrentJob = cancelCurrentJob;
+window.reloadTestCases = reloadTestCases;
\ No newline at end of file
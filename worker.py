@@ -0,0 +1,115 @@
+import argparse
+import asyncio
+import os
+import socket
+from loguru import logger
+from core import settings
+from core.executor import Executor
+from core.task_queue import TaskQueue
+
+# 配置日志
+os.makedirs("logs", exist_ok=True)
+logger.add("logs/worker.log", rotation="1 day", retention="7 days")
+
+
+class Worker:
+    """从持久化任务队列中领取测试用例并执行，将结果写回队列"""
+
+    def __init__(self, worker_id, concurrency=1, poll_interval=1.0):
+        self.worker_id = worker_id
+        self.concurrency = max(1, concurrency)
+        self.poll_interval = poll_interval
+        self.lease_seconds = settings.TASK_LEASE_SECONDS
+        self.queue = TaskQueue(settings.TASK_QUEUE_PATH)
+        self.executor = Executor()
+
+    async def _keep_alive(self, task_id, execution):
+        """任务执行期间定期续约，任务在队列中被取消后中止执行并返回 True"""
+        while True:
+            await asyncio.sleep(self.lease_seconds / 3)
+            if not await asyncio.to_thread(self.queue.heartbeat, task_id, self.worker_id, self.lease_seconds):
+                logger.info(f"[{self.worker_id}] 任务已取消，中止执行: {task_id}")
+                execution.cancel()
+                return True
+
+    async def _execute(self, task):
+        """执行一个任务并写回结果"""
+        logger.info(f"[{self.worker_id}] 领取任务: {task['task_id']}, 用例: {task['project_id']}/{task['test_case_id']}")
+        execution = asyncio.create_task(
+            self.executor.execute_test_case(task["project_id"], task["test_case_id"], task["options"], task["run_id"])
+        )
+        keep_alive = asyncio.create_task(self._keep_alive(task["task_id"], execution))
+        try:
+            result = await execution
+        except asyncio.CancelledError:
+            # 任务在队列中被取消时脚本进程树已结束，不写回结果；worker 自身被停止时继续向上抛出
+            if keep_alive.done() and not keep_alive.cancelled() and keep_alive.result():
+                return
+            raise
+        finally:
+            keep_alive.cancel()
+        await asyncio.to_thread(self.queue.complete, task["task_id"], result)
+        logger.info(f"[{self.worker_id}] 任务完成: {task['task_id']}, 状态: {result['status']}")
+
+    async def _slot(self):
+        """单个执行槽位：循环领取并执行任务"""
+        while True:
+            try:
+                task = await asyncio.to_thread(self.queue.claim, self.worker_id, self.lease_seconds)
+                if task:
+                    await self._execute(task)
+                else:
+                    await asyncio.sleep(self.poll_interval)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"[{self.worker_id}] 执行任务失败: {str(e)}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _announce(self):
+        """定期上报心跳，API 进程据此判断是否有可用的 worker"""
+        while True:
+            try:
+                await asyncio.to_thread(self.queue.worker_heartbeat, self.worker_id)
+            except Exception as e:
+                logger.error(f"[{self.worker_id}] 上报心跳失败: {str(e)}")
+            await asyncio.sleep(self.lease_seconds / 3)
+
+    async def _maintain(self):
+        """定期回收租约过期的任务并清理旧任务记录"""
+        while True:
+            try:
+                await asyncio.to_thread(self.queue.requeue_expired)
+                await asyncio.to_thread(self.queue.purge)
+            except Exception as e:
+                logger.error(f"[{self.worker_id}] 维护任务队列失败: {str(e)}")
+            await asyncio.sleep(self.lease_seconds)
+
+    async def run(self):
+        logger.info(f"Worker 已启动: {self.worker_id}, 并发数: {self.concurrency}, 队列: {self.queue.db_path}")
+        try:
+            # 领取任务前预先启动浏览器池和脚本运行进程池
+            await self.executor.start_session()
+            await asyncio.gather(self._announce(), self._maintain(), *(self._slot() for _ in range(self.concurrency)))
+        finally:
+            await asyncio.to_thread(self.queue.remove_worker, self.worker_id)
+            await self.executor.close_session()
+
+
+def main():
+    """主函数"""
+    parser = argparse.ArgumentParser(description="测试用例执行 worker")
+    parser.add_argument("--concurrency", type=int, default=1, help="同时执行的用例数")
+    parser.add_argument("--worker-id", default=f"{socket.gethostname()}-{os.getpid()}", help="worker 标识")
+    parser.add_argument("--poll-interval", type=float, default=1.0, help="队列为空时的轮询间隔（秒）")
+    args = parser.parse_args()
+
+    worker = Worker(args.worker_id, args.concurrency, args.poll_interval)
+    try:
+        asyncio.run(worker.run())
+    except KeyboardInterrupt:
+        logger.info(f"Worker 已停止: {args.worker_id}")
+
+
+if __name__ == "__main__":
+    main()